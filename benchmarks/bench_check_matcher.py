@@ -0,0 +1,113 @@
+"""
+Micro-benchmark of CheckMatcher against the per-pattern parse_line loop.
+
+Usage: python -m benchmarks.bench_check_matcher [--lines 200000]
+"""
+
+from __future__ import annotations
+
+from argparse import ArgumentParser
+from pathlib import Path
+from re import match
+from time import perf_counter
+
+from bar_raiser.utils.check import CheckMatcher, CheckPattern
+from bar_raiser.utils.github import Annotation
+
+# The patterns of the text output of ruff check, which annotate_ruff parsed
+# before ingesting its JSON lines output.
+RUFF_CHECK_PATTERNS = [
+    CheckPattern(
+        regex="^error: Failed to parse (?P<path>[^:]+):(?P<line>[0-9]+):[0-9]+: (?P<message>.*)$"
+    ),
+    CheckPattern(regex="^(?P<path>[^:]+):(?P<line>[0-9]+):[0-9]+: (?P<message>.*)$"),
+    CheckPattern(
+        regex="^.* fixable with the `--fix` option.$",
+        should_create_annotation=False,
+        is_autofixable=True,
+    ),
+]
+
+
+def generate_ruff_check_output(num_lines: int) -> str:
+    lines = [
+        f"pkg/module_{i % 5000}.py:{i % 700 + 1}:{i % 80 + 1}: F401 [*] `os` imported but unused"
+        for i in range(num_lines)
+    ]
+    lines.extend((
+        f"Found {num_lines} errors.",
+        f"[*] {num_lines} fixable with the `--fix` option.",
+    ))
+    return "\n".join(lines)
+
+
+def parse_line(
+    pattern: CheckPattern, line: str, repo: Path
+) -> tuple[Annotation | None, bool]:
+    """The per-pattern parse get_annotations_and_actions did before CheckMatcher."""
+    matched = match(pattern.regex, line)
+    is_autofixable = pattern.is_autofixable
+    if matched:
+        line_num = int(matched.group("line")) if pattern.line is None else pattern.line
+        return (
+            Annotation(
+                path=str(Path(Path.cwd() / matched.group("path")).relative_to(repo)),
+                start_line=line_num,
+                end_line=line_num,
+                annotation_level="failure",
+                message=matched.group("message")
+                if pattern.message is None
+                else pattern.message,
+            ),
+            is_autofixable,
+        )
+    return (None, is_autofixable)
+
+
+def scan_with_parse_line(
+    output: str, patterns: list[CheckPattern], repo: Path
+) -> tuple[list[Annotation], bool]:
+    """The scan get_annotations_and_actions did before CheckMatcher."""
+    annotations: list[Annotation] = []
+    is_autofix_available = False
+    for line in output.split("\n"):
+        for pattern in patterns:
+            if pattern.should_create_annotation:
+                annotation, is_autofixable = parse_line(pattern, line, repo)
+                if annotation:
+                    annotations.append(annotation)
+                    if is_autofixable:
+                        is_autofix_available = is_autofixable
+            elif (
+                is_autofix_available is False
+                and pattern.is_autofixable
+                and match(pattern.regex, line)
+            ):
+                is_autofix_available = True
+    return annotations, is_autofix_available
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--lines", type=int, default=200_000)
+    args = parser.parse_args()
+    output = generate_ruff_check_output(args.lines)
+    repo = Path.cwd()
+
+    start = perf_counter()
+    legacy_annotations, _ = scan_with_parse_line(output, RUFF_CHECK_PATTERNS, repo)
+    legacy_seconds = perf_counter() - start
+
+    start = perf_counter()
+    annotations, _ = CheckMatcher(RUFF_CHECK_PATTERNS).scan(output, repo)
+    matcher_seconds = perf_counter() - start
+
+    assert annotations == legacy_annotations
+    print(f"lines: {args.lines:,}, annotations: {len(annotations):,}")
+    print(f"parse_line loop: {legacy_seconds:.3f}s")
+    print(f"CheckMatcher:    {matcher_seconds:.3f}s")
+    print(f"speedup:         {legacy_seconds / matcher_seconds:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,493 @@
+"""
+End-to-end benchmarks of the bar-raiser commands on synthetic monorepos.
+
+Usage: python -m benchmarks.bench_suite [--files 1000 10000 100000]
+           [--annotations 500] [--scenario annotate_ruff ...]
+           [--workdir DIR] [--results PATH] [--baseline COMMIT]
+
+Each scenario runs in a fresh process, as a CI step does, in a synthetic
+repository (see benchmarks.synthetic) and against a local stand-in of the
+GitHub, Slack and S3 APIs (see benchmarks.stand_in). For each one, the suite
+records:
+
+- the wall time of the measured call and of the whole process,
+- the API calls per endpoint, as counted by the stand-in,
+- the peak RSS of the process and of the workers it waited for.
+
+Results are appended to a JSON lines history, by default
+benchmarks/results.jsonl, and compared with the latest earlier results of the
+same scenario and size, or of the `--baseline` commit. The synthetic inputs
+are kept in the work directory and reused by later runs of the same size.
+Setting BAR_RAISER_PROFILE also profiles every scenario, see
+bar_raiser.utils.profiling.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+from argparse import ArgumentParser
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from pathlib import Path
+from tempfile import gettempdir
+from threading import Timer
+from time import perf_counter
+from typing import TYPE_CHECKING, Any
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from git.repo import Repo
+
+import bar_raiser
+from bar_raiser.checks import (
+    annotate_diff_cover,
+    annotate_merge_commits,
+    annotate_pyright,
+    annotate_pytest,
+    annotate_ruff,
+)
+from bar_raiser.tech_debt_framework import run_analyzers
+from bar_raiser.tech_debt_framework.utils import PathResults, get_analyzers, get_delta
+from bar_raiser.utils.github import commit_changes, get_github_repo, initialize_logging
+from benchmarks.stand_in import StandIn
+from benchmarks.synthetic import (
+    BRANCH,
+    PR_BRANCH,
+    PULL_NUMBER,
+    REPO_NAME,
+    SyntheticConfig,
+    Workspace,
+    create_workspace,
+    get_changed_files,
+    get_module_path,
+    write_event,
+)
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Coroutine
+
+RESULTS_PATH = Path(__file__).parent / "results.jsonl"
+DEFAULT_TIMEOUT_SECONDS = 3600
+BYTES_PER_MB = 1024 * 1024
+# ru_maxrss is in kilobytes on Linux.
+RSS_UNIT_BYTES = 1 if sys.platform == "darwin" else 1024
+
+SCENARIOS: dict[str, Callable[[Workspace], float]] = {}
+
+
+def scenario(function: Callable[[Workspace], float]) -> Callable[[Workspace], float]:
+    """Register a scenario, which runs in the child process and returns the
+    seconds of its measured call."""
+    SCENARIOS[function.__name__.removeprefix("run_")] = function
+    return function
+
+
+def run_main(main: Callable[[], object], argv: list[str]) -> float:
+    """Run the main of an entry point with `argv`, as its script would."""
+    sys.argv = argv
+    start = perf_counter()
+    try:
+        main()
+    except SystemExit:
+        # The annotate_* commands exit with the return code of their tool.
+        pass
+    return perf_counter() - start
+
+
+def run_async_main(
+    main: Callable[[], Coroutine[Any, Any, None]], argv: list[str]
+) -> float:
+    return run_main(lambda: asyncio.run(main()), argv)
+
+
+@scenario
+def run_annotate_ruff(workspace: Workspace) -> float:
+    return run_main(
+        annotate_ruff.main,
+        [
+            "annotate_ruff.py",
+            "--slack-dm-on-failure",
+            str(workspace.slack_mapping_path),
+        ],
+    )
+
+
+@scenario
+def run_annotate_pyright(workspace: Workspace) -> float:
+    return run_main(
+        annotate_pyright.main,
+        [
+            "annotate_pyright.py",
+            "--slack-dm-on-failure",
+            str(workspace.slack_mapping_path),
+        ],
+    )
+
+
+@scenario
+def run_annotate_pytest(workspace: Workspace) -> float:
+    return run_main(
+        annotate_pytest.main,
+        ["annotate_pytest.py", str(workspace.outputs / "pytest_report.json")],
+    )
+
+
+@scenario
+def run_annotate_diff_cover(workspace: Workspace) -> float:
+    return run_main(
+        annotate_diff_cover.main,
+        [
+            "annotate_diff_cover.py",
+            str(workspace.outputs / "diff_cover.json"),
+            str(workspace.outputs / "diff_cover.md"),
+        ],
+    )
+
+
+@scenario
+def run_annotate_merge_commits(workspace: Workspace) -> float:
+    return run_main(annotate_merge_commits.main, ["annotate_merge_commits.py"])
+
+
+@scenario
+def run_analyze_paths(workspace: Workspace) -> float:
+    analyzers = get_analyzers()
+    start = perf_counter()
+    PathResults.analyze_paths(["."], analyzers)
+    return perf_counter() - start
+
+
+@scenario
+def run_get_delta(workspace: Workspace) -> float:
+    """The delta of the pull request, from the results of its base commit."""
+    git_repo = Repo(workspace.repo)
+    base_commit, head_commit = git_repo.commit(BRANCH), git_repo.commit(PR_BRANCH)
+    analyzers = get_analyzers()
+    path_results = PathResults.analyze_commit(git_repo, base_commit, ["."], analyzers)
+    start = perf_counter()
+    get_delta(path_results, base_commit.diff(head_commit), analyzers, git_repo)
+    return perf_counter() - start
+
+
+@scenario
+def run_commit_changes(workspace: Workspace) -> float:
+    """Commit a codemod of the modules the pull request changes in number."""
+    git_repo = Repo(workspace.repo)
+    config = SyntheticConfig(**(workspace.get_manifest() or {}))
+    changed = get_changed_files(config)
+    paths = [
+        get_module_path(index)
+        for index in range(0, config.files, max(1, config.files // changed))
+    ][:changed]
+    for path in paths:
+        with open(workspace.repo / path, "a", encoding="utf-8") as f:
+            f.write("\n\nCODEMOD_APPLIED = True\n")
+    try:
+        start = perf_counter()
+        commit_changes(
+            get_github_repo(),
+            PR_BRANCH,
+            git_repo.commit(PR_BRANCH).hexsha,
+            paths,
+            "Apply the benchmark codemod",
+        )
+        return perf_counter() - start
+    finally:
+        git_repo.git.checkout("--", *paths)
+
+
+@scenario
+def run_run_analyzers(workspace: Workspace) -> float:
+    """The tech debt check of the pull request, with an empty S3 bucket."""
+    return run_async_main(run_analyzers.main, ["run_analyzers.py", "."])
+
+
+def run_scenario(name: str, workspace: Workspace, result_path: Path) -> None:
+    """Run a scenario in this process, the child of the suite."""
+    initialize_logging()
+    seconds = SCENARIOS[name](workspace)
+    result_path.write_text(json.dumps({"seconds": seconds}), encoding="utf-8")
+
+
+def get_private_key() -> str:
+    """A key for the GitHub App JWTs the stand-in accepts without checking."""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ).decode()
+
+
+def get_python_path() -> str:
+    roots = {
+        str(Path(bar_raiser.__file__).parents[1]),
+        str(Path(__file__).parents[1]),
+    }
+    return os.pathsep.join(sorted(roots))
+
+
+def get_environment(
+    name: str, workspace: Workspace, stand_in: StandIn, private_key: str
+) -> dict[str, str]:
+    environment = {
+        key: value
+        for key, value in os.environ.items()
+        # Keep the reports of the scenarios out of the summary of a CI step.
+        if key not in {"GITHUB_STEP_SUMMARY", "RUNNER_TEMP"}
+    }
+    state_dir = workspace.root / "state" / name
+    shutil.rmtree(state_dir, ignore_errors=True)
+    for directory in ("cache", "tokens", "traces", "profiles"):
+        (state_dir / directory).mkdir(parents=True)
+    owner = REPO_NAME.split("/")[0]
+    environment.update(stand_in.get_environment())
+    environment.update({
+        "PATH": f"{workspace.bin}{os.pathsep}{environment.get('PATH', '')}",
+        "PYTHONPATH": get_python_path(),
+        "APP_ID": "1",
+        "PRIVATE_KEY": private_key,
+        "GITHUB_REPOSITORY": REPO_NAME,
+        "GITHUB_REPOSITORY_OWNER": owner,
+        "GITHUB_EVENT_PATH": str(workspace.event_path),
+        "GITHUB_SERVER_URL": "https://github.com",
+        "GITHUB_RUN_ID": "1",
+        "PULL_NUMBER": str(PULL_NUMBER),
+        "SLACK_BOT_TOKEN": "xoxb-bench",
+        # Every scenario starts cold, as the first step of a job.
+        "BAR_RAISER_CACHE_DIR": str(state_dir / "cache"),
+        "BAR_RAISER_TOKEN_CACHE_DIR": str(state_dir / "tokens"),
+        "BAR_RAISER_TRACE_DIR": str(state_dir / "traces"),
+    })
+    environment.setdefault("BAR_RAISER_PROFILE_DIR", str(state_dir / "profiles"))
+    return environment
+
+
+@dataclass
+class Measurement:
+    exit_code: int
+    seconds: float | None
+    process_seconds: float
+    peak_rss_mb: float
+    endpoints: dict[str, dict[str, int]]
+
+
+def measure_scenario(  # noqa: PLR0917
+    name: str,
+    workspace: Workspace,
+    stand_in: StandIn,
+    private_key: str,
+    timeout: float,
+) -> Measurement:
+    stand_in.reset()
+    state_dir = workspace.root / "state" / name
+    environment = get_environment(name, workspace, stand_in, private_key)
+    result_path = state_dir / "result.json"
+    command = [
+        sys.executable,
+        "-m",
+        "benchmarks.bench_suite",
+        "--run-scenario",
+        name,
+        "--workdir",
+        str(workspace.root),
+    ]
+    with open(state_dir / "output.log", "w", encoding="utf-8") as log:
+        start = perf_counter()
+        process = subprocess.Popen(
+            command, cwd=workspace.repo, env=environment, stdout=log, stderr=log
+        )
+        timer = Timer(timeout, process.kill)
+        timer.start()
+        try:
+            # Unlike Popen.wait, wait4 returns the resource usage of the child.
+            _pid, status, usage = os.wait4(process.pid, 0)
+        finally:
+            timer.cancel()
+        process_seconds = perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    seconds = None
+    if process.returncode == 0:
+        seconds = json.loads(result_path.read_text(encoding="utf-8"))["seconds"]
+    return Measurement(
+        exit_code=process.returncode,
+        seconds=seconds,
+        process_seconds=process_seconds,
+        peak_rss_mb=usage.ru_maxrss * RSS_UNIT_BYTES / BYTES_PER_MB,
+        endpoints=stand_in.stats.snapshot(),
+    )
+
+
+def get_commit() -> tuple[str | None, bool]:
+    """The commit of the benchmarked checkout, and whether it has changes."""
+    root = Path(__file__).parents[1]
+    try:
+        commit = subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=root, text=True
+        ).strip()
+        status = subprocess.check_output(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            cwd=root,
+            text=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None, False
+    return commit, bool(status.strip())
+
+
+def load_history(results_path: Path) -> list[dict[str, Any]]:
+    try:
+        lines = results_path.read_text(encoding="utf-8").splitlines()
+    except FileNotFoundError:
+        return []
+    return [json.loads(line) for line in lines if line.strip()]
+
+
+def find_previous(
+    history: list[dict[str, Any]], record: dict[str, Any], baseline: str | None
+) -> dict[str, Any] | None:
+    key = ("scenario", "files", "annotations")
+    for previous in reversed(history):
+        if (
+            all(previous[field] == record[field] for field in key)
+            and previous["exit_code"] == 0
+            and (baseline is None or (previous["commit"] or "").startswith(baseline))
+        ):
+            return previous
+    return None
+
+
+def format_change(value: float | None, previous: float | None, unit: str) -> str:
+    if value is None:
+        return "failed"
+    text = f"{value:,.2f}{unit}" if isinstance(value, float) else f"{value:,}{unit}"
+    if previous:
+        text += f" ({(value - previous) / previous:+.0%})"
+    return text
+
+
+def print_table(
+    records: list[dict[str, Any]], history: list[dict[str, Any]], baseline: str | None
+) -> None:
+    print(
+        f"{'scenario':<26} {'files':>8} {'seconds':>18} {'process':>18} "
+        f"{'API calls':>16} {'peak RSS':>18}"
+    )
+    for record in records:
+        previous = find_previous(history, record, baseline) or {}
+        print(
+            f"{record['scenario']:<26} {record['files']:>8,} "
+            f"{format_change(record['seconds'], previous.get('seconds'), 's'):>18} "
+            f"{format_change(record['process_seconds'], previous.get('process_seconds'), 's'):>18} "
+            f"{format_change(record['api_calls'], previous.get('api_calls'), ''):>16} "
+            f"{format_change(record['peak_rss_mb'], previous.get('peak_rss_mb'), 'MB'):>18}"
+        )
+
+
+def main() -> None:
+    parser = ArgumentParser(
+        description="Benchmark the bar-raiser commands on synthetic monorepos."
+    )
+    parser.add_argument(
+        "--files",
+        type=int,
+        nargs="+",
+        default=[1000],
+        help="Sizes of the synthetic repositories, in Python files.",
+    )
+    parser.add_argument(
+        "--annotations",
+        type=int,
+        default=500,
+        help="Diagnostics in each synthetic tool output.",
+    )
+    parser.add_argument(
+        "--scenario",
+        dest="scenarios",
+        choices=sorted(SCENARIOS),
+        action="append",
+        help="Scenarios to run, all by default.",
+    )
+    parser.add_argument(
+        "--workdir",
+        type=Path,
+        default=Path(gettempdir()) / "bar-raiser-benchmarks",
+        help="Where the synthetic inputs are created and kept.",
+    )
+    parser.add_argument("--results", type=Path, default=RESULTS_PATH)
+    parser.add_argument(
+        "--baseline",
+        help="Compare with the results of this commit rather than the latest ones.",
+    )
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT_SECONDS)
+    parser.add_argument("--run-scenario", help="Internal: run one scenario.")
+    args = parser.parse_args()
+
+    if args.run_scenario:
+        workspace = Workspace(args.workdir)
+        run_scenario(
+            args.run_scenario,
+            workspace,
+            workspace.root / "state" / args.run_scenario / "result.json",
+        )
+        return
+
+    commit, dirty = get_commit()
+    history = load_history(args.results)
+    private_key = get_private_key()
+    recorded_at = datetime.now(UTC).isoformat()
+    records: list[dict[str, Any]] = []
+    for files in args.files:
+        config = SyntheticConfig(files=files, annotations=args.annotations)
+        workspace = Workspace(
+            args.workdir / f"files-{files}-annotations-{args.annotations}"
+        )
+        start = perf_counter()
+        if create_workspace(workspace, config):
+            print(f"Created {workspace.root} in {perf_counter() - start:,.1f}s.")
+        with StandIn(workspace.repo, REPO_NAME) as stand_in:
+            write_event(workspace, stand_in.github.url)
+            for name in args.scenarios or SCENARIOS:
+                measurement = measure_scenario(
+                    name, workspace, stand_in, private_key, args.timeout
+                )
+                if measurement.exit_code != 0:
+                    print(
+                        f"{name} failed with {measurement.exit_code}, see "
+                        f"{workspace.root / 'state' / name / 'output.log'}."
+                    )
+                records.append({
+                    "recorded_at": recorded_at,
+                    "commit": commit,
+                    "dirty": dirty,
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "cpus": os.cpu_count(),
+                    "scenario": name,
+                    "files": files,
+                    "annotations": args.annotations,
+                    "exit_code": measurement.exit_code,
+                    "seconds": measurement.seconds,
+                    "process_seconds": measurement.process_seconds,
+                    "peak_rss_mb": measurement.peak_rss_mb,
+                    "api_calls": sum(
+                        stats["requests"] for stats in measurement.endpoints.values()
+                    ),
+                    "endpoints": measurement.endpoints,
+                })
+
+    print_table(records, history, args.baseline)
+    args.results.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.results, "a", encoding="utf-8") as f:
+        f.writelines(json.dumps(record) + "\n" for record in records)
+    print(f"Appended {len(records)} results to {args.results}.")
+
+
+if __name__ == "__main__":
+    main()
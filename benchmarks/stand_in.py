@@ -0,0 +1,505 @@
+"""
+A local HTTP stand-in for the GitHub, Slack and S3 endpoints bar-raiser calls.
+
+Each service listens on its own port of 127.0.0.1 and answers with the fields
+the clients read, backed by the synthetic repository for git data and by memory
+for S3 objects. Every request is counted per endpoint along with its bytes, so
+the API calls of a run are measured from the server side.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+import subprocess
+from base64 import b64decode
+from collections import Counter
+from email.utils import formatdate
+from hashlib import md5, sha1
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import count
+from threading import Lock, Thread
+from typing import TYPE_CHECKING, Any, ClassVar, Literal, cast
+from urllib.parse import parse_qs, urlsplit
+
+from bar_raiser.utils.instrumentation import get_github_endpoint
+from benchmarks.synthetic import BRANCH, PR_BRANCH
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from pathlib import Path
+
+Service = Literal["github", "slack", "s3"]
+# GitHub truncates recursive tree listings beyond this many entries.
+MAX_TREE_ENTRIES = 100_000
+INSTALLATION_TOKEN_EXPIRES_AT = "2099-01-01T00:00:00Z"
+
+
+class Stats:
+    """Requests and bytes per endpoint, shared by the handlers of all services."""
+
+    def __init__(self) -> None:
+        self.lock = Lock()
+        self.requests = Counter[str]()
+        self.bytes_received = Counter[str]()
+        self.bytes_sent = Counter[str]()
+
+    def record(self, endpoint: str, received: int, sent: int) -> None:
+        with self.lock:
+            self.requests[endpoint] += 1
+            self.bytes_received[endpoint] += received
+            self.bytes_sent[endpoint] += sent
+
+    def snapshot(self) -> dict[str, dict[str, int]]:
+        with self.lock:
+            return {
+                endpoint: {
+                    "requests": requests,
+                    "bytes_received": self.bytes_received[endpoint],
+                    "bytes_sent": self.bytes_sent[endpoint],
+                }
+                for endpoint, requests in sorted(self.requests.items())
+            }
+
+    def reset(self) -> None:
+        with self.lock:
+            self.requests.clear()
+            self.bytes_received.clear()
+            self.bytes_sent.clear()
+
+
+class State:
+    """What the stand-in stores between requests."""
+
+    def __init__(self, repo: Path) -> None:
+        self.repo = repo
+        self.lock = Lock()
+        self.ids = count(1)
+        self.objects: dict[str, bytes] = {}
+        self.refs: dict[str, str] = {}
+
+    def reset(self) -> None:
+        with self.lock:
+            self.objects.clear()
+            self.refs.clear()
+
+
+class Response:
+    def __init__(
+        self,
+        status: int = 200,
+        body: bytes = b"",
+        headers: dict[str, str] | None = None,
+    ) -> None:
+        self.status = status
+        self.body = body
+        self.headers = headers or {}
+
+
+def json_response(data: Any, status: int = 200) -> Response:
+    return Response(
+        status, json.dumps(data).encode(), {"Content-Type": "application/json"}
+    )
+
+
+def read_chunked(handler: BaseHTTPRequestHandler) -> bytes:
+    body = b""
+    while True:
+        size = int(handler.rfile.readline().split(b";")[0], 16)
+        if size == 0:
+            # The trailer section ends with an empty line.
+            while handler.rfile.readline().strip():
+                pass
+            return body
+        body += handler.rfile.read(size)
+        handler.rfile.readline()
+
+
+def decode_aws_chunked(body: bytes) -> bytes:
+    """Decode a body streamed with the aws-chunked content encoding."""
+    data = b""
+    position = 0
+    while True:
+        line_end = body.index(b"\r\n", position)
+        size = int(body[position:line_end].split(b";")[0], 16)
+        if size == 0:
+            return data
+        data += body[line_end + 2 : line_end + 2 + size]
+        position = line_end + 2 + size + 2
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def stand_in(self) -> StandInServer:
+        return cast("StandInServer", self.server)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def read_body(self) -> bytes:
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            body = read_chunked(self)
+        else:
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if "aws-chunked" in self.headers.get("Content-Encoding", ""):
+            body = decode_aws_chunked(body)
+        return body
+
+    def handle_request(self) -> None:
+        body = self.read_body()
+        endpoint, response = self.stand_in.route(self, body)
+        self.send_response(response.status)
+        for name, value in response.headers.items():
+            self.send_header(name, value)
+        if "Content-Length" not in response.headers:
+            self.send_header("Content-Length", str(len(response.body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(response.body)
+        self.stand_in.stats.record(
+            f"{self.stand_in.service} {endpoint}", len(body), len(response.body)
+        )
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = do_HEAD = handle_request
+
+
+def get_installation(data: Any, query: dict[str, str]) -> Response:
+    return json_response({"id": 1, "app_id": 1, "account": {"login": "bench"}})
+
+
+def create_access_token(data: Any, query: dict[str, str]) -> Response:
+    return json_response(
+        {"token": "ghs_bench", "expires_at": INSTALLATION_TOKEN_EXPIRES_AT}, 201
+    )
+
+
+def list_comments(data: Any, query: dict[str, str], number: str) -> Response:
+    # No previous comments, so a regression is always commented on.
+    return json_response([])
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+    service: ClassVar[Service]
+
+    def __init__(self, stats: Stats, state: State) -> None:
+        super().__init__(("127.0.0.1", 0), StandInHandler)
+        self.stats = stats
+        self.state = state
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def route(self, handler: StandInHandler, body: bytes) -> tuple[str, Response]:
+        raise NotImplementedError
+
+
+class GitHubServer(StandInServer):
+    service = "github"
+
+    def __init__(self, stats: Stats, state: State, repo_name: str) -> None:
+        super().__init__(stats, state)
+        self.repo_name = repo_name
+        repo = re.escape(f"/repos/{repo_name}")
+        self.routes: list[tuple[str, re.Pattern[str], Callable[..., Response]]] = [
+            ("GET", re.compile(rf"^{repo}/installation$"), get_installation),
+            (
+                "POST",
+                re.compile(r"^/app/installations/\d+/access_tokens$"),
+                create_access_token,
+            ),
+            ("GET", re.compile(rf"^{repo}$"), self.get_repo),
+            ("POST", re.compile(rf"^{repo}/check-runs$"), self.create_check_run),
+            (
+                "PATCH",
+                re.compile(rf"^{repo}/check-runs/(?P<id>\d+)$"),
+                self.update_check_run,
+            ),
+            (
+                "GET",
+                re.compile(rf"^{repo}/pulls/(?P<number>\d+)/commits$"),
+                self.list_pull_commits,
+            ),
+            (
+                "GET",
+                re.compile(rf"^{repo}/issues/(?P<number>\d+)/comments$"),
+                list_comments,
+            ),
+            (
+                "POST",
+                re.compile(rf"^{repo}/issues/(?P<number>\d+)/comments$"),
+                self.create_comment,
+            ),
+            (
+                "GET",
+                re.compile(rf"^{repo}/git/trees/(?P<sha>[0-9a-f]+)$"),
+                self.get_tree,
+            ),
+            ("POST", re.compile(rf"^{repo}/git/blobs$"), self.create_blob),
+            ("POST", re.compile(rf"^{repo}/git/trees$"), self.create_tree),
+            (
+                "GET",
+                re.compile(rf"^{repo}/git/commits/(?P<sha>[0-9a-f]+)$"),
+                self.get_commit,
+            ),
+            ("POST", re.compile(rf"^{repo}/git/commits$"), self.create_commit),
+            ("GET", re.compile(rf"^{repo}/git/refs?/(?P<ref>.+)$"), self.get_ref),
+            ("PATCH", re.compile(rf"^{repo}/git/refs?/(?P<ref>.+)$"), self.update_ref),
+        ]
+
+    @property
+    def repo_url(self) -> str:
+        return f"{self.url}/repos/{self.repo_name}"
+
+    def route(self, handler: StandInHandler, body: bytes) -> tuple[str, Response]:
+        url = urlsplit(handler.path)
+        endpoint = get_github_endpoint(handler.command, url.path)
+        for method, pattern, action in self.routes:
+            if method == handler.command and (match := pattern.match(url.path)):
+                data: Any = json.loads(body) if body else {}
+                query = {key: values[0] for key, values in parse_qs(url.query).items()}
+                return endpoint, action(data, query, **match.groupdict())
+        return endpoint, json_response({"message": "Not Found"}, 404)
+
+    def git(self, *args: str) -> str:
+        return subprocess.check_output(["git", *args], cwd=self.state.repo, text=True)
+
+    def get_repo(self, data: Any, query: dict[str, str]) -> Response:
+        owner, name = self.repo_name.split("/")
+        return json_response({
+            "id": 1,
+            "name": name,
+            "full_name": self.repo_name,
+            "owner": {"login": owner},
+            "url": self.repo_url,
+        })
+
+    def get_check_run(self, check_id: int, data: Any) -> dict[str, Any]:
+        return {
+            "id": check_id,
+            "name": data.get("name", "check"),
+            "head_sha": data.get("head_sha", ""),
+            "status": data.get("status", "completed"),
+            "conclusion": data.get("conclusion"),
+            "url": f"{self.repo_url}/check-runs/{check_id}",
+            "html_url": f"https://github.com/{self.repo_name}/runs/{check_id}",
+        }
+
+    def create_check_run(self, data: Any, query: dict[str, str]) -> Response:
+        return json_response(self.get_check_run(next(self.state.ids), data), 201)
+
+    def update_check_run(self, data: Any, query: dict[str, str], id: str) -> Response:
+        return json_response(self.get_check_run(int(id), data))
+
+    def list_pull_commits(
+        self, data: Any, query: dict[str, str], number: str
+    ) -> Response:
+        if query.get("page", "1") != "1":
+            return json_response([])
+        output = self.git(
+            "rev-list", "--reverse", "--parents", f"{BRANCH}..{PR_BRANCH}"
+        )
+        commits: list[dict[str, Any]] = []
+        for line in output.splitlines():
+            sha, *parents = line.split()
+            commits.append({
+                "sha": sha,
+                "url": f"{self.repo_url}/commits/{sha}",
+                "parents": [
+                    {"sha": parent, "url": f"{self.repo_url}/commits/{parent}"}
+                    for parent in parents
+                ],
+                "commit": {"message": "", "author": {}, "committer": {}},
+            })
+        return json_response(commits)
+
+    def create_comment(self, data: Any, query: dict[str, str], number: str) -> Response:
+        comment_id = next(self.state.ids)
+        return json_response(
+            {
+                "id": comment_id,
+                "body": data.get("body", ""),
+                "user": {"login": "bar-raiser"},
+                "url": f"{self.repo_url}/issues/comments/{comment_id}",
+            },
+            201,
+        )
+
+    def get_tree(self, data: Any, query: dict[str, str], sha: str) -> Response:
+        args = ["ls-tree", "-z", "--full-tree"]
+        if query.get("recursive"):
+            args.append("-r")
+        entries: list[dict[str, Any]] = []
+        for entry in self.git(*args, sha).split("\0"):
+            if not entry:
+                continue
+            info, path = entry.split("\t", 1)
+            mode, object_type, object_sha = info.split(" ")
+            entries.append({
+                "path": path,
+                "mode": mode,
+                "type": object_type,
+                "sha": object_sha,
+                "url": f"{self.repo_url}/git/blobs/{object_sha}",
+            })
+        return json_response({
+            "sha": sha,
+            "url": f"{self.repo_url}/git/trees/{sha}",
+            "tree": entries[:MAX_TREE_ENTRIES],
+            "truncated": len(entries) > MAX_TREE_ENTRIES,
+        })
+
+    def create_blob(self, data: Any, query: dict[str, str]) -> Response:
+        content = data["content"].encode()
+        if data.get("encoding") == "base64":
+            content = b64decode(content)
+        sha = sha1(b"blob %d\0" % len(content) + content).hexdigest()
+        return json_response(
+            {"sha": sha, "url": f"{self.repo_url}/git/blobs/{sha}"}, 201
+        )
+
+    def create_tree(self, data: Any, query: dict[str, str]) -> Response:
+        sha = sha1(json.dumps(data, sort_keys=True).encode()).hexdigest()
+        return json_response(
+            {"sha": sha, "url": f"{self.repo_url}/git/trees/{sha}", "tree": []}, 201
+        )
+
+    def create_commit(self, data: Any, query: dict[str, str]) -> Response:
+        sha = sha1(json.dumps(data, sort_keys=True).encode()).hexdigest()
+        return json_response(
+            {
+                "sha": sha,
+                "url": f"{self.repo_url}/git/commits/{sha}",
+                "message": data["message"],
+                "tree": {"sha": data["tree"]},
+                "parents": [{"sha": parent} for parent in data["parents"]],
+            },
+            201,
+        )
+
+    def get_commit(self, data: Any, query: dict[str, str], sha: str) -> Response:
+        tree_sha, *parents = self.git("show", "-s", "--format=%T %P", sha).split()
+        return json_response({
+            "sha": sha,
+            "url": f"{self.repo_url}/git/commits/{sha}",
+            "message": "",
+            "tree": {"sha": tree_sha, "url": f"{self.repo_url}/git/trees/{tree_sha}"},
+            "parents": [
+                {"sha": parent, "url": f"{self.repo_url}/git/commits/{parent}"}
+                for parent in parents
+            ],
+        })
+
+    def get_ref_data(self, ref: str) -> dict[str, Any]:
+        with self.state.lock:
+            sha = self.state.refs.get(ref)
+        if sha is None:
+            sha = self.git("rev-parse", ref.removeprefix("heads/")).strip()
+        return {
+            "ref": f"refs/{ref}",
+            "url": f"{self.repo_url}/git/refs/{ref}",
+            "object": {
+                "sha": sha,
+                "type": "commit",
+                "url": f"{self.repo_url}/git/commits/{sha}",
+            },
+        }
+
+    def get_ref(self, data: Any, query: dict[str, str], ref: str) -> Response:
+        return json_response(self.get_ref_data(ref))
+
+    def update_ref(self, data: Any, query: dict[str, str], ref: str) -> Response:
+        with self.state.lock:
+            self.state.refs[ref] = data["sha"]
+        return json_response(self.get_ref_data(ref))
+
+
+class SlackServer(StandInServer):
+    service = "slack"
+
+    def route(self, handler: StandInHandler, body: bytes) -> tuple[str, Response]:  # noqa: PLR6301
+        method = urlsplit(handler.path).path.rsplit("/", 1)[-1]
+        if method == "users.info":
+            return method, json_response({
+                "ok": True,
+                "user": {"real_name": "Bench", "profile": {"image_72": ""}},
+            })
+        return method, json_response({"ok": True, "ts": "1.0"})
+
+
+class S3Server(StandInServer):
+    """Path-style object reads and writes, the S3 calls of the tech debt framework."""
+
+    service = "s3"
+
+    def route(self, handler: StandInHandler, body: bytes) -> tuple[str, Response]:
+        key = urlsplit(handler.path).path
+        endpoint = f"{handler.command} object"
+        if handler.command == "PUT":
+            with self.state.lock:
+                self.state.objects[key] = body
+            return endpoint, Response(headers={"ETag": f'"{md5(body).hexdigest()}"'})
+        with self.state.lock:
+            data = self.state.objects.get(key)
+        if data is None:
+            return endpoint, Response(
+                404,
+                b"<?xml version='1.0' encoding='UTF-8'?><Error><Code>NoSuchKey</Code>"
+                b"<Message>The specified key does not exist.</Message></Error>",
+                {"Content-Type": "application/xml"},
+            )
+        headers = {
+            "ETag": f'"{md5(data).hexdigest()}"',
+            "Last-Modified": formatdate(usegmt=True),
+            "Content-Type": "binary/octet-stream",
+            "Accept-Ranges": "bytes",
+        }
+        if match := re.match(r"bytes=(\d+)-(\d*)", handler.headers.get("Range", "")):
+            start = int(match.group(1))
+            end = int(match.group(2) or len(data) - 1)
+            headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+            return endpoint, Response(206, data[start : end + 1], headers)
+        if handler.command == "HEAD":
+            headers["Content-Length"] = str(len(data))
+            return endpoint, Response(headers=headers)
+        return endpoint, Response(body=data, headers=headers)
+
+
+class StandIn:
+    """The stand-in servers of every service, serving from background threads."""
+
+    def __init__(self, repo: Path, repo_name: str) -> None:
+        self.stats = Stats()
+        self.state = State(repo)
+        self.github = GitHubServer(self.stats, self.state, repo_name)
+        self.slack = SlackServer(self.stats, self.state)
+        self.s3 = S3Server(self.stats, self.state)
+        self.servers: list[StandInServer] = [self.github, self.slack, self.s3]
+
+    def __enter__(self) -> StandIn:
+        for server in self.servers:
+            Thread(target=server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+
+    def get_environment(self) -> dict[str, str]:
+        """The environment pointing the clients of bar-raiser to the stand-in."""
+        return {
+            "GITHUB_API_URL": self.github.url,
+            "SLACK_API_URL": f"{self.slack.url}/api/",
+            "AWS_ENDPOINT_URL_S3": self.s3.url,
+            "AWS_ACCESS_KEY_ID": "bench",
+            "AWS_SECRET_ACCESS_KEY": "bench",
+            "AWS_DEFAULT_REGION": "us-east-1",
+        }
+
+    def reset(self) -> None:
+        self.stats.reset()
+        self.state.reset()
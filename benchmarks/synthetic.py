@@ -0,0 +1,440 @@
+"""
+Synthetic inputs of the benchmark suite: a monorepo of Python files with tech
+debt, a pull request changing some of them, and large outputs of the tools the
+annotate_* commands report, as fake `ruff` and `pyright` executables.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import subprocess
+import sys
+from dataclasses import asdict, dataclass
+from random import Random
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+FILES_PER_PACKAGE = 200
+# The share of files with tech debt, and the most `pyright: ignore` comments
+# one of them has.
+DEBT_FILE_RATIO = 0.3
+MAX_DEBTS_PER_FILE = 5
+# The share of files changed by the pull request, and its bounds.
+CHANGED_FILE_RATIO = 0.01
+MIN_CHANGED_FILES = 10
+MAX_CHANGED_FILES = 500
+BRANCH = "main"
+PR_BRANCH = "feature"
+REPO_NAME = "bench/monorepo"
+AUTHOR_LOGIN = "bench-author"
+AUTHOR_EMAIL = "bench-author@example.com"
+SLACK_USER_ID = "U0BENCH"
+PULL_NUMBER = 1
+PYRIGHT_RULES = (
+    "reportUnknownMemberType",
+    "reportUnknownVariableType",
+    "reportAttributeAccessIssue",
+    "reportArgumentType",
+)
+RUFF_CODES = (
+    ("F401", "`os` imported but unused", "safe"),
+    ("E711", "Comparison to `None` should be `cond is None`", "unsafe"),
+    ("B006", "Do not use mutable data structures for argument defaults", None),
+    ("UP006", "Use `list` instead of `List` for type annotation", "safe"),
+)
+MANIFEST_NAME = "synthetic.json"
+
+
+class WorkspaceInUseError(FileExistsError):
+    def __init__(self, root: Path) -> None:
+        super().__init__(f"{root} holds other files, pick an empty directory.")
+
+
+@dataclass(frozen=True)
+class SyntheticConfig:
+    files: int
+    annotations: int
+    seed: int = 0
+
+
+@dataclass(frozen=True)
+class Workspace:
+    """The paths of the synthetic inputs under a working directory."""
+
+    root: Path
+
+    @property
+    def repo(self) -> Path:
+        return self.root / "repo"
+
+    @property
+    def outputs(self) -> Path:
+        return self.root / "outputs"
+
+    @property
+    def bin(self) -> Path:
+        return self.root / "bin"
+
+    @property
+    def event_path(self) -> Path:
+        return self.root / "event.json"
+
+    @property
+    def slack_mapping_path(self) -> Path:
+        return self.root / "slack_mapping.json"
+
+    def get_manifest(self) -> dict[str, Any] | None:
+        try:
+            return json.loads((self.root / MANIFEST_NAME).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+
+def get_module_path(index: int) -> str:
+    return f"pkg_{index // FILES_PER_PACKAGE:04d}/module_{index:06d}.py"
+
+
+def get_module_source(index: int, debts: int) -> str:
+    """A module of about 60 lines with `debts` pyright ignores."""
+    lines = [
+        f'"""Synthetic module {index}."""',
+        "",
+        "from __future__ import annotations",
+        "",
+        "from dataclasses import dataclass",
+        "from typing import Any",
+        "",
+        "",
+        "@dataclass",
+        f"class Record{index}:",
+        "    key: str",
+        "    value: int",
+        "    tags: list[str]",
+        "",
+        "    def describe(self) -> str:",
+        '        return f"{self.key}={self.value} ({", ".join(self.tags)})"',
+        "",
+        "",
+    ]
+    for function in range(8):
+        lines.extend([
+            f"def transform_{function}(records: list[Any], factor: int = {function + 1}) -> list[int]:",
+            "    results: list[int] = []",
+            "    for record in records:",
+        ])
+        if function < debts:
+            lines.append(
+                "        results.append(record.value * factor)"
+                f"  # pyright: ignore[{PYRIGHT_RULES[function % len(PYRIGHT_RULES)]}]"
+            )
+        else:
+            lines.append("        results.append(int(record) * factor)")
+        lines.extend(["    return results", "", ""])
+    return "\n".join(lines).rstrip() + "\n"
+
+
+def get_debts(random: Random) -> int:
+    if random.random() >= DEBT_FILE_RATIO:
+        return 0
+    return random.randint(1, MAX_DEBTS_PER_FILE)
+
+
+def run_git(repo: Path, *args: str) -> str:
+    env = {
+        **os.environ,
+        "GIT_AUTHOR_NAME": AUTHOR_LOGIN,
+        "GIT_AUTHOR_EMAIL": AUTHOR_EMAIL,
+        "GIT_COMMITTER_NAME": AUTHOR_LOGIN,
+        "GIT_COMMITTER_EMAIL": AUTHOR_EMAIL,
+    }
+    return subprocess.check_output(["git", *args], cwd=repo, env=env, text=True)
+
+
+def get_changed_files(config: SyntheticConfig) -> int:
+    changed = round(config.files * CHANGED_FILE_RATIO)
+    return max(MIN_CHANGED_FILES, min(MAX_CHANGED_FILES, changed, config.files))
+
+
+def create_repo(workspace: Workspace, config: SyntheticConfig) -> None:
+    """
+    Create a repository with a base commit of `config.files` modules on the
+    main branch, and a head commit on the pull request branch which adds tech
+    debt to some modules, removes it from others and adds new modules.
+    """
+    random = Random(config.seed)
+    repo = workspace.repo
+    repo.mkdir(parents=True)
+    run_git(repo, "init", "-q", "-b", BRANCH)
+    for index in range(config.files):
+        path = repo / get_module_path(index)
+        path.parent.mkdir(exist_ok=True)
+        path.write_text(get_module_source(index, get_debts(random)), encoding="utf-8")
+    run_git(repo, "add", "-A")
+    run_git(repo, "commit", "-q", "-m", "Add the synthetic monorepo")
+
+    run_git(repo, "checkout", "-q", "-b", PR_BRANCH)
+    changed = get_changed_files(config)
+    for index in random.sample(range(config.files), changed):
+        path = repo / get_module_path(index)
+        path.write_text(
+            get_module_source(index, random.randint(0, MAX_DEBTS_PER_FILE)),
+            encoding="utf-8",
+        )
+    for index in range(config.files, config.files + max(1, changed // 10)):
+        path = repo / get_module_path(index)
+        path.parent.mkdir(exist_ok=True)
+        path.write_text(get_module_source(index, get_debts(random)), encoding="utf-8")
+    run_git(repo, "add", "-A")
+    run_git(repo, "commit", "-q", "-m", f"Change {changed} modules (#{PULL_NUMBER})")
+
+
+def get_annotated_paths(config: SyntheticConfig, random: Random) -> list[str]:
+    return [
+        get_module_path(random.randrange(config.files))
+        for _ in range(config.annotations)
+    ]
+
+
+def write_ruff_outputs(workspace: Workspace, config: SyntheticConfig) -> None:
+    random = Random(config.seed + 1)
+    repo = workspace.repo
+    reformat_paths = sorted({
+        get_module_path(random.randrange(config.files))
+        for _ in range(max(1, config.annotations // 10))
+    })
+    (workspace.outputs / "ruff_format.txt").write_text(
+        "".join(f"Would reformat: {path}\n" for path in reformat_paths)
+        + f"{len(reformat_paths)} files would be reformatted, "
+        f"{config.files - len(reformat_paths)} files already formatted\n",
+        encoding="utf-8",
+    )
+    diagnostics: list[str] = []
+    for path in get_annotated_paths(config, random):
+        code, message, applicability = random.choice(RUFF_CODES)
+        row = random.randint(1, 60)
+        diagnostics.append(
+            json.dumps({
+                "cell": None,
+                "code": code,
+                "end_location": {"column": 20, "row": row},
+                "filename": str(repo / path),
+                "fix": None
+                if applicability is None
+                else {"applicability": applicability, "edits": [], "message": None},
+                "location": {"column": 1, "row": row},
+                "message": message,
+                "noqa_row": row,
+                "url": f"https://docs.astral.sh/ruff/rules/{code.lower()}",
+            })
+        )
+    (workspace.outputs / "ruff_check.jsonl").write_text(
+        "\n".join(diagnostics) + "\n", encoding="utf-8"
+    )
+
+
+def write_pyright_output(workspace: Workspace, config: SyntheticConfig) -> None:
+    random = Random(config.seed + 2)
+    diagnostics: list[dict[str, Any]] = []
+    for path in get_annotated_paths(config, random):
+        line = random.randint(0, 59)
+        rule = random.choice(PYRIGHT_RULES)
+        diagnostics.append({
+            "file": str(workspace.repo / path),
+            "severity": "error",
+            "message": f'Type of "value" is partially unknown\n  Type of "value" is "Any" ({rule})',
+            "range": {
+                "start": {"line": line, "character": 8},
+                "end": {"line": line, "character": 40},
+            },
+            "rule": rule,
+        })
+    output: dict[str, Any] = {
+        "version": "1.1.400",
+        "time": "0",
+        "generalDiagnostics": diagnostics,
+        "summary": {
+            "filesAnalyzed": config.files,
+            "errorCount": len(diagnostics),
+            "warningCount": 0,
+            "informationCount": 0,
+            "timeInSec": 1.0,
+        },
+    }
+    (workspace.outputs / "pyright.json").write_text(
+        json.dumps(output, indent=4), encoding="utf-8"
+    )
+
+
+def write_pytest_report(workspace: Workspace, config: SyntheticConfig) -> None:
+    random = Random(config.seed + 3)
+    tests: list[dict[str, Any]] = []
+    total = config.annotations * 10
+    for index in range(total):
+        failed = index % 10 == 0
+        call: dict[str, Any] = {"duration": 0.001, "outcome": "passed"}
+        if failed:
+            call = {
+                "duration": 0.01,
+                "outcome": "failed",
+                "longrepr": "def test_case():\n>       assert transform(records) == expected\n"
+                + "E       AssertionError: assert [1, 2] == [1, 3]\n" * 20,
+            }
+        tests.append({
+            "nodeid": f"tests/test_module_{random.randrange(config.files):06d}.py::test_case_{index}",
+            "lineno": random.randint(1, 200),
+            "outcome": call["outcome"],
+            "keywords": [f"test_case_{index}"],
+            "setup": {"duration": 0.0001, "outcome": "passed"},
+            "call": call,
+            "teardown": {"duration": 0.0001, "outcome": "passed"},
+        })
+    report: dict[str, Any] = {
+        "created": 0.0,
+        "duration": total * 0.001,
+        "exitcode": 1,
+        "root": str(workspace.repo),
+        "environment": {},
+        "summary": {
+            "passed": total - config.annotations,
+            "failed": config.annotations,
+            "total": total,
+            "collected": total,
+        },
+        "tests": tests,
+    }
+    (workspace.outputs / "pytest_report.json").write_text(
+        json.dumps(report), encoding="utf-8"
+    )
+
+
+def write_diff_cover_reports(workspace: Workspace, config: SyntheticConfig) -> None:
+    random = Random(config.seed + 4)
+    src_stats: dict[str, dict[str, Any]] = {}
+    violations = 0
+    for path in get_annotated_paths(config, random):
+        start = random.randint(1, 50)
+        violation_lines = list(range(start, start + random.randint(1, 5)))
+        stats = src_stats.setdefault(
+            path, {"percent_covered": 50.0, "violation_lines": [], "covered_lines": []}
+        )
+        stats["violation_lines"] = sorted({*stats["violation_lines"], *violation_lines})
+        violations += len(violation_lines)
+    report: dict[str, Any] = {
+        "report_name": "XML",
+        "diff_name": "origin/main...HEAD, staged and unstaged changes",
+        "src_stats": src_stats,
+        "total_num_lines": violations * 2,
+        "total_num_violations": violations,
+        "total_percent_covered": 50,
+        "num_changed_lines": violations * 2,
+    }
+    (workspace.outputs / "diff_cover.json").write_text(
+        json.dumps(report), encoding="utf-8"
+    )
+    markdown = "# Diff Coverage\n## Diff: origin/main...HEAD\n\n"
+    markdown += "".join(
+        f"- {path} (50.0%): Missing lines {', '.join(map(str, stats['violation_lines']))}\n"
+        for path, stats in src_stats.items()
+    )
+    markdown += f"\n## Summary\n\n- **Total**: {violations * 2} lines\n- **Missing**: {violations} lines\n- **Coverage**: 50%\n\n\n\n"
+    (workspace.outputs / "diff_cover.md").write_text(markdown, encoding="utf-8")
+
+
+def write_executable(path: Path, source: str) -> None:
+    path.write_text(f"#!{sys.executable}\n{source}", encoding="utf-8")
+    path.chmod(0o755)
+
+
+def write_fake_tools(workspace: Workspace) -> None:
+    """
+    Write `ruff` and `pyright` executables which print the synthetic outputs,
+    so the annotate_* commands run as in CI but without analyzing the repo.
+    """
+    workspace.bin.mkdir()
+    outputs = workspace.outputs
+    write_executable(
+        workspace.bin / "ruff",
+        "import sys\n"
+        f"name = {str(outputs / 'ruff_format.txt')!r} if sys.argv[1] == 'format' "
+        f"else {str(outputs / 'ruff_check.jsonl')!r}\n"
+        "with open(name, 'rb') as f:\n"
+        "    sys.stdout.buffer.write(f.read())\n"
+        "sys.exit(1)\n",
+    )
+    write_executable(
+        workspace.bin / "pyright",
+        "import sys\n"
+        f"with open({str(outputs / 'pyright.json')!r}, 'rb') as f:\n"
+        "    sys.stdout.buffer.write(f.read())\n"
+        "sys.exit(1)\n",
+    )
+
+
+def write_event(workspace: Workspace, api_url: str) -> None:
+    """The pull_request event of the head commit, as GITHUB_EVENT_PATH."""
+    base_sha = run_git(workspace.repo, "rev-parse", BRANCH).strip()
+    head_sha = run_git(workspace.repo, "rev-parse", PR_BRANCH).strip()
+    repo_url = f"{api_url}/repos/{REPO_NAME}"
+    owner, name = REPO_NAME.split("/")
+    repository: dict[str, Any] = {
+        "id": 1,
+        "name": name,
+        "full_name": REPO_NAME,
+        "owner": {"login": owner, "type": "Organization"},
+        "url": repo_url,
+        "html_url": f"https://github.com/{REPO_NAME}",
+        "default_branch": BRANCH,
+    }
+    pull_request: dict[str, Any] = {
+        "id": 1,
+        "number": PULL_NUMBER,
+        "state": "open",
+        "draft": False,
+        "title": "Change synthetic modules",
+        "url": f"{repo_url}/pulls/{PULL_NUMBER}",
+        "issue_url": f"{repo_url}/issues/{PULL_NUMBER}",
+        "html_url": f"https://github.com/{REPO_NAME}/pull/{PULL_NUMBER}",
+        "user": {"login": AUTHOR_LOGIN, "type": "User"},
+        "head": {"ref": PR_BRANCH, "sha": head_sha},
+        "base": {"ref": BRANCH, "sha": base_sha},
+        "labels": [],
+        "requested_reviewers": [],
+        "requested_teams": [],
+    }
+    event: dict[str, Any] = {
+        "action": "synchronize",
+        "number": PULL_NUMBER,
+        "pull_request": pull_request,
+        "repository": repository,
+        "organization": {"login": owner},
+    }
+    workspace.event_path.write_text(json.dumps(event), encoding="utf-8")
+
+
+def create_workspace(workspace: Workspace, config: SyntheticConfig) -> bool:
+    """
+    Create the synthetic inputs of `config` under `workspace`, reusing the ones
+    of a previous run with the same config. Returns whether they were created.
+    """
+    if workspace.get_manifest() == asdict(config):
+        return False
+    if workspace.root.exists() and any(workspace.root.iterdir()):
+        raise WorkspaceInUseError(workspace.root)
+    workspace.root.mkdir(parents=True, exist_ok=True)
+    create_repo(workspace, config)
+    workspace.outputs.mkdir()
+    write_ruff_outputs(workspace, config)
+    write_pyright_output(workspace, config)
+    write_pytest_report(workspace, config)
+    write_diff_cover_reports(workspace, config)
+    write_fake_tools(workspace)
+    workspace.slack_mapping_path.write_text(
+        json.dumps({AUTHOR_LOGIN: SLACK_USER_ID}), encoding="utf-8"
+    )
+    (workspace.root / MANIFEST_NAME).write_text(
+        json.dumps(asdict(config)), encoding="utf-8"
+    )
+    return True
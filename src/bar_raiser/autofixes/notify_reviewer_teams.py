@@ -20,7 +20,11 @@ if TYPE_CHECKING:
     from github.PullRequest import PullRequest
 
 
-from bar_raiser.utils.github import get_pull_request, initialize_logging
+from bar_raiser.utils.github import (
+    get_pull_request,
+    get_review_requests,
+    initialize_logging,
+)
 from bar_raiser.utils.slack import (
     get_id_from_mapping_path,
     post_a_slack_message,
@@ -250,7 +254,7 @@ def process_pull_request(  # noqa: PLR0917, PLR0912
     accumulated_comments = ""
 
     # Get review requests - returns (teams, users)
-    review_requests = pull_request.get_review_requests()
+    review_requests = get_review_requests(pull_request)
 
     # Collect individual reviewer logins
     individual_reviewers = [
@@ -12,6 +12,7 @@ from bar_raiser.utils.github import (
     create_check_run,
     get_github_repo,
     get_head_sha,
+    initialize_logging,
 )
 from bar_raiser.utils.slack import dm_on_check_failure
 
@@ -75,6 +76,7 @@ CHECK_NAME = "python-diff-cover-report"
 
 
 def main():
+    initialize_logging()
     parser = create_arg_parser_with_slack_dm_on_failure()
     parser.add_argument(
         "diff_cover_json_report",
@@ -102,6 +104,7 @@ def main():
         ),
         annotations=get_annotations(diff_cover_json),
         actions=[],
+        single_check_run=True,
     )
     if args.slack_dm_on_failure:
         dm_on_check_failure(checks, args.slack_dm_on_failure)
@@ -64,6 +64,7 @@ def main():
         summary=summary,
         annotations=[],  # No annotations needed for this check
         actions=[],
+        single_check_run=True,
     )
 
     message = "CAUTION: Please rebase your commits onto the latest master branch to prevent potential linting errors."
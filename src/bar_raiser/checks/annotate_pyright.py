@@ -3,15 +3,21 @@ from __future__ import annotations
 from json import loads
 from logging import getLogger
 from pathlib import Path
-from subprocess import CalledProcessError, check_output
 from sys import exit
+from typing import NotRequired, TypedDict
 
-from bar_raiser.utils.check import create_arg_parser_with_slack_dm_on_failure
+from bar_raiser.utils.check import (
+    JsonArrayStreamDecoder,
+    add_changed_lines_arguments,
+    create_arg_parser_with_slack_dm_on_failure,
+    get_diff_index_for_args,
+    run_command_streaming,
+)
 from bar_raiser.utils.github import (
     Action,
     Annotation,
     Autofixes,
-    create_check_run,
+    CheckRunUploader,
     get_git_repo,
     get_github_repo,
     get_head_sha,
@@ -24,27 +30,41 @@ logger = getLogger(__name__)
 CHECK_NAME = "python-pyright-report"
 
 
-def get_annotations_and_actions_for_pyright_check(
-    working_dir: Path, pyright_output_json: str
-) -> tuple[list[Annotation], list[Action]]:
-    annotations: list[Annotation] = []
-    data = loads(pyright_output_json)
-    action_ids: set[str] = set()
-    for error in data["generalDiagnostics"]:
-        rule = f" [{error['rule']}]" if "rule" in error else ""
-        annotations.append(
-            Annotation(
-                path=str(Path(error["file"]).relative_to(working_dir)),
-                start_line=error["range"]["start"]["line"]
-                + 1,  # pyright uses 0-based line numbers
-                end_line=error["range"]["end"]["line"] + 1,
-                annotation_level="failure",
-                message=error["message"] + rule,
-            )
-        )
-        if 'Unnecessary "# pyright: ignore"' in error["message"]:
-            action_ids.add(Autofixes.PYRIGHT_IGNORES.value)
-    actions = [
+class PyrightDiagnostic(TypedDict):
+    file: str
+    message: str
+    range: dict[str, dict[str, int]]
+    rule: NotRequired[str]
+    severity: NotRequired[str]
+
+
+def is_pyright_error(diagnostic: PyrightDiagnostic) -> bool:
+    """Warnings and information don't fail pyright, so they aren't annotated."""
+    return diagnostic.get("severity", "error") == "error"
+
+
+def get_annotation_for_pyright_diagnostic(
+    working_dir: Path, error: PyrightDiagnostic
+) -> Annotation:
+    rule = f" [{error['rule']}]" if "rule" in error else ""
+    return Annotation(
+        path=str(Path(error["file"]).relative_to(working_dir)),
+        start_line=error["range"]["start"]["line"]
+        + 1,  # pyright uses 0-based line numbers
+        end_line=error["range"]["end"]["line"] + 1,
+        annotation_level="failure",
+        message=error["message"] + rule,
+    )
+
+
+def get_autofix_ids_for_pyright_diagnostic(error: PyrightDiagnostic) -> set[str]:
+    if 'Unnecessary "# pyright: ignore"' in error["message"]:
+        return {Autofixes.PYRIGHT_IGNORES.value}
+    return set()
+
+
+def get_actions(action_ids: set[str]) -> list[Action]:
+    return [
         Action(
             label="autofix",
             description="Click to auto-push an autofix commit",
@@ -52,52 +72,72 @@ def get_annotations_and_actions_for_pyright_check(
         )
         for action_id in action_ids
     ]
-    return annotations, actions
 
 
-def main() -> None:
-    initialize_logging()
-    args = create_arg_parser_with_slack_dm_on_failure().parse_args()
-    git_repo = get_git_repo()
+def get_annotations_and_actions_for_pyright_check(
+    working_dir: Path, pyright_output_json: str
+) -> tuple[list[Annotation], list[Action]]:
     annotations: list[Annotation] = []
-    actions: list[Action] = []
-    return_code = -1
-    try:
-        output = check_output(
-            [
-                "pyright",
-                "--outputjson",
-            ],
-        )
-        pyright_output_json = output.decode("utf-8")
-        return_code = 0
-    except CalledProcessError as e:
-        pyright_output_json = e.output.decode("utf-8")
-        annotations, actions = get_annotations_and_actions_for_pyright_check(
-            Path(git_repo.working_dir), pyright_output_json
-        )
-        return_code = e.returncode
+    data = loads(pyright_output_json)
+    action_ids: set[str] = set()
+    for error in data["generalDiagnostics"]:
+        if not is_pyright_error(error):
+            continue
+        annotations.append(get_annotation_for_pyright_diagnostic(working_dir, error))
+        action_ids |= get_autofix_ids_for_pyright_diagnostic(error)
+    return annotations, get_actions(action_ids)
 
-    summary = f"Pyright found {len(annotations)} errors."
-    if len(actions) > 0:
-        summary += "Autofix is available. Simply click :point_up_2: the above `autofix` button to apply.\n"
-        summary += "After the autofix, if you plan to continue developing, run `git pull --rebase` to fetch the changes in your working directory.\n\n"
 
-    logger.info(summary)
-    for annotation in annotations:
-        logger.info(
-            f"{annotation['path']}:{annotation['start_line']}:{annotation['message']}"
-        )
-    checks = create_check_run(
+def main() -> None:
+    initialize_logging()
+    parser = create_arg_parser_with_slack_dm_on_failure()
+    add_changed_lines_arguments(parser)
+    args = parser.parse_args()
+    git_repo = get_git_repo()
+    working_dir = Path(git_repo.working_dir)
+    diff_index = get_diff_index_for_args(args, git_repo)
+    action_ids: set[str] = set()
+    decoder = JsonArrayStreamDecoder("generalDiagnostics")
+    with CheckRunUploader(
         repo=get_github_repo(),
         name=CHECK_NAME,
         head_sha=get_head_sha(),
-        conclusion="success" if len(annotations) == 0 else "action_required",
         title="Python Pyright Type Checker",
-        summary=summary,
-        annotations=annotations,
-        actions=actions,
-    )
+    ) as uploader:
+
+        def on_line(line: str) -> None:
+            for error in decoder.feed(line + "\n"):
+                if not is_pyright_error(error):
+                    continue
+                annotation = get_annotation_for_pyright_diagnostic(working_dir, error)
+                if diff_index is not None and not diff_index.contains(annotation):
+                    continue
+                logger.info(
+                    f"{annotation['path']}:{annotation['start_line']}:{annotation['message']}"
+                )
+                uploader.add(annotation)
+                action_ids.update(get_autofix_ids_for_pyright_diagnostic(error))
+
+        return_code = run_command_streaming(
+            ["pyright", "--outputjson"], on_line, merge_stderr=False
+        )
+        actions = get_actions(action_ids)
+
+        summary = f"Pyright found {uploader.annotation_count} errors."
+        if len(actions) > 0:
+            summary += "Autofix is available. Simply click :point_up_2: the above `autofix` button to apply.\n"
+            summary += "After the autofix, if you plan to continue developing, run `git pull --rebase` to fetch the changes in your working directory.\n\n"
+
+        logger.info(summary)
+        checks = uploader.complete(
+            # Errors outside the changed lines, or that the tool failed to
+            # report, still fail the check.
+            conclusion="success"
+            if return_code == 0 and uploader.annotation_count == 0
+            else "action_required",
+            summary=summary,
+            actions=actions,
+        )
     if args.slack_dm_on_failure:
         dm_on_check_failure(checks, args.slack_dm_on_failure)
 
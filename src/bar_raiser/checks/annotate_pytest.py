@@ -4,13 +4,18 @@ from json import loads
 from pathlib import Path
 from typing import NotRequired, TypedDict
 
-from bar_raiser.utils.check import create_arg_parser_with_slack_dm_on_failure
+from bar_raiser.utils.check import (
+    add_changed_lines_arguments,
+    create_arg_parser_with_slack_dm_on_failure,
+    get_diff_index_for_args,
+)
 from bar_raiser.utils.github import (
     Annotation,
     create_check_run,
     get_git_repo,
     get_github_repo,
     get_head_sha,
+    initialize_logging,
 )
 from bar_raiser.utils.slack import dm_on_check_failure
 
@@ -69,7 +74,9 @@ def get_summary(pytest_report_json: PytestReportJson) -> str:
 
 
 def main():
+    initialize_logging()
     parser = create_arg_parser_with_slack_dm_on_failure()
+    add_changed_lines_arguments(parser)
     parser.add_argument(
         "pytest_json_report",
         type=Path,
@@ -77,16 +84,24 @@ def main():
     )
     args = parser.parse_args()
     pytest_report_json: PytestReportJson = loads(args.pytest_json_report.read_text())
-    annotations = get_annotations(pytest_report_json, Path(get_git_repo().working_dir))
+    git_repo = get_git_repo()
+    failures = get_annotations(pytest_report_json, Path(git_repo.working_dir))
+    diff_index = get_diff_index_for_args(args, git_repo)
+    # A change can fail tests elsewhere, so only the annotations are filtered
+    # and every failure fails the check.
+    annotations = (
+        failures if diff_index is None else diff_index.filter_annotations(failures)
+    )
     checks = create_check_run(
         repo=get_github_repo(),
         name=CHECK_NAME,
         head_sha=get_head_sha(),
-        conclusion="action_required" if len(annotations) > 0 else "success",
+        conclusion="action_required" if len(failures) > 0 else "success",
         title="Python Pytest Report",
         summary=get_summary(pytest_report_json),
         annotations=annotations,
         actions=[],
+        single_check_run=True,
     )
     if args.slack_dm_on_failure:
         dm_on_check_failure(checks, args.slack_dm_on_failure)
@@ -1,21 +1,25 @@
 from __future__ import annotations
 
+from json import JSONDecodeError, loads
 from logging import getLogger
 from pathlib import Path
-from subprocess import STDOUT, CalledProcessError, check_output
 from sys import exit
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, TypedDict
 
 from bar_raiser.utils.check import (
+    CheckCommand,
     CheckPattern,
+    add_changed_lines_arguments,
     create_arg_parser_with_slack_dm_on_failure,
-    get_annotations_and_actions,
+    get_autofix_action,
+    get_diff_index_for_args,
+    run_check_commands,
 )
 from bar_raiser.utils.github import (
     Action,
     Annotation,
     Autofixes,
-    create_check_run,
+    CheckRunUploader,
     get_git_repo,
     get_github_repo,
     get_head_sha,
@@ -43,83 +47,133 @@ RUFF_FORMAT_PATTERNS = [
     WOULD_REFORMAT_PATTERN,
     CANNOT_FORMAT_PATTERN,
 ]
-CHECK_ERROR_PATTERN = CheckPattern(
-    regex="^(?P<path>[^:]+):(?P<line>[0-9]+):[0-9]+: (?P<message>.*)$"
-)
-CANNOT_PARSE_PATTERN = CheckPattern(
-    regex="^error: Failed to parse (?P<path>[^:]+):(?P<line>[0-9]+):[0-9]+: (?P<message>.*)$"
-)
-FIXABLE_PATTERN = CheckPattern(
-    regex="^.* fixable with the `--fix` option.$",
-    should_create_annotation=False,
-    is_autofixable=True,
-)
-RUFF_CHECK_PATTERNS = [CANNOT_PARSE_PATTERN, CHECK_ERROR_PATTERN, FIXABLE_PATTERN]
+
+
+RUFF_CHECK_CMD = ["ruff", "check", "--output-format=json-lines", "."]
+
+
+def is_would_reformat_annotation(annotation: Annotation) -> bool:
+    """Whether `annotation` is about the formatting of a whole file."""
+    return annotation["message"] == WOULD_REFORMAT_PATTERN.message
+
+
+class RuffFix(TypedDict):
+    applicability: str
+    message: str | None
+
+
+class RuffDiagnostic(TypedDict):
+    code: str | None
+    filename: str
+    message: str
+    location: dict[str, int]
+    end_location: dict[str, int]
+    fix: RuffFix | None
+
+
+def get_annotation_for_ruff_diagnostic(
+    working_dir: Path, diagnostic: RuffDiagnostic
+) -> Annotation:
+    code = diagnostic["code"] or "invalid-syntax"
+    fixable = " [*]" if is_ruff_diagnostic_autofixable(diagnostic) else ""
+    return Annotation(
+        path=str(Path(diagnostic["filename"]).relative_to(working_dir)),
+        start_line=diagnostic["location"]["row"],
+        end_line=diagnostic["end_location"]["row"],
+        annotation_level="failure",
+        message=f"{code}{fixable} {diagnostic['message']}",
+    )
+
+
+def is_ruff_diagnostic_autofixable(diagnostic: RuffDiagnostic) -> bool:
+    # `ruff check --fix` only applies safe fixes.
+    fix = diagnostic["fix"]
+    return fix is not None and fix["applicability"] == "safe"
+
+
+class RuffDiagnosticParser:
+    """
+    Parse the output of `ruff check --output-format=json-lines`, which prints
+    one JSON diagnostic per line, into annotations as the lines arrive.
+    """
+
+    def __init__(
+        self, working_dir: Path, on_annotation: Callable[[Annotation], object]
+    ) -> None:
+        self.working_dir = working_dir
+        self.on_annotation = on_annotation
+        self.is_autofix_available = False
+
+    def feed(self, line: str) -> None:
+        if not line:
+            return
+        try:
+            diagnostic: RuffDiagnostic = loads(line)
+        except JSONDecodeError:
+            # Ruff prints some warnings, e.g. of its settings, to stdout.
+            logger.warning(f"Skipping a line of ruff output that is not JSON: {line}")
+            return
+        if is_ruff_diagnostic_autofixable(diagnostic):
+            self.is_autofix_available = True
+        self.on_annotation(
+            get_annotation_for_ruff_diagnostic(self.working_dir, diagnostic)
+        )
 
 
 def main() -> None:
     initialize_logging()
-    args = create_arg_parser_with_slack_dm_on_failure().parse_args()
+    parser = create_arg_parser_with_slack_dm_on_failure()
+    add_changed_lines_arguments(parser)
+    args = parser.parse_args()
     git_repo = get_git_repo()
-    annotations: list[Annotation] = []
+    diff_index = get_diff_index_for_args(args, git_repo)
     actions: list[Action] = []
-    cmds_parsers: list[
-        tuple[list[str], Callable[[Path, str], tuple[list[Annotation], Action | None]]]
-    ] = [
-        (
-            ["ruff", "format", "--check", "."],
-            lambda wd, output: get_annotations_and_actions(
-                wd,
-                output,
-                [WOULD_REFORMAT_PATTERN, CANNOT_FORMAT_PATTERN],
-                Autofixes.RUFF,
-            ),
-        ),
-        (
-            ["ruff", "check", "."],
-            lambda wd, output: get_annotations_and_actions(
-                wd,
-                output,
-                [CHECK_ERROR_PATTERN, CANNOT_PARSE_PATTERN, FIXABLE_PATTERN],
-                Autofixes.RUFF,
-            ),
-        ),
-    ]
-    RETURN_CODE_NOT_SET = -100
-    return_code = RETURN_CODE_NOT_SET
-    for cmds, parser in cmds_parsers:
-        try:
-            output = check_output(cmds, stderr=STDOUT)
-            ruff_output = output.decode("utf-8")
-            if return_code == RETURN_CODE_NOT_SET:
-                return_code = 0
-        except CalledProcessError as e:
-            ruff_output = e.output.decode("utf-8")
-            return_code = e.returncode
-            new_annotations, action = parser(Path(git_repo.working_dir), ruff_output)
-            annotations.extend(new_annotations)
-            if len(actions) == 0 and action is not None:
-                actions.append(action)
-
-        logger.info(ruff_output)
-
-    summary = f"Ruff found {len(annotations)} errors."
-    if len(actions) > 0:
-        summary += "Autofix is available. Simply click :point_up_2: the above `autofix` button to apply.\n"
-        summary += "After the autofix, if you plan to continue developing, run `git pull --rebase` to fetch the changes in your working directory.\n\n"
-        summary += "To fix format errors manually in your working directory, run: `ruff format .`"
-        summary += "To fix check errors manually in your working directory, run: `ruff check --fix .`"
-
-    checks = create_check_run(
+    with CheckRunUploader(
         repo=get_github_repo(),
         name=CHECK_NAME,
         head_sha=get_head_sha(),
-        conclusion="success" if len(annotations) == 0 else "action_required",
         title="Python Ruff formatter and linter",
-        summary=summary,
-        annotations=annotations,
-        actions=list(actions),
-    )
+    ) as uploader:
+        results = run_check_commands(
+            [
+                CheckCommand(["ruff", "format", "--check", "."], RUFF_FORMAT_PATTERNS),
+                CheckCommand(
+                    RUFF_CHECK_CMD,
+                    create_parser=RuffDiagnosticParser,
+                    merge_stderr=False,
+                ),
+            ],
+            Path(git_repo.working_dir),
+            uploader.add
+            if diff_index is None
+            else diff_index.wrap(uploader.add, is_would_reformat_annotation),
+        )
+        RETURN_CODE_NOT_SET = -100
+        return_code = RETURN_CODE_NOT_SET
+        for result in results:
+            if result.return_code != 0:
+                return_code = result.return_code
+                if len(actions) == 0 and result.is_autofix_available:
+                    actions.append(get_autofix_action(Autofixes.RUFF))
+            elif return_code == RETURN_CODE_NOT_SET:
+                return_code = 0
+
+        summary = f"Ruff found {uploader.annotation_count} errors."
+        if len(actions) > 0:
+            summary += "Autofix is available. Simply click :point_up_2: the above `autofix` button to apply.\n"
+            summary += "After the autofix, if you plan to continue developing, run `git pull --rebase` to fetch the changes in your working directory.\n\n"
+            summary += "To fix format errors manually in your working directory, run: `ruff format .`"
+            summary += "To fix check errors manually in your working directory, run: `ruff check --fix .`"
+
+        checks = uploader.complete(
+            # Errors outside the changed lines, or that the tool failed to
+            # report, still fail the check.
+            conclusion="success"
+            if return_code == 0 and uploader.annotation_count == 0
+            else "action_required",
+            summary=summary,
+            actions=actions,
+        )
     if len(actions) > 0:
         logger.info(
             f"Autofix is available. Simply click the autofix button on the following page to apply: {' '.join([check.html_url for check in checks])}"
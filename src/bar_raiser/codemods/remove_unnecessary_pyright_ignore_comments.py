@@ -11,6 +11,8 @@ from libcst import Comment, Module, RemovalSentinel
 from libcst.codemod import CodemodContext, VisitorBasedCodemodCommand
 from libcst.metadata import PositionProvider
 
+from bar_raiser.utils.profiling import initialize_profiling
+
 if TYPE_CHECKING:
     from libcst.metadata import CodeRange
 
@@ -54,6 +56,8 @@ class RemoveUnnecessaryPyrightIgnoreComments(VisitorBasedCodemodCommand):
 
     def __init__(self, context: CodemodContext) -> None:
         super().__init__(context)
+        # The codemod runs under libcst.tool, so it's profiled from here on.
+        initialize_profiling("remove_unnecessary_pyright_ignore_comments")
 
         filenames = [self.context.filename] if self.context.filename else sys.argv[3:]
         pyright_project = cast(
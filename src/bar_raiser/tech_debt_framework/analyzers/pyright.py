@@ -1,25 +1,17 @@
 from __future__ import annotations
 
+from token import COMMENT
 from typing import TYPE_CHECKING
 
-from fixit import InvalidTestCase as Invalid
-
-from bar_raiser.tech_debt_framework.utils import BaseCodeAnalyzer, TechDebtCategory
+from bar_raiser.tech_debt_framework.utils import BaseTokenAnalyzer, TechDebtCategory
 
 if TYPE_CHECKING:
-    from libcst import Comment
+    from tokenize import TokenInfo
 
 
-class FindPyrightIgnores(BaseCodeAnalyzer):
-    INVALID = [  # noqa: RUF012
-        Invalid("slack_text = subject  # pyright: ignore[reportUnboundVariable]")
-    ]
+class FindPyrightIgnores(BaseTokenAnalyzer):
+    TRIGGERS = (b"# pyright: ignore",)
 
-    def visit_Comment(self, node: Comment) -> bool | None:
-        if node.value.startswith("# pyright: ignore"):
-            self.report(
-                node,
-                TechDebtCategory.PYRIGHT_IGNORE.value,
-                "Pyright ignore comment found",
-            )
-        return super().visit_Comment(node)
+    def visit_token(self, token: TokenInfo) -> None:
+        if token.type == COMMENT and token.string.startswith("# pyright: ignore"):
+            self.report(token, TechDebtCategory.PYRIGHT_IGNORE.value)
@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import re
+import sqlite3
+from datetime import UTC, datetime
+from functools import cache
+from logging import getLogger
+from threading import Lock
+from typing import TYPE_CHECKING, cast
+
+from bar_raiser.tech_debt_framework.result_cache import get_cache_dir
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Mapping
+    from pathlib import Path
+
+    from github.Commit import Commit
+    from github.NamedUser import NamedUser
+    from github.Repository import Repository
+
+logger = getLogger(__name__)
+
+# e.g. 12345+octocat@users.noreply.github.com, or octocat@users.noreply.github.com
+# for accounts older than the numbered form.
+NOREPLY_EMAIL_PATTERN = re.compile(
+    r"^(?:\d+\+)?(?P<login>[^@+]+)@users\.noreply\.github\.com$", re.IGNORECASE
+)
+SWEPT_FROM_KEY = "swept_from"
+SWEPT_UNTIL_KEY = "swept_until"
+# The start of a sweep of the whole history of a repository.
+BEGINNING = datetime.min.replace(tzinfo=UTC)
+
+
+def get_login_from_noreply_email(email: str) -> str | None:
+    """The login of a noreply email, as written, since logins are case sensitive
+    keys of the leaderboard and history."""
+    if match := NOREPLY_EMAIL_PATTERN.match(email):
+        return match.group("login")
+    return None
+
+
+def get_metadata_key(repo_name: str, key: str) -> str:
+    """The metadata of each repository sharing the index is kept apart."""
+    return f"{repo_name}:{key}"
+
+
+class AuthorIndex:
+    """
+    A persistent index from commit author email to GitHub login in SQLite, so
+    the author of a commit is resolved without an API call per commit. It is
+    filled by sweeping the paginated commit listing of a repository, which
+    carries the login of the author of every listed commit. Logins are shared
+    by the repositories using the same cache, but the swept range is tracked
+    per repository.
+    """
+
+    def __init__(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.lock = Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS authors ("
+            "email TEXT PRIMARY KEY, "
+            "login TEXT NOT NULL)"
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS metadata ("
+            "key TEXT PRIMARY KEY, "
+            "value TEXT NOT NULL)"
+        )
+        self.connection.commit()
+
+    def get(self, email: str) -> str | None:
+        if login := get_login_from_noreply_email(email):
+            return login
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT login FROM authors WHERE email = ?", [email.lower()]
+            ).fetchone()
+        return None if row is None else row[0]
+
+    def put_many(self, logins: Mapping[str, str], *, replace: bool = True) -> None:
+        """Index `logins` by email, keeping the indexed ones unless `replace`."""
+        conflict = "REPLACE" if replace else "IGNORE"
+        with self.lock:
+            self.connection.executemany(
+                f"INSERT OR {conflict} INTO authors (email, login) VALUES (?, ?)",
+                [(email.lower(), login) for email, login in logins.items()],
+            )
+            self.connection.commit()
+
+    def get_metadata(self, key: str) -> datetime | None:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT value FROM metadata WHERE key = ?", [key]
+            ).fetchone()
+        return None if row is None else datetime.fromisoformat(row[0])
+
+    def set_metadata(self, key: str, value: datetime) -> None:
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)",
+                [key, value.isoformat()],
+            )
+            self.connection.commit()
+
+    def get_swept_from(self, repo_name: str) -> datetime | None:
+        return self.get_metadata(get_metadata_key(repo_name, SWEPT_FROM_KEY))
+
+    def get_swept_until(self, repo_name: str) -> datetime | None:
+        return self.get_metadata(get_metadata_key(repo_name, SWEPT_UNTIL_KEY))
+
+    def sweep(self, github_repo: Repository, since: datetime | None = None) -> int:
+        """
+        Index the authors of the commits of `github_repo` committed after
+        `since`, or ever, and return the number of commits listed. Only the
+        commits outside of the range swept before are listed: the ones
+        committed after it, and the ones between `since` and its start.
+        """
+        repo_name = github_repo.full_name
+        start = since or BEGINNING
+        swept_until = self.get_swept_until(repo_name)
+        # An index of the swept end only was swept from an unknown start.
+        swept_from = self.get_swept_from(repo_name) or swept_until
+        if swept_until is None or swept_from is None:
+            listed, swept_until = self.index_commits(
+                github_repo.get_commits()
+                if since is None
+                else github_repo.get_commits(since=since),
+                replace=True,
+            )
+            swept_from = start
+        else:
+            listed, swept_until = self.index_commits(
+                github_repo.get_commits(since=swept_until), replace=True
+            )
+            if start < swept_from:
+                # The newer logins of the emails were indexed by later sweeps.
+                older_listed, _ = self.index_commits(
+                    github_repo.get_commits(until=swept_from)
+                    if since is None
+                    else github_repo.get_commits(since=since, until=swept_from),
+                    replace=False,
+                )
+                listed += older_listed
+                swept_from = start
+        self.set_metadata(get_metadata_key(repo_name, SWEPT_FROM_KEY), swept_from)
+        if swept_until is not None:
+            self.set_metadata(get_metadata_key(repo_name, SWEPT_UNTIL_KEY), swept_until)
+        return listed
+
+    def index_commits(
+        self, commits: Iterable[Commit], *, replace: bool
+    ) -> tuple[int, datetime | None]:
+        """Index the authors of `commits`, and return their number and the date
+        of the newest."""
+        logins: dict[str, str] = {}
+        listed = 0
+        newest: datetime | None = None
+        for commit in commits:
+            listed += 1
+            git_commit = commit.commit
+            # The author is null when the author email isn't linked to an account.
+            author = cast("NamedUser | None", commit.author)
+            # Commits are listed newest first, so the newest login of an email
+            # is kept.
+            if author is not None and git_commit.author.email:
+                logins.setdefault(git_commit.author.email.lower(), author.login)
+            committed_at = git_commit.committer.date
+            if newest is None or committed_at > newest:
+                newest = committed_at
+        self.put_many(logins, replace=replace)
+        logger.info(f"Indexed {len(logins)} authors of {listed} commits.")
+        return listed, newest
+
+
+@cache
+def get_author_index() -> AuthorIndex:
+    return AuthorIndex(get_cache_dir() / "authors.sqlite3")
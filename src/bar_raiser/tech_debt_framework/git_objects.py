@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import os
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+from git.cmd import Git
+from git.exc import CommandError
+
+from bar_raiser.utils.instrumentation import span
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from git import Commit
+    from git.repo import Repo
+
+BLOB_TYPE = "blob"
+SYMLINK_MODE = "120000"
+SUBMODULE_MODE = "160000"
+NULL_SHA = "0" * 40
+MAX_CACHED_TREE_LISTINGS = 16
+
+
+def get_commit_blob_shas(
+    git_repo: Repo, commit: Commit, paths: Iterable[str]
+) -> dict[str, str]:
+    """
+    List the blobs under `paths` in the tree of `commit` with `git ls-tree`,
+    as a mapping from repository-relative path to blob SHA. Symlinks and
+    submodules are skipped.
+    """
+    return dict(get_tree_blob_shas(git_repo, commit.tree.hexsha, tuple(paths)))
+
+
+@lru_cache(maxsize=MAX_CACHED_TREE_LISTINGS)
+def get_tree_blob_shas(
+    git_repo: Repo, tree_sha: str, paths: tuple[str, ...]
+) -> dict[str, str]:
+    # Listings are cached per tree SHA: commits with the same tree, e.g. a
+    # merge and its squashed counterpart, share a listing.
+    if not paths:
+        return {}
+    with span("git ls-tree"):
+        output: str = git_repo.git.ls_tree(
+            "-r", "-z", "--full-name", tree_sha, "--", *paths
+        )
+    blob_shas: dict[str, str] = {}
+    for entry in output.split("\0"):
+        if not entry:
+            continue
+        info, path = entry.split("\t", 1)
+        mode, object_type, sha = info.split(" ")
+        if object_type == BLOB_TYPE and mode != SYMLINK_MODE:
+            blob_shas[path] = sha
+    return blob_shas
+
+
+def get_diff_blob_shas(
+    git_repo: Repo, base_sha: str, head_sha: str
+) -> tuple[dict[str, str], dict[str, str]]:
+    """
+    List the blobs the diff from `base_sha` to `head_sha` removes and adds with
+    `git diff-tree`, as mappings from repository-relative path to blob SHA. A
+    modified file is both removed and added. Symlinks and submodules are
+    skipped.
+    """
+    # Unlike `Commit.diff`, this spawns its own process and looks up no
+    # objects, so it is safe to call from several threads.
+    output: str = git_repo.git.diff_tree(
+        "-r", "-z", "--no-renames", "--full-index", base_sha, head_sha
+    )
+    entries = output.split("\0")[:-1]
+    removed: dict[str, str] = {}
+    added: dict[str, str] = {}
+    for info, path in zip(entries[::2], entries[1::2], strict=True):
+        a_mode, b_mode, a_sha, b_sha, _status = info.lstrip(":").split(" ")
+        for mode, sha, blob_shas in ((a_mode, a_sha, removed), (b_mode, b_sha, added)):
+            if sha != NULL_SHA and mode not in {SYMLINK_MODE, SUBMODULE_MODE}:
+                blob_shas[path] = sha
+    return removed, added
+
+
+def read_blob(git_repo: Repo, sha: str) -> bytes:
+    # GitPython keeps one `git cat-file --batch` process per repo for reads, so
+    # reading many blobs doesn't spawn a process per blob.
+    _sha, _type, _size, data = git_repo.git.get_object_data(sha)
+    return data
+
+
+def get_blob_size(git_repo: Repo, sha: str) -> int:
+    _sha, _type, size = git_repo.git.get_object_header(sha)
+    return size
+
+
+def list_work_tree_files(directory: str) -> list[str] | None:
+    """
+    List the files under `directory` that git tracks or would track, i.e. the
+    tracked ones and the untracked ones not ignored by .gitignore, relative to
+    the current directory. Symlinks and submodules are skipped. Returns None
+    when `directory` is not in a git work tree.
+    """
+    try:
+        with span("git ls-files"):
+            output: str = Git(os.getcwd()).ls_files(
+                "-z", "--cached", "--others", "--exclude-standard", "--", directory
+            )
+    except CommandError:
+        return None
+    return [
+        path
+        for path in output.split("\0")
+        # Tracked files deleted from the work tree and submodules, which are
+        # listed as directories, are not files.
+        if path and os.path.isfile(path) and not os.path.islink(path)
+    ]
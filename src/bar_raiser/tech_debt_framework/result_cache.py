@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+from functools import cache
+from hashlib import sha1
+from inspect import getfile
+from itertools import islice
+from os import environ
+from pathlib import Path
+from threading import Lock
+from typing import TYPE_CHECKING, TypeVar
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator, Mapping, Sequence
+
+# Bump when the analysis framework changes the results it produces for the same
+# source and analyzers, e.g. how BE_LINES are counted.
+RESULT_CACHE_VERSION = 1
+MAX_SQL_VARIABLES = 500
+
+# (key, line, col, code, count) of a Result, without its path, so that results
+# can be shared by every path with the same blob.
+ResultRow = tuple[str, int, int, str, int]
+
+
+def get_cache_dir() -> Path:
+    cache_dir = environ.get("BAR_RAISER_CACHE_DIR")
+    if cache_dir:
+        return Path(cache_dir)
+    return Path.home() / ".cache" / "bar-raiser"
+
+
+def get_analyzers_fingerprint(
+    analyzers: Iterable[type], *, aggregate_only: bool = False
+) -> str:
+    """
+    Fingerprint a set of analyzers by their names and the source of the modules
+    defining them, so editing an analyzer invalidates its cached results.
+    Aggregated results are fingerprinted apart from the full ones.
+    """
+    digest = sha1(f"v{RESULT_CACHE_VERSION}".encode())
+    if aggregate_only:
+        digest.update(b"aggregate-only")
+    for name, module_file in sorted(
+        (f"{analyzer.__module__}.{analyzer.__qualname__}", getfile(analyzer))
+        for analyzer in analyzers
+    ):
+        digest.update(name.encode())
+        digest.update(Path(module_file).read_bytes())
+    return digest.hexdigest()
+
+
+T = TypeVar("T")
+
+
+def chunked(items: Iterable[T], size: int) -> Iterator[list[T]]:
+    iterator = iter(items)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+class ResultCache:
+    """
+    A persistent per-file result cache in SQLite, keyed by the git blob SHA of
+    the file content and the fingerprint of the analyzers that produced it.
+    """
+
+    def __init__(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.lock = Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "blob_sha TEXT NOT NULL, "
+            "fingerprint TEXT NOT NULL, "
+            "rows TEXT NOT NULL, "
+            "PRIMARY KEY (blob_sha, fingerprint))"
+        )
+        self.connection.commit()
+
+    def get_many(
+        self, blob_shas: Iterable[str], fingerprint: str
+    ) -> dict[str, list[ResultRow]]:
+        found: dict[str, list[ResultRow]] = {}
+        with self.lock:
+            for chunk in chunked(set(blob_shas), MAX_SQL_VARIABLES):
+                placeholders = ", ".join("?" * len(chunk))
+                for blob_sha, rows in self.connection.execute(
+                    "SELECT blob_sha, rows FROM results "
+                    f"WHERE fingerprint = ? AND blob_sha IN ({placeholders})",
+                    [fingerprint, *chunk],
+                ):
+                    found[blob_sha] = [tuple(row) for row in json.loads(rows)]
+        return found
+
+    def put_many(
+        self, rows_by_blob_sha: Mapping[str, Sequence[ResultRow]], fingerprint: str
+    ) -> None:
+        with self.lock:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO results (blob_sha, fingerprint, rows) "
+                "VALUES (?, ?, ?)",
+                [
+                    (blob_sha, fingerprint, json.dumps(rows, separators=(",", ":")))
+                    for blob_sha, rows in rows_by_blob_sha.items()
+                ],
+            )
+            self.connection.commit()
+
+
+@cache
+def get_result_cache() -> ResultCache:
+    return ResultCache(get_cache_dir() / "results.sqlite3")
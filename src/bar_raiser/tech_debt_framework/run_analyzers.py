@@ -3,24 +3,32 @@ from __future__ import annotations
 import asyncio
 from argparse import ArgumentParser
 from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from itertools import pairwise
 from logging import getLogger
 from os import environ
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any, Literal
 
 from aioboto3 import Session
-from botocore.exceptions import ClientError
 from git.repo import Repo
 
+from bar_raiser.tech_debt_framework.author_index import get_author_index
+from bar_raiser.tech_debt_framework.result_cache import get_analyzers_fingerprint
 from bar_raiser.tech_debt_framework.utils import (
     NEW_TECH_DEBT_MESSAGE,
     REGRESSION_TECH_DEBT_CATEGORIES,
-    BaseCodeAnalyzer,
+    AnalyzerType,
     History,
     LeaderBoard,
     PathResults,
     TechDebtCategory,
     get_analyzers,
+    get_commit_deltas,
+    get_contribution_markdown_summary,
+    get_delta,
     get_pr_num_from_commit_message,
+    get_s3_client_config,
 )
 from bar_raiser.utils.github import (
     create_check_run,
@@ -33,7 +41,11 @@ from bar_raiser.utils.github import (
 from bar_raiser.utils.slack import post_a_slack_message
 
 if TYPE_CHECKING:
+    from collections.abc import Awaitable, Coroutine, Iterable, Sequence
+    from datetime import datetime
+
     from git import Commit
+    from github.PullRequest import PullRequest
     from github.Repository import Repository
     from types_aiobotocore_s3 import S3Client
 
@@ -43,6 +55,11 @@ CHECK_NAME = "quality-wins-report"
 MAX_COMMENT_LENGTH = 65536
 RAISE_THE_BAR_LOGIN = "zip-bar-raiser[bot]"
 QUALITY_WINS_SHOUTOUT_CHANNEL = "C07M7TK4GQH"
+UNKNOWN_AUTHOR = "UnknownAuthor"
+# Commits whose deltas are computed in one batch during a backfill, and the
+# author lookups and check runs in flight at once.
+BACKFILL_WINDOW_SIZE = 64
+MAX_GITHUB_REQUESTS_IN_FLIGHT = 8
 
 
 def get_slack_handle_from_github_login(github_login: str) -> str:
@@ -92,6 +109,11 @@ def get_parser() -> ArgumentParser:
         action="store_true",
         help="backfill 2023 Q3 leaderboard data",
     )
+    parser.add_argument(
+        "--aggregate-only",
+        action="store_true",
+        help="only keep the count of each tech debt category per file",
+    )
     return parser
 
 
@@ -112,98 +134,147 @@ Your contributions are now reflected on the Code Quality Award <{check_url}|Lead
         post_a_slack_message(QUALITY_WINS_SHOUTOUT_CHANNEL, text)
 
 
-async def analyze_contribution_and_create_a_check_run(  # noqa: PLR0917
-    git_repo: Repo,
-    github_repo: Repository,
+async def load_leaderboard(s3: S3Client, commit: Commit) -> LeaderBoard:
+    try:
+        return await LeaderBoard.load_with_commit(s3, commit)
+    except Exception:
+        logger.warning("Failed to load leaderboard from s3.")
+        return LeaderBoard()
+
+
+async def load_history(s3: S3Client, commit: Commit) -> History:
+    try:
+        return await History.load_with_commit(s3, commit)
+    except Exception:
+        logger.warning("Failed to load history from s3.")
+        return History()
+
+
+def get_commit_author(
+    github_repo: Repository, commit_sha: str, email: str | None
+) -> str:
+    """
+    Resolve the login of the author of a commit from the author index, and
+    only ask GitHub about commits whose author `email` is not indexed yet.
+    """
+    author_index = get_author_index()
+    if email and (login := author_index.get(email)):
+        return login
+    try:
+        login = github_repo.get_commit(commit_sha).author.login
+    except AttributeError:
+        return UNKNOWN_AUTHOR
+    if email:
+        author_index.put_many({email: login})
+    return login
+
+
+def sweep_authors(github_repo: Repository, since: datetime) -> None:
+    try:
+        get_author_index().sweep(github_repo, since)
+    except Exception:
+        logger.warning("Failed to index commit authors.")
+
+
+def get_conclusion(
+    delta: Counter[TechDebtCategory],
+) -> Literal["action_required", "success"]:
+    return (
+        "action_required"
+        if any(
+            val > 0
+            for key, val in delta.items()
+            if key
+            not in ({
+                *REGRESSION_TECH_DEBT_CATEGORIES,
+                TechDebtCategory.WEIGHTED_SCORE,
+            })
+        )
+        else "success"
+    )
+
+
+@dataclass
+class Contribution:
+    head_commit: Commit
+    author: str
+    delta: Counter[TechDebtCategory]
+    summary: str
+    tech_debt_regression: str = ""
+    significant_contribution: str = ""
+
+
+def fold_contribution(  # noqa: PLR0917
     s3: S3Client,
-    base_commit: Commit,
     head_commit: Commit,
-    paths: list[str],
-    analyzers: set[type[BaseCodeAnalyzer]],
+    overall: Counter[TechDebtCategory],
+    delta: Counter[TechDebtCategory],
     author: str,
-    is_backfill: bool,
-) -> None:
-    (
+    leaderboard: LeaderBoard,
+    history: History,
+) -> tuple[Contribution, list[Coroutine[Any, Any, None]]]:
+    """
+    Fold the `delta` of `head_commit` into the leaderboard and the history, and
+    return the contribution to report and the uploads of both as of
+    `head_commit`. The uploads are dumped before returning, so the leaderboard
+    and history can keep folding while they are in flight.
+    """
+    summary = get_contribution_markdown_summary(
+        overall,
         delta,
-        path_results,
-    ) = await PathResults.gen_from_incremental_analysis(
-        s3,
-        git_repo,
-        base_commit,
-        head_commit,
-        paths,
-        analyzers,
+        author,
+        leaderboard.board.get(author, Counter[TechDebtCategory]()),
     )
-
-    pr_comment_body = ""
-    significant_contribution = ""
-    pull = get_pull_request()
-    try:
-        try:
-            leaderboard = await LeaderBoard.load_with_commit(s3, base_commit)
-        except Exception:
-            logger.warning("Failed to load leaderboard from s3.")
-            leaderboard = LeaderBoard()
-        try:
-            history = await History.load_with_commit(s3, base_commit)
-        except Exception:
-            logger.warning("Failed to load history from s3.")
-            history = History()
-        summary = path_results.get_markdown_summary(
-            delta, author, leaderboard.board.get(author, Counter[TechDebtCategory]())
-        )
-        leaderboard.add_delta_and_check_contribution(author, delta)
-        leaderboard.compute_weighted_score()
-        history.add_delta(
+    leaderboard.add_delta_and_check_contribution(author, delta)
+    leaderboard.compute_weighted_score()
+    history.add_delta(
+        author,
+        head_commit.hexsha,
+        delta,
+        leaderboard.board[author][TechDebtCategory.WEIGHTED_SCORE],
+    )
+    uploads = [
+        leaderboard.dump_for_upload(s3, head_commit),
+        history.dump_for_upload(s3, head_commit),
+    ]
+    summary += leaderboard.get_markdown_summary(author, 1000)
+    summary += history.get_markdown_summary(author)
+    return (
+        Contribution(
+            head_commit,
             author,
-            head_commit.hexsha,
             delta,
-            leaderboard.board[author][TechDebtCategory.WEIGHTED_SCORE],
-        )
-        try:
-            await leaderboard.upload_to_s3(s3, head_commit)
-        except Exception:
-            logger.warning("Failed to upload leaderboard to s3.")
-        try:
-            await history.upload_to_s3(s3, head_commit)
-        except Exception:
-            logger.warning("Failed to upload history to s3.")
-        summary += leaderboard.get_markdown_summary(author, 1000)
-        summary += history.get_markdown_summary(author)
-        if (
-            leaderboard.tech_debt_regression
-            and pull is not None
-            and not has_previous_issue_comment(
-                pull, RAISE_THE_BAR_LOGIN, NEW_TECH_DEBT_MESSAGE
-            )
-        ):
-            pr_comment_body = f"Hey @{author}, {NEW_TECH_DEBT_MESSAGE}\n{leaderboard.tech_debt_regression}"
-        if leaderboard.contribution_summary:
-            significant_contribution = leaderboard.contribution_summary
+            summary,
+            leaderboard.tech_debt_regression,
+            leaderboard.contribution_summary,
+        ),
+        uploads,
+    )
 
-    except ClientError:  # fail to load leaderboard
-        summary = path_results.get_markdown_summary(delta, author)
-        logger.warning("fail to load leaderboard or history")
 
+def report_contribution(
+    github_repo: Repository,
+    contribution: Contribution,
+    pull: PullRequest | None,
+    is_backfill: bool,
+) -> None:
+    """Create the check run of a contribution, and comment and shout out on it."""
+    pr_comment_body = ""
+    if (
+        contribution.tech_debt_regression
+        and pull is not None
+        and not has_previous_issue_comment(
+            pull, RAISE_THE_BAR_LOGIN, NEW_TECH_DEBT_MESSAGE
+        )
+    ):
+        pr_comment_body = f"Hey @{contribution.author}, {NEW_TECH_DEBT_MESSAGE}\n{contribution.tech_debt_regression}"
     checks = create_check_run(
         repo=github_repo,
         name=CHECK_NAME,
-        head_sha=head_commit.hexsha,
-        conclusion=(
-            "action_required"
-            if any(
-                val > 0
-                for key, val in delta.items()
-                if key
-                not in ({
-                    *REGRESSION_TECH_DEBT_CATEGORIES,
-                    TechDebtCategory.WEIGHTED_SCORE,
-                })
-            )
-            else "success"
-        ),
+        head_sha=contribution.head_commit.hexsha,
+        conclusion=get_conclusion(contribution.delta),
         title="Python Tech Debt Report",
-        summary=trim_to_max_bytes(summary, MAX_COMMENT_LENGTH),
+        summary=trim_to_max_bytes(contribution.summary, MAX_COMMENT_LENGTH),
         annotations=[],
         actions=[],
     )
@@ -213,16 +284,202 @@ async def analyze_contribution_and_create_a_check_run(  # noqa: PLR0917
                 f"\n\n[Check your Tech Debt Contribution]({checks[0].html_url})"
             )
         pull.create_issue_comment(pr_comment_body)
-    if significant_contribution:
+    if contribution.significant_contribution:
         shout_out_contribution(
-            author,
-            head_commit.hexsha,
-            significant_contribution,
+            contribution.author,
+            contribution.head_commit.hexsha,
+            contribution.significant_contribution,
             checks[0].html_url,
             is_backfill,
         )
 
 
+async def gather_pending(pending: Iterable[Awaitable[None]]) -> None:
+    for result in await asyncio.gather(*pending, return_exceptions=True):
+        if isinstance(result, Exception):
+            logger.warning(f"Failed to upload or report a contribution: {result!r}")
+
+
+async def analyze_contribution_and_create_a_check_run(  # noqa: PLR0917
+    git_repo: Repo,
+    github_repo: Repository,
+    s3: S3Client,
+    base_commit: Commit,
+    head_commit: Commit,
+    paths: list[str],
+    analyzers: set[AnalyzerType],
+    author: str,
+    is_backfill: bool,
+    aggregate_only: bool = False,
+) -> None:
+    (delta, path_results), leaderboard, history = await asyncio.gather(
+        PathResults.gen_from_incremental_analysis(
+            s3,
+            git_repo,
+            base_commit,
+            head_commit,
+            paths,
+            analyzers,
+            aggregate_only=aggregate_only,
+        ),
+        load_leaderboard(s3, base_commit),
+        load_history(s3, base_commit),
+    )
+    # The loads fall back to empty results and failed uploads are logged, so
+    # S3 errors don't stop the contribution from being reported.
+    contribution, uploads = fold_contribution(
+        s3,
+        head_commit,
+        path_results.get_key_counts(),
+        delta,
+        author,
+        leaderboard,
+        history,
+    )
+    await gather_pending(uploads)
+    report_contribution(github_repo, contribution, get_pull_request(), is_backfill)
+
+
+async def load_path_results(  # noqa: PLR0917
+    s3: S3Client,
+    git_repo: Repo,
+    commit: Commit,
+    paths: list[str],
+    analyzers: set[AnalyzerType],
+    aggregate_only: bool,
+) -> PathResults:
+    try:
+        return await PathResults.load_with_commit(
+            s3,
+            commit,
+            get_analyzers_fingerprint(analyzers, aggregate_only=aggregate_only),
+        )
+    except Exception:
+        logger.warning(f"Failed to download PathResults of {commit}.")
+        return await PathResults.gen_from_nearest_snapshot(
+            s3, git_repo, commit, paths, analyzers, aggregate_only=aggregate_only
+        )
+
+
+def get_backfill_windows(commits: Sequence[Commit]) -> list[list[Commit]]:
+    """
+    Split `commits` into windows of up to BACKFILL_WINDOW_SIZE consecutive
+    (base, head) pairs; each window starts at the head of the previous one.
+    """
+    return [
+        list(commits[index : index + BACKFILL_WINDOW_SIZE + 1])
+        for index in range(0, len(commits) - 1, BACKFILL_WINDOW_SIZE)
+    ]
+
+
+async def backfill_leaderboard(  # noqa: PLR0914, PLR0917
+    git_repo: Repo,
+    github_repo: Repository,
+    s3: S3Client,
+    start_hexsha: str,
+    paths: list[str],
+    analyzers: set[AnalyzerType],
+    aggregate_only: bool = False,
+) -> None:
+    """
+    Backfill the leaderboard and history of every commit after `start_hexsha`.
+
+    The delta of a commit only depends on its own diff, so the deltas and
+    authors of a window of commits are computed in one batch while the
+    previous window is folded. Only the fold into the leaderboard and history
+    runs in commit order; the uploads and check runs of a window are gathered.
+    """
+    commits = list(git_repo.iter_commits())[::-1]
+    hexshas = [commit.hexsha for commit in commits]
+    if start_hexsha not in hexshas:
+        logger.warning(f"{start_hexsha} is not in the history of HEAD.")
+        return
+    commits = commits[hexshas.index(start_hexsha) :]
+    start_commit, end_commit = commits[0], commits[-1]
+    if start_commit == end_commit:
+        return
+    path_results, leaderboard, history, _ = await asyncio.gather(
+        load_path_results(s3, git_repo, start_commit, paths, analyzers, aggregate_only),
+        load_leaderboard(s3, start_commit),
+        load_history(s3, start_commit),
+        # One paginated listing of the commits resolves most authors.
+        asyncio.to_thread(sweep_authors, github_repo, start_commit.committed_datetime),
+    )
+    overall = path_results.get_key_counts()
+    windows = get_backfill_windows(commits)
+
+    with ThreadPoolExecutor(max_workers=MAX_GITHUB_REQUESTS_IN_FLIGHT) as executor:
+
+        def get_author(commit_sha: str, email: str | None) -> str:
+            return get_commit_author(github_repo, commit_sha, email)
+
+        def analyze_window(
+            window: list[Commit],
+        ) -> tuple[list[str], list[str], list[Counter[TechDebtCategory]]]:
+            # Commit metadata is read here rather than in the other threads,
+            # since this thread uses the `git cat-file` process of the repo.
+            heads = window[1:]
+            authors = executor.map(
+                get_author,
+                [commit.hexsha for commit in heads],
+                [commit.author.email for commit in heads],
+            )
+            descriptions = [
+                f"{commit.hexsha[:7]} {commit.committed_datetime.isoformat()} "
+                f"https://github.com/Greenbax/evergreen/pull/{get_pr_num_from_commit_message(str(commit.summary))}"
+                for commit in heads
+            ]
+            deltas = get_commit_deltas(
+                git_repo,
+                list(pairwise(window)),
+                analyzers,
+                aggregate_only=aggregate_only,
+            )
+            return list(authors), descriptions, deltas
+
+        def report(contribution: Contribution) -> None:
+            report_contribution(github_repo, contribution, None, is_backfill=True)
+
+        loop = asyncio.get_running_loop()
+        processed = 0
+        next_window = asyncio.ensure_future(
+            asyncio.to_thread(analyze_window, windows[0])
+        )
+        for index, window in enumerate(windows):
+            # lint-fixme: NoAwaitInLoopRule: each window is folded after the previous one
+            authors, descriptions, deltas = await next_window
+            if index + 1 < len(windows):
+                next_window = asyncio.ensure_future(
+                    asyncio.to_thread(analyze_window, windows[index + 1])
+                )
+            pending: list[Awaitable[None]] = []
+            for head_commit, author, description, delta in zip(
+                window[1:], authors, descriptions, deltas, strict=True
+            ):
+                logger.info(f"{processed} {description} [{author}]")
+                overall += delta
+                contribution, uploads = fold_contribution(
+                    s3, head_commit, overall, delta, author, leaderboard, history
+                )
+                pending.extend(uploads)
+                pending.append(loop.run_in_executor(executor, report, contribution))
+                processed += 1
+            # lint-fixme: NoAwaitInLoopRule: bounds the files and requests in flight
+            await gather_pending(pending)
+
+    # Later runs fall back to the nearest ancestor snapshot of PathResults, so
+    # only the end of the backfill needs one.
+    await asyncio.to_thread(
+        get_delta,
+        path_results,
+        start_commit.diff(end_commit),
+        analyzers,
+        git_repo,
+        aggregate_only=aggregate_only,
+    )
+    await gather_pending([path_results.upload_to_s3(s3, end_commit)])
+
+
 async def main() -> None:
     initialize_logging()
     args = get_parser().parse_args()
@@ -230,39 +487,19 @@ async def main() -> None:
     logger.info(f"Analyzers: {analyzers}")
     session = Session()
     if args.backfill_leaderboard:
-        git_repo = Repo()
-        processed = 0
-        github_repo = get_github_repo()
         # lint-fixme: NoS3ClientRule
-        async with session.client(service_name="s3") as s3:  # pyright: ignore[reportUnknownMemberType]
-            prev_commit = None
-            for commit in list(git_repo.iter_commits())[::-1]:
-                author = github_repo.get_commit(commit.hexsha).author.login
-                logger.info(
-                    f"{processed} {commit.hexsha[:7]} {commit.committed_datetime.isoformat()} [{author}]"
-                )
-                if prev_commit is None:
-                    if commit.hexsha == args.start_hexsha:
-                        prev_commit = commit
-                    continue
-                pr_url = f"https://github.com/Greenbax/evergreen/pull/{get_pr_num_from_commit_message(str(commit.summary))}"
-                logger.info(pr_url)
-                git_repo.git.checkout(commit)
-                # lint-fixme: NoAwaitInLoopRule: this await cannot be gathered due to dependencies
-                await analyze_contribution_and_create_a_check_run(
-                    git_repo,
-                    github_repo,
-                    s3,
-                    prev_commit,
-                    commit,
-                    args.paths,
-                    analyzers,
-                    author,
-                    is_backfill=True,
-                )
-                processed += 1
-
-                prev_commit = commit
+        async with session.client(  # pyright: ignore[reportUnknownMemberType]
+            service_name="s3", config=get_s3_client_config()
+        ) as s3:
+            await backfill_leaderboard(
+                Repo(),
+                get_github_repo(),
+                s3,
+                args.start_hexsha,
+                args.paths,
+                analyzers,
+                aggregate_only=args.aggregate_only,
+            )
     else:
         git_repo = get_git_repo()
         head_commit = git_repo.head.commit
@@ -273,16 +510,20 @@ async def main() -> None:
             base_commit_sha = head_commit.parents[0].hexsha
         base_commit = git_repo.commit(base_commit_sha)
         # lint-fixme: NoS3ClientRule
-        async with session.client("s3") as s3:  # pyright: ignore[reportUnknownMemberType]
+        async with session.client(  # pyright: ignore[reportUnknownMemberType]
+            "s3", config=get_s3_client_config()
+        ) as s3:
             github_repo = get_github_repo()
             try:
                 pull = get_pull_request()
                 if pull is not None:
                     author = pull.user.login
                 else:
-                    author = github_repo.get_commit(head_commit.hexsha).author.login
+                    author = get_commit_author(
+                        github_repo, head_commit.hexsha, head_commit.author.email
+                    )
             except AttributeError:
-                author = "UnknownAuthor"
+                author = UNKNOWN_AUTHOR
             await analyze_contribution_and_create_a_check_run(
                 git_repo,
                 github_repo,
@@ -293,6 +534,7 @@ async def main() -> None:
                 analyzers,
                 author,
                 is_backfill=False,
+                aggregate_only=args.aggregate_only,
             )
 
 
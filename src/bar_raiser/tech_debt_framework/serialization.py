@@ -0,0 +1,245 @@
+"""
+A compact binary format for PathResults, History and LeaderBoard.
+
+A file is a gzip stream of a header followed by records. Every string (paths,
+keys, codes, authors, commit SHAs) is written once in a string record the
+first time it is used and referred to by its index afterwards, and the integers
+of a record are written as packed little-endian columns. Records are written
+and read one at a time, so neither side needs the whole file in memory.
+"""
+
+from __future__ import annotations
+
+import sys
+from array import array
+from gzip import GzipFile
+from struct import Struct
+from typing import TYPE_CHECKING, TypeVar
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator, Mapping, Sequence
+    from io import BufferedIOBase
+
+    from bar_raiser.tech_debt_framework.result_cache import ResultRow
+
+MAGIC = b"BRTD"
+FORMAT_VERSION = 1
+GZIP_MAGIC = b"\x1f\x8b"
+COMPACT_SUFFIX = ".bin"
+COMPRESS_LEVEL = 6
+
+STRING_RECORD = b"S"
+PATH_RESULTS_RECORD = b"R"
+COUNTER_RECORD = b"C"
+HISTORY_RECORD = b"H"
+
+# The number of header integers and the typecodes of the columns of each
+# record. Header integers are string indexes; every column has one item per
+# entry of the record.
+RecordLayout = tuple[int, str]
+PATH_RESULTS_LAYOUTS: dict[bytes, RecordLayout] = {
+    # path; key, line, col, code, count of each result
+    PATH_RESULTS_RECORD: (1, "iiiii"),
+}
+COUNTER_LAYOUTS: dict[bytes, RecordLayout] = {
+    # author; category, count of each entry
+    COUNTER_RECORD: (1, "iq"),
+}
+HISTORY_LAYOUTS: dict[bytes, RecordLayout] = {
+    # author, commit sha; category, count of each entry
+    HISTORY_RECORD: (2, "iq"),
+}
+
+UINT32 = Struct("<I")
+
+K = TypeVar("K", bound=str)
+
+
+class UnsupportedFormatError(ValueError):
+    def __init__(self) -> None:
+        super().__init__(f"Not a version {FORMAT_VERSION} compact tech debt file.")
+
+
+class TruncatedFileError(ValueError):
+    def __init__(self) -> None:
+        super().__init__("Unexpected end of a compact tech debt file.")
+
+
+class UnknownRecordError(ValueError):
+    def __init__(self, tag: bytes) -> None:
+        super().__init__(f"Unknown record {tag!r} in a compact tech debt file.")
+
+
+def is_compact(head: bytes) -> bool:
+    """Whether a file starting with `head` is compact rather than JSON."""
+    return head.startswith(GZIP_MAGIC)
+
+
+def to_little_endian(column: array[int]) -> array[int]:
+    if sys.byteorder == "big":
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column
+
+
+class CompactWriter:
+    def __init__(self, fp: BufferedIOBase) -> None:
+        self.fp = fp
+        self.string_ids: dict[str, int] = {}
+        fp.write(MAGIC + bytes([FORMAT_VERSION]))
+
+    def intern(self, value: str) -> int:
+        string_id = self.string_ids.get(value)
+        if string_id is None:
+            string_id = self.string_ids[value] = len(self.string_ids)
+            data = value.encode()
+            self.fp.write(STRING_RECORD + UINT32.pack(len(data)) + data)
+        return string_id
+
+    def write_record(
+        self, tag: bytes, header: Sequence[int], columns: Sequence[array[int]]
+    ) -> None:
+        length = len(columns[0]) if columns else 0
+        self.fp.write(tag + UINT32.pack(length))
+        self.fp.write(Struct(f"<{len(header)}I").pack(*header))
+        for column in columns:
+            self.fp.write(to_little_endian(column).tobytes())
+
+
+class CompactReader:
+    def __init__(self, fp: BufferedIOBase) -> None:
+        self.fp = fp
+        self.strings: list[str] = []
+        if self.read_exactly(len(MAGIC) + 1) != MAGIC + bytes([FORMAT_VERSION]):
+            raise UnsupportedFormatError
+
+    def read_exactly(self, size: int) -> bytes:
+        data = self.fp.read(size)
+        if len(data) != size:
+            raise TruncatedFileError
+        return data
+
+    def iter_records(
+        self, layouts: Mapping[bytes, RecordLayout]
+    ) -> Iterator[tuple[bytes, tuple[int, ...], list[array[int]]]]:
+        """Yield the tag, header and columns of each record but string records."""
+        while tag := self.fp.read(1):
+            (length,) = UINT32.unpack(self.read_exactly(UINT32.size))
+            if tag == STRING_RECORD:
+                self.strings.append(self.read_exactly(length).decode())
+                continue
+            if tag not in layouts:
+                raise UnknownRecordError(tag)
+            header_size, typecodes = layouts[tag]
+            header_struct = Struct(f"<{header_size}I")
+            header = header_struct.unpack(self.read_exactly(header_struct.size))
+            columns: list[array[int]] = []
+            for typecode in typecodes:
+                column: array[int] = array(typecode)
+                column.frombytes(self.read_exactly(column.itemsize * length))
+                if sys.byteorder == "big":
+                    column.byteswap()
+                columns.append(column)
+            yield tag, header, columns
+
+
+def open_compact_writer(path: str) -> GzipFile:
+    return GzipFile(path, "wb", compresslevel=COMPRESS_LEVEL)
+
+
+def open_compact_reader(path: str) -> GzipFile:
+    return GzipFile(path, "rb")
+
+
+def is_compact_file(path: str) -> bool:
+    with open(path, "rb") as f:
+        return is_compact(f.read(len(GZIP_MAGIC)))
+
+
+def write_path_rows(
+    fp: BufferedIOBase, items: Iterable[tuple[str, Sequence[ResultRow]]]
+) -> None:
+    writer = CompactWriter(fp)
+    for path, rows in items:
+        path_id = writer.intern(path)
+        columns: list[array[int]] = [array("i") for _ in range(5)]
+        keys, lines, cols, codes, counts = columns
+        for key, line, col, code, count in rows:
+            keys.append(writer.intern(key))
+            lines.append(line)
+            cols.append(col)
+            codes.append(writer.intern(code))
+            counts.append(count)
+        writer.write_record(PATH_RESULTS_RECORD, (path_id,), columns)
+
+
+def iter_path_rows(fp: BufferedIOBase) -> Iterator[tuple[str, list[ResultRow]]]:
+    reader = CompactReader(fp)
+    strings = reader.strings
+    for _tag, (path_id,), (keys, lines, cols, codes, counts) in reader.iter_records(
+        PATH_RESULTS_LAYOUTS
+    ):
+        yield (
+            strings[path_id],
+            [
+                (strings[key], line, col, strings[code], count)
+                for key, line, col, code, count in zip(
+                    keys, lines, cols, codes, counts, strict=True
+                )
+            ],
+        )
+
+
+def get_counter_columns(
+    writer: CompactWriter, counter: Mapping[K, int]
+) -> list[array[int]]:
+    return [
+        array("i", [writer.intern(key) for key in counter]),
+        array("q", counter.values()),
+    ]
+
+
+def get_counter(
+    strings: Sequence[str], keys: array[int], counts: array[int]
+) -> dict[str, int]:
+    return {strings[key]: count for key, count in zip(keys, counts, strict=True)}
+
+
+def write_counters(
+    fp: BufferedIOBase, items: Iterable[tuple[str, Mapping[K, int]]]
+) -> None:
+    writer = CompactWriter(fp)
+    for author, counter in items:
+        writer.write_record(
+            COUNTER_RECORD,
+            (writer.intern(author),),
+            get_counter_columns(writer, counter),
+        )
+
+
+def iter_counters(fp: BufferedIOBase) -> Iterator[tuple[str, dict[str, int]]]:
+    reader = CompactReader(fp)
+    for _tag, (author,), (keys, counts) in reader.iter_records(COUNTER_LAYOUTS):
+        yield reader.strings[author], get_counter(reader.strings, keys, counts)
+
+
+def write_history(
+    fp: BufferedIOBase, items: Iterable[tuple[str, str, Mapping[K, int]]]
+) -> None:
+    writer = CompactWriter(fp)
+    for author, sha, delta in items:
+        writer.write_record(
+            HISTORY_RECORD,
+            (writer.intern(author), writer.intern(sha)),
+            get_counter_columns(writer, delta),
+        )
+
+
+def iter_history(fp: BufferedIOBase) -> Iterator[tuple[str, str, dict[str, int]]]:
+    reader = CompactReader(fp)
+    for _tag, (author, sha), (keys, counts) in reader.iter_records(HISTORY_LAYOUTS):
+        yield (
+            reader.strings[author],
+            reader.strings[sha],
+            get_counter(reader.strings, keys, counts),
+        )
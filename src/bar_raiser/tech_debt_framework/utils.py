@@ -1,20 +1,29 @@
 from __future__ import annotations
 
+import asyncio
+import atexit
 import json
 import operator
 import os
+import sys
 from calendar import monthrange
 from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import asdict, dataclass, is_dataclass
 from datetime import datetime
 from enum import StrEnum
 from importlib import import_module
 from inspect import isclass
+from io import BytesIO
 from logging import getLogger
+from multiprocessing import get_context
 from pathlib import Path
 from pkgutil import walk_packages
-from re import match
-from typing import TYPE_CHECKING, Any, cast
+from re import Pattern, match
+from threading import Lock
+from tokenize import tokenize
+from typing import TYPE_CHECKING, Any, ClassVar, TypeAlias, TypeVar, cast
+from weakref import WeakKeyDictionary
 
 import libcst as cst
 import libcst.metadata.type_inference_provider as _tip
@@ -22,38 +31,99 @@ import libcst.metadata.type_inference_provider as _tip
 if not hasattr(_tip, "run_command"):
     _tip.run_command = None  # pyright: ignore[reportAttributeAccessIssue]
 
+from aiobotocore.config import AioConfig
+from botocore.exceptions import ClientError
 from dateutil.relativedelta import relativedelta
 from fixit import CstLintRule
-from fixit.cli import (
-    map_paths,  # pyright: ignore[reportUnknownVariableType]
-)
 from fixit.cli.args import LintWorkers
 from fixit.common.base import CstContext, LintConfig
 from fixit.common.config import get_lint_config
 from fixit.rule_lint_engine import _visit_cst_rules_with_context
+from git.repo import Repo
 from libcst.metadata import CodePosition, MetadataWrapper, PositionProvider
 
+from bar_raiser.tech_debt_framework.git_objects import (
+    get_blob_size,
+    get_commit_blob_shas,
+    get_diff_blob_shas,
+    list_work_tree_files,
+    read_blob,
+)
+from bar_raiser.tech_debt_framework.result_cache import (
+    ResultRow,
+    chunked,
+    get_analyzers_fingerprint,
+    get_result_cache,
+)
+from bar_raiser.tech_debt_framework.serialization import (
+    COMPACT_SUFFIX,
+    is_compact_file,
+    iter_counters,
+    iter_history,
+    iter_path_rows,
+    open_compact_reader,
+    open_compact_writer,
+    write_counters,
+    write_history,
+    write_path_rows,
+)
+from bar_raiser.utils.github import get_git_blob_sha
+from bar_raiser.utils.instrumentation import api_call, get_file_size, span
+from bar_raiser.utils.profiling import initialize_worker_profiling
+
 if TYPE_CHECKING:
-    from collections.abc import Collection, Iterable, Iterator, Mapping
+    from collections.abc import (
+        Awaitable,
+        Callable,
+        Collection,
+        Container,
+        Coroutine,
+        Iterable,
+        Iterator,
+        Mapping,
+        Sequence,
+    )
+    from tokenize import TokenInfo
 
     from fixit.common.report import BaseLintRuleReport
     from git import Commit, DiffIndex
     from git.diff import Diff
-    from git.repo import Repo
-    from libcst.metadata.base_provider import ProviderT
     from types_aiobotocore_s3 import S3Client
 
+    from bar_raiser.tech_debt_framework.result_cache import ResultCache
+
 
 logger = getLogger(__name__)
 
 S3_BUCKET = "s3-bucket"
 S3_KEY_LEADERBOARD = "bar-raiser/leaderboard/"
 S3_KEY_PATH_RESULTS = "bar-raiser/path_results/"
+S3_KEY_PATH_RESULT_MANIFESTS = f"{S3_KEY_PATH_RESULTS}manifests/"
+S3_KEY_PATH_RESULT_BLOBS = f"{S3_KEY_PATH_RESULTS}blobs/"
 S3_KEY_HISTORY = "bar-raiser/history/"
-
-
-@dataclass(frozen=True)
+JSON_SUFFIX = ".json"
+MAX_S3_TRANSFERS_IN_FLIGHT = 8
+MAX_SNAPSHOT_ANCESTOR_DEPTH = 200
+SYMLINK_MODE_BITS = 0o120000
+ANALYZABLE_SUFFIXES = (".py",)
+MAX_GIT_DIFFS_IN_FLIGHT = 8
+CHUNKS_PER_WORKER = 4
+# Workers are spawned rather than forked, since the pools are first used from
+# threads of the event loop while other threads may hold locks. Unlike with a
+# fork server, they also start with the environment of the run.
+ANALYSIS_POOL_START_METHOD = "spawn"
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True, slots=True)
 class Result:
+    """
+    One finding of an analyzer. The strings are interned, so the results of a
+    file share one copy of its path, and every result one copy of each key and
+    code, which keeps the results of a large repository small in memory.
+    """
+
     key: str
     path: str
     line: int
@@ -62,6 +132,120 @@ class Result:
     patch: None
     count: int = 1
 
+    def __post_init__(self) -> None:
+        object.__setattr__(self, "key", sys.intern(str(self.key)))
+        object.__setattr__(self, "path", sys.intern(self.path))
+        object.__setattr__(self, "code", sys.intern(self.code))
+
+    def __reduce__(self) -> tuple[type[Result], tuple[object, ...]]:
+        # Unpickle through __init__ so results from analyzer workers get
+        # interned in the parent process too.
+        return Result, (
+            self.key,
+            self.path,
+            self.line,
+            self.col,
+            self.code,
+            self.patch,
+            self.count,
+        )
+
+    def to_row(self) -> ResultRow:
+        return (self.key, self.line, self.col, self.code, self.count)
+
+    @staticmethod
+    def from_row(path: str, row: ResultRow) -> Result:
+        key, line, col, code, count = row
+        return Result(
+            key=key, path=path, line=line, col=col, code=code, patch=None, count=count
+        )
+
+
+s3_transfer_semaphores: WeakKeyDictionary[
+    asyncio.AbstractEventLoop, asyncio.Semaphore
+] = WeakKeyDictionary()
+
+
+def get_s3_client_config() -> AioConfig:
+    # Keep enough pooled connections for every transfer allowed in flight.
+    return AioConfig(max_pool_connections=MAX_S3_TRANSFERS_IN_FLIGHT)
+
+
+def get_s3_transfer_semaphore() -> asyncio.Semaphore:
+    """The concurrency limit shared by all S3 transfers of the running loop."""
+    loop = asyncio.get_running_loop()
+    if loop not in s3_transfer_semaphores:
+        s3_transfer_semaphores[loop] = asyncio.Semaphore(MAX_S3_TRANSFERS_IN_FLIGHT)
+    return s3_transfer_semaphores[loop]
+
+
+async def download_from_s3(s3: S3Client, s3_key: str, local_path: str) -> None:
+    async with get_s3_transfer_semaphore():
+        with api_call("s3", "download_file") as transfer:
+            await s3.download_file(S3_BUCKET, s3_key, local_path)
+            transfer.bytes_received = get_file_size(local_path)
+    logger.info(f"Successfully downloaded {s3_key}")
+
+
+async def upload_to_s3(s3: S3Client, local_path: str, s3_key: str) -> None:
+    async with get_s3_transfer_semaphore():
+        with api_call("s3", "upload_file") as transfer:
+            transfer.bytes_sent = get_file_size(local_path)
+            await s3.upload_file(local_path, S3_BUCKET, s3_key)
+    logger.info(f"Successfully uploaded {s3_key}")
+
+
+async def download_snapshot_from_s3(
+    s3: S3Client, s3_key_prefix: str, local_path_prefix: str, commit: Commit
+) -> str:
+    """
+    Download the compact snapshot of `commit` under `s3_key_prefix`, falling
+    back to the JSON one uploaded before the compact format, and return the
+    local path it was downloaded to.
+    """
+    for suffix in (COMPACT_SUFFIX, JSON_SUFFIX):
+        local_path = f"{local_path_prefix}-{commit.hexsha}{suffix}"
+        if Path(local_path).exists():  # noqa: ASYNC240
+            return local_path
+    try:
+        local_path = f"{local_path_prefix}-{commit.hexsha}{COMPACT_SUFFIX}"
+        await download_from_s3(
+            s3, f"{s3_key_prefix}{commit.hexsha}{COMPACT_SUFFIX}", local_path
+        )
+    except ClientError:
+        local_path = f"{local_path_prefix}-{commit.hexsha}{JSON_SUFFIX}"
+        await download_from_s3(
+            s3, f"{s3_key_prefix}{commit.hexsha}{JSON_SUFFIX}", local_path
+        )
+    return local_path
+
+
+async def get_object_from_s3(s3: S3Client, s3_key: str) -> bytes:
+    async with get_s3_transfer_semaphore():
+        with api_call("s3", "get_object") as transfer:
+            response = await s3.get_object(Bucket=S3_BUCKET, Key=s3_key)
+            async with response["Body"] as body:
+                data = await body.read()
+            transfer.bytes_received = len(data)
+            return data
+
+
+async def has_object_in_s3(s3: S3Client, s3_key: str) -> bool:
+    async with get_s3_transfer_semaphore():
+        try:
+            with api_call("s3", "head_object"):
+                await s3.head_object(Bucket=S3_BUCKET, Key=s3_key)
+        except ClientError:
+            return False
+    return True
+
+
+async def put_object_to_s3(s3: S3Client, s3_key: str, body: bytes) -> None:
+    async with get_s3_transfer_semaphore():
+        with api_call("s3", "put_object") as transfer:
+            transfer.bytes_sent = len(body)
+            await s3.put_object(Bucket=S3_BUCKET, Key=s3_key, Body=body)
+
 
 class CodeAnalyzerContext(CstContext):
     def __init__(
@@ -75,7 +259,64 @@ class CodeAnalyzerContext(CstContext):
         super().__init__(wrapper, source, file_path, config)
 
 
-class BaseCodeAnalyzer(CstLintRule):
+class TriggeredAnalyzer:
+    # Byte substrings or patterns, one of which must be in a file for the
+    # analyzer to report anything in it. Files matching no trigger of any
+    # analyzer are not parsed at all. None runs the analyzer on every file.
+    TRIGGERS: ClassVar[Sequence[bytes | Pattern[bytes]] | None] = None
+
+    @classmethod
+    def is_triggered_by(cls, source: bytes) -> bool:
+        if cls.TRIGGERS is None:
+            return True
+        return any(
+            trigger in source if isinstance(trigger, bytes) else trigger.search(source)
+            for trigger in cls.TRIGGERS
+        )
+
+
+class BaseTokenAnalyzer(TriggeredAnalyzer):
+    """
+    An analyzer of comment- and line-level tech debt that visits the token
+    stream of a file instead of its CST, which is much cheaper to produce.
+    Files are only parsed into a CST when a BaseCodeAnalyzer needs them.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.results: list[Result] = []
+
+    def visit_token(self, token: TokenInfo) -> None:
+        pass
+
+    def report(self, token: TokenInfo, key: str, *, count: int = 1) -> None:
+        line, col = token.start
+        self.results.append(
+            Result(
+                key=key,
+                path=self.path,
+                line=line,
+                col=col,
+                code=self.__class__.__name__,
+                count=count,
+                patch=None,
+            )
+        )
+
+
+def run_token_analyzers(
+    path: Path, source: bytes, analyzers: Iterable[type[BaseTokenAnalyzer]]
+) -> list[Result]:
+    instances = [analyzer(str(path)) for analyzer in analyzers]
+    if not instances:
+        return []
+    for token in tokenize(BytesIO(source).readline):
+        for instance in instances:
+            instance.visit_token(token)
+    return [result for instance in instances for result in instance.results]
+
+
+class BaseCodeAnalyzer(TriggeredAnalyzer, CstLintRule):
     context: CodeAnalyzerContext
 
     def report(  # pyright: ignore[reportIncompatibleMethodOverride]
@@ -130,10 +371,14 @@ def lint_file(
     return context.reports
 
 
+AnalyzerType: TypeAlias = type[BaseCodeAnalyzer] | type[BaseTokenAnalyzer]
+
+
 @dataclass(frozen=True)
 class LintOptions:
-    rules: Collection[type[CstLintRule]]
+    rules: Collection[type[CstLintRule] | type[BaseTokenAnalyzer]]
     config: LintConfig
+    aggregate_only: bool = False
 
 
 def index_to_coordinates(text: str, index: int) -> tuple[int, int]:
@@ -154,6 +399,13 @@ REGRESSION_TECH_DEBT_CATEGORIES = [  # Tech debt categories that could regress o
     TechDebtCategory.BE_LINES,  # Only earn scores when making net reduction and will not lose scores when adding more debts
 ]
 
+# Tech debt categories where only the count of each path matters. Their
+# results are merged into one Result per path, code and key.
+AGGREGATED_TECH_DEBT_CATEGORIES = frozenset({TechDebtCategory.BE_LINES})
+# The position of a merged Result.
+AGGREGATED_LINE = 1
+AGGREGATED_COL = 1
+
 TECH_DEBT_SHOUT_OUT_THRESHOLD: dict[TechDebtCategory, int] = {
     TechDebtCategory.PYRIGHT_IGNORE: -1,
     TechDebtCategory.BE_LINES: -25,
@@ -188,56 +440,314 @@ TROPHY_EMOJI = ":trophy:"
 NEW_TECH_DEBT_MESSAGE = "You're about to introduce new tech debt. Would you be able to address it upfront or, alternatively, tackle some existing tech debt from http://go/quality-wins offset the impact? :pray:"
 
 
-def find_files(paths: Iterable[str | Path]) -> Iterator[str]:
+def find_files(
+    paths: Iterable[str | Path], suffixes: tuple[str, ...] = ("",)
+) -> Iterator[str]:
     """
-    Given an iterable of paths, yields any files and walks over any directories.
+    Given an iterable of paths, yields any files and the files with one of
+    `suffixes` under any directories. Directories in a git work tree are listed
+    by git, which honours .gitignore and skips submodules, instead of walked.
     """
     for path in paths:
         if os.path.isfile(path):
             yield str(path)
-        else:
-            for root, _dirs, files in os.walk(path):
-                for f in files:
-                    if not os.path.islink(f):
-                        yield os.path.join(root, f)
+            continue
+        files = list_work_tree_files(str(path))
+        if files is not None:
+            yield from (f for f in files if f.endswith(suffixes))
+            continue
+        for root, _dirs, files in os.walk(path):
+            for f in files:
+                if not os.path.islink(f) and f.endswith(suffixes):
+                    yield os.path.join(root, f)
 
 
-def get_analyzed_results(
-    path: Path, options: LintOptions, _: Mapping[ProviderT, object] | None
+def is_analyzable_path(path: str) -> bool:
+    return ".venv/" not in path and path.endswith(ANALYZABLE_SUFFIXES)
+
+
+def aggregate_results(
+    results: Iterable[Result], keys: Container[str] | None = None
 ) -> list[Result]:
-    try:
-        if ".venv/" in str(path):
-            return []
-        source = path.read_bytes()
-        source_str = source.decode("utf-8")
-        match path.suffix:
-            case ".py":
-                results: list[Result] = cast(
-                    "list[Result]",
-                    lint_file(
-                        path,
-                        source,
-                        rules=options.rules,
-                        config=options.config,
-                        cst_wrapper=None,
-                        find_unused_suppressions=True,
-                    ),
-                )
-                results.append(
-                    Result(
-                        key=TechDebtCategory.BE_LINES.value,
-                        path=str(path),
-                        line=1,
-                        col=1,
-                        code=TechDebtCategory.BE_LINES.value,
-                        patch=None,
-                        count=sum(1 for _ in source_str.split("\n")),
-                    )
-                )
-                return results
-    except Exception as exp:
-        print(exp)
-    return []
+    """
+    Merge the results with a key in `keys`, or all results when `keys` is None,
+    into one Result per path, key and code that only keeps their total count.
+    """
+    aggregated: list[Result] = []
+    counts: Counter[tuple[str, str, str]] = Counter()
+    for result in results:
+        if keys is None or result.key in keys:
+            counts[result.path, result.key, result.code] += result.count
+        else:
+            aggregated.append(result)
+    aggregated.extend(
+        Result(
+            key=key,
+            path=path,
+            line=AGGREGATED_LINE,
+            col=AGGREGATED_COL,
+            code=code,
+            patch=None,
+            count=count,
+        )
+        for (path, key, code), count in counts.items()
+    )
+    return aggregated
+
+
+def get_triggered_rules(
+    rules: Iterable[type[CstLintRule] | type[BaseTokenAnalyzer]], source: bytes
+) -> tuple[list[type[CstLintRule]], list[type[BaseTokenAnalyzer]]]:
+    """Split the rules triggered by `source` into CST rules and token analyzers."""
+    cst_rules: list[type[CstLintRule]] = []
+    token_analyzers: list[type[BaseTokenAnalyzer]] = []
+    for rule in rules:
+        if issubclass(rule, TriggeredAnalyzer) and not rule.is_triggered_by(source):
+            continue
+        if issubclass(rule, BaseTokenAnalyzer):
+            token_analyzers.append(rule)
+        else:
+            cst_rules.append(rule)
+    return cst_rules, token_analyzers
+
+
+def analyze_source(path: Path, source: bytes, options: LintOptions) -> list[Result]:
+    source_str = source.decode("utf-8")
+    cst_rules, token_analyzers = get_triggered_rules(options.rules, source)
+    results = run_token_analyzers(path, source, token_analyzers)
+    if cst_rules:
+        results += cast(
+            "list[Result]",
+            lint_file(
+                path,
+                source,
+                rules=cst_rules,
+                config=options.config,
+                cst_wrapper=None,
+                find_unused_suppressions=True,
+            ),
+        )
+    results.append(
+        Result(
+            key=TechDebtCategory.BE_LINES.value,
+            path=str(path),
+            line=AGGREGATED_LINE,
+            col=AGGREGATED_COL,
+            code=TechDebtCategory.BE_LINES.value,
+            patch=None,
+            count=sum(1 for _ in source_str.split("\n")),
+        )
+    )
+    return aggregate_results(
+        results, None if options.aggregate_only else AGGREGATED_TECH_DEBT_CATEGORIES
+    )
+
+
+# (path, SHA of the blob to analyze, or None to analyze the file at path)
+AnalysisItem = tuple[str, str | None]
+# (git dir to read blobs from, items)
+AnalysisChunk = tuple[str | None, list[AnalysisItem]]
+# The result rows of an analyzed item, or None when its analysis failed
+AnalysisRows = tuple[AnalysisItem, list[ResultRow] | None]
+
+
+def get_balanced_chunks(sizes: Mapping[T, int], chunk_count: int) -> list[list[T]]:
+    """
+    Split sized items into about `chunk_count` chunks of similar total size.
+    Items are taken largest first, so the chunks of the largest files are
+    handed out first and the chunks of small files even out the load at the end.
+    """
+    target = max(sum(sizes.values()) // max(chunk_count, 1), 1)
+    chunks: list[list[T]] = []
+    chunk: list[T] = []
+    chunk_size = 0
+    for item, size in sorted(sizes.items(), key=operator.itemgetter(1), reverse=True):
+        chunk.append(item)
+        chunk_size += size
+        if chunk_size >= target:
+            chunks.append(chunk)
+            chunk = []
+            chunk_size = 0
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def analyze_items(
+    items: Iterable[AnalysisItem],
+    options: LintOptions,
+    read_blob_data: Callable[[str], bytes],
+) -> list[AnalysisRows]:
+    """
+    Analyze the items and return their result rows. Files read from the working
+    tree are returned with the blob SHA of the content that was analyzed.
+    """
+    path_rows: list[AnalysisRows] = []
+    for item in items:
+        path, blob_sha = item
+        rows: list[ResultRow] | None
+        try:
+            if blob_sha is None:
+                source = Path(path).read_bytes()
+                item = (path, get_git_blob_sha(source))  # noqa: PLW2901
+            else:
+                source = read_blob_data(blob_sha)
+            rows = [
+                result.to_row()
+                for result in analyze_source(Path(path), source, options)
+            ]
+        except Exception:
+            logger.exception(f"Failed to analyze {path}.")
+            rows = None
+        path_rows.append((item, rows))
+    return path_rows
+
+
+class AnalysisWorkerState:
+    def __init__(self) -> None:
+        self.options: LintOptions | None = None
+        self.git_repos: dict[str, Repo] = {}
+
+    def read_blob(self, git_dir: str, sha: str) -> bytes:
+        git_repo = self.git_repos.get(git_dir)
+        if git_repo is None:
+            git_repo = self.git_repos[git_dir] = Repo(git_dir)
+        return read_blob(git_repo, sha)
+
+
+analysis_worker = AnalysisWorkerState()
+
+
+def init_analysis_worker(options: LintOptions, parent_pid: int) -> None:
+    analysis_worker.options = options
+    initialize_worker_profiling(parent_pid)
+    # Warm up the parser so the first chunk doesn't pay for it.
+    cst.parse_module("pass\n")
+
+
+def hash_paths(paths: Iterable[str]) -> list[tuple[str, str]]:
+    """The blob SHA of each readable file of `paths`."""
+    blob_shas: list[tuple[str, str]] = []
+    for path in paths:
+        try:
+            blob_shas.append((path, get_git_blob_sha(Path(path).read_bytes())))
+        except OSError:
+            logger.warning(f"Failed to read {path}.")
+    return blob_shas
+
+
+def analyze_chunk(chunk: AnalysisChunk) -> list[AnalysisRows]:
+    git_dir, items = chunk
+
+    def read_blob_data(sha: str) -> bytes:
+        return analysis_worker.read_blob(cast("str", git_dir), sha)
+
+    return analyze_items(
+        items, cast("LintOptions", analysis_worker.options), read_blob_data
+    )
+
+
+class AnalysisPool:
+    """
+    A long-lived pool of analysis worker processes. Workers get the LintOptions
+    once when they start, are handed chunks of files balanced by size, and send
+    back the result rows of each path rather than pickled Results.
+    """
+
+    def __init__(self, options: LintOptions, processes: int | None = None) -> None:
+        self.processes = processes or os.cpu_count() or 1
+        self.pool = get_context(ANALYSIS_POOL_START_METHOD).Pool(
+            self.processes,
+            initializer=init_analysis_worker,
+            initargs=(options, os.getpid()),
+        )
+
+    def hash(self, sizes: Mapping[str, int]) -> dict[str, str]:
+        chunks = get_balanced_chunks(sizes, self.processes * CHUNKS_PER_WORKER)
+        blob_shas: dict[str, str] = {}
+        for path_blob_shas in self.pool.imap_unordered(hash_paths, chunks):
+            blob_shas.update(path_blob_shas)
+        return blob_shas
+
+    def map(
+        self, sizes: Mapping[AnalysisItem, int], git_dir: str | None = None
+    ) -> Iterator[AnalysisRows]:
+        chunks = get_balanced_chunks(sizes, self.processes * CHUNKS_PER_WORKER)
+        for path_rows in self.pool.imap_unordered(
+            analyze_chunk, [(git_dir, chunk) for chunk in chunks]
+        ):
+            yield from path_rows
+
+    def close(self) -> None:
+        self.pool.close()
+        self.pool.join()
+
+
+analysis_pools: dict[tuple[frozenset[type], bool], AnalysisPool] = {}
+analysis_pools_lock = Lock()
+
+
+def get_analysis_pool(options: LintOptions) -> AnalysisPool:
+    """
+    Return the pool for the analyzers of `options`, starting it on first use,
+    so the analyses of a run, e.g. of every commit in a backfill, share warm
+    workers.
+    """
+    key = (frozenset(options.rules), options.aggregate_only)
+    with analysis_pools_lock:
+        pool = analysis_pools.get(key)
+        if pool is None:
+            if not analysis_pools:
+                # Registered on first use rather than at import, so the pools
+                # are closed, and their workers have written their profiles,
+                # before the exit handlers of the entry point run.
+                atexit.register(close_analysis_pools)
+            pool = analysis_pools[key] = AnalysisPool(options)
+        return pool
+
+
+def close_analysis_pools() -> None:
+    with analysis_pools_lock:
+        for pool in analysis_pools.values():
+            pool.close()
+        analysis_pools.clear()
+
+
+def map_analysis(
+    sizes: Mapping[AnalysisItem, int],
+    options: LintOptions,
+    workers: LintWorkers = LintWorkers.CPU_COUNT,
+    git_repo: Repo | None = None,
+) -> Iterator[AnalysisRows]:
+    """
+    Analyze the items, keyed to their size in bytes, and yield the result rows
+    of each path. Blobs are read from `git_repo`.
+    """
+    with span("analysis") as transfer:
+        transfer.bytes_received = sum(sizes.values())
+        if workers is LintWorkers.USE_CURRENT_THREAD:
+
+            def read_blob_data(sha: str) -> bytes:
+                return read_blob(cast("Repo", git_repo), sha)
+
+            yield from analyze_items(sizes, options, read_blob_data)
+            return
+        yield from get_analysis_pool(options).map(
+            sizes, None if git_repo is None else str(git_repo.git_dir)
+        )
+
+
+def map_hashing(
+    sizes: Mapping[str, int],
+    options: LintOptions,
+    workers: LintWorkers = LintWorkers.CPU_COUNT,
+) -> dict[str, str]:
+    """Read and hash the files, keyed to their size in bytes, in the workers."""
+    with span("hashing") as transfer:
+        transfer.bytes_received = sum(sizes.values())
+        if workers is LintWorkers.USE_CURRENT_THREAD:
+            return dict(hash_paths(sizes))
+        return get_analysis_pool(options).hash(sizes)
 
 
 class DataclassJSONEncoder(json.JSONEncoder):
@@ -250,9 +760,9 @@ class DataclassJSONEncoder(json.JSONEncoder):
         return super().default(o)
 
 
-def get_analyzers() -> set[type[BaseCodeAnalyzer]]:
+def get_analyzers() -> set[AnalyzerType]:
     package = import_module("bar_raiser.tech_debt_framework.analyzers")
-    analyzers: set[type[BaseCodeAnalyzer]] = set()
+    analyzers: set[AnalyzerType] = set()
     for _loader, name, _is_pkg in walk_packages(package.__path__):
         full_name = package.__name__ + "." + name
         try:
@@ -261,8 +771,8 @@ def get_analyzers() -> set[type[BaseCodeAnalyzer]]:
                 obj = getattr(module, obj_name)
                 if (
                     isclass(obj)
-                    and obj is not BaseCodeAnalyzer
-                    and issubclass(obj, BaseCodeAnalyzer)
+                    and obj not in {BaseCodeAnalyzer, BaseTokenAnalyzer}
+                    and issubclass(obj, BaseCodeAnalyzer | BaseTokenAnalyzer)
                 ):
                     analyzers.add(obj)
         except ModuleNotFoundError:
@@ -277,33 +787,173 @@ def remove_delta(
         for result in path_results[path]:
             delta[TechDebtCategory(result.key)] -= result.count
         del path_results[path]
+        path_results.blob_shas.pop(path, None)
 
 
 def get_delta(
     path_results: PathResults,
     diffs: DiffIndex[Diff],
-    analyzers: set[type[BaseCodeAnalyzer]],
+    analyzers: set[AnalyzerType],
+    git_repo: Repo | None = None,
+    *,
+    aggregate_only: bool = False,
 ) -> Counter[TechDebtCategory]:
+    """
+    Update `path_results` with the changed paths in `diffs` and return the
+    delta. The changed files are read from the working tree, or from the git
+    objects of the diff when `git_repo` is given.
+    """
     delta = Counter[TechDebtCategory]()
     updated_paths: set[str] = set()
+    updated_blob_shas: dict[str, str] = {}
     for diff in diffs:
         if diff.a_path:
             remove_delta(delta, path_results, diff.a_path)
         b_path = diff.b_path
         if b_path:
             updated_paths.add(b_path)
+            if diff.b_blob is not None and diff.b_mode != SYMLINK_MODE_BITS:
+                updated_blob_shas[b_path] = diff.b_blob.hexsha
 
-    results = PathResults.analyze_paths(list(updated_paths), analyzers)
+    if git_repo is None:
+        results = PathResults.analyze_paths(
+            list(updated_paths),
+            analyzers,
+            cache=get_result_cache(),
+            aggregate_only=aggregate_only,
+        )
+    else:
+        results = PathResults.analyze_blobs(
+            git_repo,
+            updated_blob_shas,
+            analyzers,
+            cache=get_result_cache(),
+            aggregate_only=aggregate_only,
+        )
     for path, rlts in results.items():
         for result in rlts:
             delta[TechDebtCategory(result.key)] += result.count
         path_results[path] = rlts
+    path_results.blob_shas.update(results.blob_shas)
     zero_keys = [key for key, val in delta.items() if val == 0]
     for key in zero_keys:
         del delta[key]
     return delta
 
 
+def get_blob_rows(  # noqa: PLR0917
+    git_repo: Repo,
+    blob_paths: Mapping[str, str],
+    analyzers: set[AnalyzerType],
+    workers: LintWorkers = LintWorkers.CPU_COUNT,
+    cache: ResultCache | None = None,
+    *,
+    aggregate_only: bool = False,
+) -> dict[str, list[ResultRow]]:
+    """
+    Analyze blobs given as a mapping from blob SHA to a path of the blob and
+    return the result rows of each blob. Each blob is analyzed once however
+    many paths or commits share it, and only when it is not in the `cache`.
+    """
+    fingerprint = get_analyzers_fingerprint(analyzers, aggregate_only=aggregate_only)
+    rows_by_blob_sha = {} if cache is None else cache.get_many(blob_paths, fingerprint)
+    missing: dict[AnalysisItem, int] = {
+        (path, sha): get_blob_size(git_repo, sha)
+        for sha, path in blob_paths.items()
+        if sha not in rows_by_blob_sha
+    }
+    logger.info(
+        f"Result cache hits: {len(blob_paths) - len(missing)}, misses: {len(missing)}"
+    )
+    if not missing:
+        return rows_by_blob_sha
+    analyzed_rows: dict[str, list[ResultRow]] = {}
+    failed_blob_shas: set[str] = set()
+    for (_path, sha), rows in map_analysis(
+        missing,
+        LintOptions(
+            rules=analyzers,
+            config=get_lint_config(),
+            aggregate_only=aggregate_only,
+        ),
+        workers,
+        git_repo,
+    ):
+        analyzed_rows[cast("str", sha)] = rows or []
+        if rows is None:
+            failed_blob_shas.add(cast("str", sha))
+    if cache is not None:
+        # Failed analyses are retried by later runs rather than cached empty.
+        cache.put_many(
+            {
+                sha: rows
+                for sha, rows in analyzed_rows.items()
+                if sha not in failed_blob_shas
+            },
+            fingerprint,
+        )
+    rows_by_blob_sha.update(analyzed_rows)
+    return rows_by_blob_sha
+
+
+def get_commit_deltas(  # noqa: PLR0917
+    git_repo: Repo,
+    commit_pairs: Sequence[tuple[Commit, Commit]],
+    analyzers: set[AnalyzerType],
+    workers: LintWorkers = LintWorkers.CPU_COUNT,
+    *,
+    aggregate_only: bool = False,
+) -> list[Counter[TechDebtCategory]]:
+    """
+    Compute the delta from the base to the head of each (base, head) commit
+    pair from the blobs its diff removes and adds. The deltas don't depend on
+    each other, so the blobs of all pairs are analyzed in one batch.
+    """
+
+    def get_pair_blob_shas(
+        commit_pair: tuple[Commit, Commit],
+    ) -> tuple[dict[str, str], dict[str, str]]:
+        base_commit, head_commit = commit_pair
+        removed, added = get_diff_blob_shas(
+            git_repo, base_commit.hexsha, head_commit.hexsha
+        )
+        return (
+            {path: sha for path, sha in removed.items() if is_analyzable_path(path)},
+            {path: sha for path, sha in added.items() if is_analyzable_path(path)},
+        )
+
+    with (
+        span("git diff-tree"),
+        ThreadPoolExecutor(max_workers=MAX_GIT_DIFFS_IN_FLIGHT) as executor,
+    ):
+        pair_blob_shas = list(executor.map(get_pair_blob_shas, commit_pairs))
+    blob_paths: dict[str, str] = {}
+    for removed, added in pair_blob_shas:
+        for blob_shas in (removed, added):
+            blob_paths.update((sha, path) for path, sha in blob_shas.items())
+    rows_by_blob_sha = get_blob_rows(
+        git_repo,
+        blob_paths,
+        analyzers,
+        workers,
+        get_result_cache(),
+        aggregate_only=aggregate_only,
+    )
+    deltas: list[Counter[TechDebtCategory]] = []
+    for removed, added in pair_blob_shas:
+        delta = Counter[TechDebtCategory]()
+        for blob_shas, sign in ((removed, -1), (added, 1)):
+            for sha in blob_shas.values():
+                for key, _line, _col, _code, count in rows_by_blob_sha.get(sha, []):
+                    delta[TechDebtCategory(key)] += sign * count
+        deltas.append(
+            Counter[TechDebtCategory]({
+                key: value for key, value in delta.items() if value
+            })
+        )
+    return deltas
+
+
 def get_delta_value_with_emoji(delta_value: int, with_emoji: bool = True) -> str:
     if delta_value > 0:
         return f"{delta_value:+,d}{' :cry:' if with_emoji else ''}"
@@ -322,10 +972,58 @@ def get_progress_text(beginning: int, goal: int, current: int) -> str:
     return ":white_check_mark: on track"
 
 
+class FingerprintMismatchError(ValueError):
+    def __init__(self, sha: str) -> None:
+        super().__init__(f"PathResults of {sha} were computed by other analyzers.")
+
+
+class MissingFingerprintError(ValueError):
+    def __init__(self) -> None:
+        super().__init__("PathResults without an analyzer fingerprint.")
+
+
+def get_path_result_manifest_key(commit: Commit) -> str:
+    return f"{S3_KEY_PATH_RESULT_MANIFESTS}{commit.hexsha}.json"
+
+
+def get_path_result_blob_key(fingerprint: str, blob_sha: str) -> str:
+    return f"{S3_KEY_PATH_RESULT_BLOBS}{fingerprint}/{blob_sha}.json"
+
+
+def dump_rows(rows: Iterable[ResultRow]) -> bytes:
+    return json.dumps(list(rows), separators=(",", ":")).encode()
+
+
+def load_rows(body: bytes) -> list[ResultRow]:
+    return [tuple(row) for row in json.loads(body)]
+
+
 class PathResults(dict[str, list[Result]]):  # noqa: FURB189
+    """
+    The results of every analyzed path. `blob_shas` records the git blob SHA
+    each path was analyzed at and `fingerprint` the analyzers used, which key
+    the content-addressed storage in S3: one object per analyzed blob plus a
+    small manifest per commit mapping its paths to blobs.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.blob_shas: dict[str, str] = {}
+        self.fingerprint: str | None = None
+        # Blobs known to be stored in S3 under `fingerprint`.
+        self.uploaded_blob_shas: set[str] = set()
+
     @staticmethod
     def load(path: str) -> PathResults:
+        """Load results dumped in either the compact or the JSON format."""
         path_results = PathResults()
+        if is_compact_file(path):
+            with open_compact_reader(path) as f:
+                for sub_path, rows in iter_path_rows(f):
+                    path_results[sub_path] = [
+                        Result.from_row(sub_path, row) for row in rows
+                    ]
+            return path_results
         with open(path, encoding="utf-8") as f:
             raw_path_results = json.load(f)
             for sub_path, results in raw_path_results.items():
@@ -333,19 +1031,60 @@ class PathResults(dict[str, list[Result]]):  # noqa: FURB189
         return path_results
 
     @staticmethod
-    async def load_with_commit(s3: S3Client, commit: Commit) -> PathResults:
-        local_json_path = f"path_results-{commit.hexsha}.json"
-        if not Path(local_json_path).exists():  # noqa: ASYNC240
-            s3_key = f"{S3_KEY_PATH_RESULTS}{commit.hexsha}.json"
-            await s3.download_file(
-                S3_BUCKET,
-                s3_key,
-                local_json_path,
+    async def load_with_commit(
+        s3: S3Client, commit: Commit, fingerprint: str
+    ) -> PathResults:
+        """
+        Load the results of `commit` from its manifest. Blobs found in the local
+        result cache are not downloaded, and downloaded ones are added to it.
+        """
+        manifest = json.loads(
+            await get_object_from_s3(s3, get_path_result_manifest_key(commit))
+        )
+        if manifest["fingerprint"] != fingerprint:
+            raise FingerprintMismatchError(commit.hexsha)
+        blob_shas: dict[str, str] = manifest["blobs"]
+        cache = get_result_cache()
+        path_results = PathResults.from_cache(blob_shas, fingerprint, cache)
+        missing_blob_shas = list({
+            blob_sha for path, blob_sha in blob_shas.items() if path not in path_results
+        })
+        bodies = await asyncio.gather(
+            *(
+                get_object_from_s3(s3, get_path_result_blob_key(fingerprint, blob_sha))
+                for blob_sha in missing_blob_shas
             )
-            logger.info(f"Successfully downloaded {s3_key}")
-        return PathResults.load(local_json_path)
+        )
+        rows_by_blob_sha = {
+            blob_sha: load_rows(body)
+            for blob_sha, body in zip(missing_blob_shas, bodies, strict=True)
+        }
+        cache.put_many(rows_by_blob_sha, fingerprint)
+        for path, blob_sha in blob_shas.items():
+            if blob_sha in rows_by_blob_sha:
+                path_results[path] = [
+                    Result.from_row(path, row) for row in rows_by_blob_sha[blob_sha]
+                ]
+        logger.info(
+            f"Loaded {get_path_result_manifest_key(commit)}, downloaded {len(bodies)} blobs"
+        )
+        path_results.blob_shas = blob_shas
+        path_results.fingerprint = fingerprint
+        path_results.uploaded_blob_shas = set(blob_shas.values())
+        return path_results
 
     def dump(self, path: str) -> None:
+        """Dump in the compact format, or in readable JSON to a `.json` path."""
+        if not path.endswith(JSON_SUFFIX):
+            with open_compact_writer(path) as f:
+                write_path_rows(
+                    f,
+                    (
+                        (sub_path, [result.to_row() for result in results])
+                        for sub_path, results in self.items()
+                    ),
+                )
+            return
         json.dump(
             obj=self,
             fp=open(path, "w", encoding="utf-8"),
@@ -353,40 +1092,295 @@ class PathResults(dict[str, list[Result]]):  # noqa: FURB189
             indent=2,
         )
 
+    def dump_for_upload(
+        self, s3: S3Client, commit: Commit
+    ) -> Coroutine[Any, Any, None]:
+        """
+        Serialize the manifest and the blobs not yet in S3 now, and return their
+        upload, so the upload can run while the results are being changed.
+        """
+        if self.fingerprint is None:
+            raise MissingFingerprintError
+        blob_shas = {
+            path: blob_sha for path, blob_sha in self.blob_shas.items() if path in self
+        }
+        bodies = {
+            blob_sha: dump_rows(result.to_row() for result in self[path])
+            for path, blob_sha in blob_shas.items()
+            if blob_sha not in self.uploaded_blob_shas
+        }
+        manifest = json.dumps(
+            {"fingerprint": self.fingerprint, "blobs": blob_shas},
+            separators=(",", ":"),
+        ).encode()
+        return self.upload_snapshot(s3, commit, self.fingerprint, manifest, bodies)
+
+    async def upload_snapshot(  # noqa: PLR0917
+        self,
+        s3: S3Client,
+        commit: Commit,
+        fingerprint: str,
+        manifest: bytes,
+        bodies: Mapping[str, bytes],
+    ) -> None:
+        await asyncio.gather(
+            *(
+                put_object_to_s3(
+                    s3, get_path_result_blob_key(fingerprint, blob_sha), body
+                )
+                for blob_sha, body in bodies.items()
+            )
+        )
+        if fingerprint == self.fingerprint:
+            self.uploaded_blob_shas.update(bodies)
+        # The manifest goes last so that it only refers to uploaded blobs.
+        await put_object_to_s3(s3, get_path_result_manifest_key(commit), manifest)
+        logger.info(
+            f"Successfully uploaded {get_path_result_manifest_key(commit)} with {len(bodies)} new blobs"
+        )
+
     async def upload_to_s3(self, s3: S3Client, commit: Commit) -> None:
-        local_json_path = f"path_results-{commit.hexsha}.json"
-        self.dump(local_json_path)
-        s3_key = f"{S3_KEY_PATH_RESULTS}{commit.hexsha}.json"
-        await s3.upload_file(local_json_path, S3_BUCKET, s3_key)
-        logger.info(f"Successfully uploaded {s3_key}")
+        await self.dump_for_upload(s3, commit)
+
+    @staticmethod
+    async def load_nearest_ancestor(
+        s3: S3Client,
+        git_repo: Repo,
+        commit: Commit,
+        fingerprint: str,
+    ) -> tuple[Commit, PathResults] | None:
+        """
+        Load the snapshot of the nearest first-parent ancestor of `commit` that
+        has one, looking up to MAX_SNAPSHOT_ANCESTOR_DEPTH commits back.
+        """
+        ancestors = list(
+            git_repo.iter_commits(
+                commit, first_parent=True, max_count=MAX_SNAPSHOT_ANCESTOR_DEPTH + 1
+            )
+        )[1:]
+        for chunk in chunked(ancestors, MAX_S3_TRANSFERS_IN_FLIGHT):
+            found = await asyncio.gather(
+                *(
+                    has_object_in_s3(s3, get_path_result_manifest_key(ancestor))
+                    for ancestor in chunk
+                )
+            )
+            for ancestor, has_snapshot in zip(chunk, found, strict=True):
+                if not has_snapshot:
+                    continue
+                try:
+                    return ancestor, await PathResults.load_with_commit(
+                        s3, ancestor, fingerprint
+                    )
+                except Exception:
+                    logger.warning(f"Failed to load PathResults of {ancestor}.")
+        return None
+
+    @staticmethod
+    async def gen_from_nearest_snapshot(
+        s3: S3Client,
+        git_repo: Repo,
+        commit: Commit,
+        paths: list[str],
+        analyzers: set[AnalyzerType],
+        *,
+        aggregate_only: bool = False,
+    ) -> PathResults:
+        """
+        Compute the results of `commit` from the snapshot of its nearest ancestor
+        by analyzing only the files changed since, or analyze every path when
+        no ancestor has a snapshot.
+        """
+        snapshot = await PathResults.load_nearest_ancestor(
+            s3,
+            git_repo,
+            commit,
+            get_analyzers_fingerprint(analyzers, aggregate_only=aggregate_only),
+        )
+        if snapshot is None:
+            logger.warning(f"No PathResults snapshot found. Analyze {commit}")
+            return PathResults.analyze_commit(
+                git_repo,
+                commit,
+                paths,
+                analyzers,
+                cache=get_result_cache(),
+                aggregate_only=aggregate_only,
+            )
+        ancestor, path_results = snapshot
+        logger.info(f"Roll PathResults forward from {ancestor} to {commit}")
+        # One diff from the ancestor gives the same results as applying every
+        # intermediate diff in turn, and analyzes each changed file once.
+        await asyncio.to_thread(
+            get_delta,
+            path_results,
+            ancestor.diff(commit),
+            analyzers,
+            git_repo,
+            aggregate_only=aggregate_only,
+        )
+        return path_results
 
     def __getitem__(self, __key: str) -> list[Result]:
         if __key not in self:
             super().__setitem__(__key, [])
         return super().__getitem__(__key)
 
+    @staticmethod
+    def from_cache(
+        blob_shas: Mapping[str, str], fingerprint: str, cache: ResultCache
+    ) -> PathResults:
+        path_results = PathResults()
+        cached_rows = cache.get_many(blob_shas.values(), fingerprint)
+        for path, blob_sha in blob_shas.items():
+            if blob_sha in cached_rows:
+                path_results[path] = [
+                    Result.from_row(path, row) for row in cached_rows[blob_sha]
+                ]
+        logger.info(
+            f"Result cache hits: {len(path_results)}, misses: {len(blob_shas) - len(path_results)}"
+        )
+        return path_results
+
+    def save_to_cache(
+        self,
+        blob_shas: Mapping[str, str],
+        paths: Iterable[str],
+        fingerprint: str,
+        cache: ResultCache,
+    ) -> None:
+        cache.put_many(
+            {
+                blob_shas[path]: [result.to_row() for result in self.get(path, [])]
+                for path in paths
+                if path in blob_shas
+            },
+            fingerprint,
+        )
+
+    def add_path_rows(self, path_rows: Iterable[AnalysisRows]) -> set[str]:
+        """Add the results of the analyzed paths and return the failed ones."""
+        failed_paths: set[str] = set()
+        for (path, _blob_sha), rows in path_rows:
+            if rows is None:
+                failed_paths.add(path)
+            elif rows:
+                self[path] = [Result.from_row(path, row) for row in rows]
+        return failed_paths
+
+    def set_blob_shas(self, blob_shas: Mapping[str, str], fingerprint: str) -> None:
+        self.blob_shas = {
+            path: blob_sha for path, blob_sha in blob_shas.items() if path in self
+        }
+        self.fingerprint = fingerprint
+
     @staticmethod
     def analyze_paths(
         paths: list[str],
-        analyzers: set[type[BaseCodeAnalyzer]],
+        analyzers: set[AnalyzerType],
+        workers: LintWorkers = LintWorkers.CPU_COUNT,
+        cache: ResultCache | None = None,
+        *,
+        aggregate_only: bool = False,
+    ) -> PathResults:
+        """
+        Analyze the files under `paths`. With a `cache`, files whose content was
+        analyzed before by the same analyzers are read from the cache and only
+        the others are parsed. With `aggregate_only`, the results of each file
+        are merged into their counts per key, see `aggregate_results`.
+        """
+        files = {
+            path
+            for path in find_files(paths, ANALYZABLE_SUFFIXES)
+            if is_analyzable_path(path)
+        }
+        fingerprint = get_analyzers_fingerprint(
+            analyzers, aggregate_only=aggregate_only
+        )
+        options = LintOptions(
+            rules=analyzers, config=get_lint_config(), aggregate_only=aggregate_only
+        )
+        # The files are read by the workers, the parent only stats them.
+        sizes = {path: get_file_size(path) for path in files}
+        if cache is None:
+            blob_shas: dict[str, str] = {}
+            path_results = PathResults()
+        else:
+            blob_shas = map_hashing(sizes, options, workers)
+            path_results = PathResults.from_cache(blob_shas, fingerprint, cache)
+            files.difference_update(path_results)
+        path_rows = list(
+            map_analysis(
+                {(path, None): sizes[path] for path in files}, options, workers
+            )
+        )
+        for (path, blob_sha), _rows in path_rows:
+            if blob_sha is not None:
+                blob_shas[path] = blob_sha
+        failed_paths = path_results.add_path_rows(path_rows)
+        if cache is not None:
+            path_results.save_to_cache(
+                blob_shas, files - failed_paths, fingerprint, cache
+            )
+        path_results.set_blob_shas(blob_shas, fingerprint)
+        return path_results
+
+    @staticmethod
+    def analyze_blobs(
+        git_repo: Repo,
+        blob_shas: Mapping[str, str],
+        analyzers: set[AnalyzerType],
         workers: LintWorkers = LintWorkers.CPU_COUNT,
+        cache: ResultCache | None = None,
+        *,
+        aggregate_only: bool = False,
     ) -> PathResults:
+        """
+        Analyze files given as a mapping from path to git blob SHA, reading their
+        content from the git object database instead of the working tree.
+        """
+        blob_shas = {
+            path: sha for path, sha in blob_shas.items() if is_analyzable_path(path)
+        }
+        rows_by_blob_sha = get_blob_rows(
+            git_repo,
+            {sha: path for path, sha in blob_shas.items()},
+            analyzers,
+            workers,
+            cache,
+            aggregate_only=aggregate_only,
+        )
         path_results = PathResults()
-        print(analyzers)
-        for results in map_paths(  # pyright: ignore[reportUnknownVariableType]
-            get_analyzed_results,
-            {str(path) for path in find_files(paths)},
-            LintOptions(
-                rules=analyzers,
-                config=get_lint_config(),
-            ),
-            workers=workers,
-        ):
-            for result in results:  # pyright: ignore[reportUnknownVariableType]
-                result = cast("Result", result)
-                path_results[result.path].append(result)
+        for path, sha in blob_shas.items():
+            if rows := rows_by_blob_sha.get(sha):
+                path_results[path] = [Result.from_row(path, row) for row in rows]
+        path_results.set_blob_shas(
+            blob_shas,
+            get_analyzers_fingerprint(analyzers, aggregate_only=aggregate_only),
+        )
         return path_results
 
+    @staticmethod
+    def analyze_commit(  # noqa: PLR0917
+        git_repo: Repo,
+        commit: Commit,
+        paths: list[str],
+        analyzers: set[AnalyzerType],
+        workers: LintWorkers = LintWorkers.CPU_COUNT,
+        cache: ResultCache | None = None,
+        *,
+        aggregate_only: bool = False,
+    ) -> PathResults:
+        """Analyze the files under `paths` as of `commit` without checking it out."""
+        return PathResults.analyze_blobs(
+            git_repo,
+            get_commit_blob_shas(git_repo, commit, paths),
+            analyzers,
+            workers,
+            cache,
+            aggregate_only=aggregate_only,
+        )
+
     def get_key_counts(self) -> Counter[TechDebtCategory]:
         counter = Counter[TechDebtCategory]()
         for results in self.values():
@@ -401,40 +1395,62 @@ class PathResults(dict[str, list[Result]]):  # noqa: FURB189
         base_commit: Commit,
         head_commit: Commit,
         paths: list[str],
-        analyzers: set[type[BaseCodeAnalyzer]],
+        analyzers: set[AnalyzerType],
         force_recompute: bool = False,
+        *,
+        aggregate_only: bool = False,
     ) -> tuple[Counter[TechDebtCategory], PathResults]:
+        uploads: list[Awaitable[None]] = []
         if force_recompute:
-            git_repo.git.checkout(base_commit)
-            logger.info(f"git checkout {base_commit}")
-            path_results = PathResults.analyze_paths(paths, analyzers)
-            git_repo.git.checkout(head_commit)
-            logger.info(f"git checkout {head_commit}")
+            logger.info(f"Analyze {base_commit}")
+            path_results = PathResults.analyze_commit(
+                git_repo,
+                base_commit,
+                paths,
+                analyzers,
+                cache=get_result_cache(),
+                aggregate_only=aggregate_only,
+            )
         else:
             try:
-                path_results = await PathResults.load_with_commit(s3, base_commit)
+                path_results = await PathResults.load_with_commit(
+                    s3,
+                    base_commit,
+                    get_analyzers_fingerprint(analyzers, aggregate_only=aggregate_only),
+                )
             except Exception:
-                logger.warning(
-                    f"Failed to download PathResults. Checkout {base_commit}"
+                logger.warning(f"Failed to download PathResults of {base_commit}.")
+                path_results = await PathResults.gen_from_nearest_snapshot(
+                    s3,
+                    git_repo,
+                    base_commit,
+                    paths,
+                    analyzers,
+                    aggregate_only=aggregate_only,
                 )
-                git_repo.git.checkout(base_commit)
-                path_results = PathResults.analyze_paths(paths, analyzers)
                 try:
-                    await path_results.upload_to_s3(s3, base_commit)
+                    # Upload the base results while the delta is computed.
+                    uploads.append(
+                        asyncio.ensure_future(
+                            path_results.dump_for_upload(s3, base_commit)
+                        )
+                    )
                 except Exception:
                     logger.warning("Failed to upload PathResults to s3.")
-                git_repo.git.checkout(head_commit)
 
-        delta = get_delta(
+        delta = await asyncio.to_thread(
+            get_delta,
             path_results,
             base_commit.diff(head_commit),
             analyzers,
+            git_repo,
+            aggregate_only=aggregate_only,
         )
         logger.info(f"Delta: {delta}")
-        try:
-            await path_results.upload_to_s3(s3, head_commit)
-        except Exception:
-            logger.warning("Failed to upload PathResults to s3.")
+        uploads.append(path_results.upload_to_s3(s3, head_commit))
+        for result in await asyncio.gather(*uploads, return_exceptions=True):
+            if isinstance(result, Exception):
+                logger.warning("Failed to upload PathResults to s3.")
         return delta, path_results
 
     def get_markdown_summary(
@@ -443,61 +1459,70 @@ class PathResults(dict[str, list[Result]]):  # noqa: FURB189
         author: str,
         cumulative_delta: Counter[TechDebtCategory] | None = None,
     ) -> str:
-        overall = self.get_key_counts()
+        return get_contribution_markdown_summary(
+            self.get_key_counts(), delta, author, cumulative_delta
+        )
 
-        show_regression_notice = False
-        for key, value in delta.items():
-            if key not in REGRESSION_TECH_DEBT_CATEGORIES and value > 0:
-                show_regression_notice = True
 
-        output = f"## Tech Debt Contribution Summary for {author}\n\n"
-        if show_regression_notice:
-            output += f"> [!CAUTION]\n> {NEW_TECH_DEBT_MESSAGE}\n\n"
-        output += f"| Tech Debt | {CURRNET_QUARTER} Goal | Remaining | Progress Check | Weight | Upcoming Contribution from this PR |"
-        if cumulative_delta:
-            output += f" Your Contribution in 2025 {CURRNET_QUARTER} |"
-        output += "\n|:---------:|:----------:|:----------:|:----------:|:----------:|:-----------:|"
+def get_contribution_markdown_summary(
+    overall: Counter[TechDebtCategory],
+    delta: Counter[TechDebtCategory],
+    author: str,
+    cumulative_delta: Counter[TechDebtCategory] | None = None,
+) -> str:
+    show_regression_notice = False
+    for key, value in delta.items():
+        if key not in REGRESSION_TECH_DEBT_CATEGORIES and value > 0:
+            show_regression_notice = True
+
+    output = f"## Tech Debt Contribution Summary for {author}\n\n"
+    if show_regression_notice:
+        output += f"> [!CAUTION]\n> {NEW_TECH_DEBT_MESSAGE}\n\n"
+    output += f"| Tech Debt | {CURRNET_QUARTER} Goal | Remaining | Progress Check | Weight | Upcoming Contribution from this PR |"
+    if cumulative_delta:
+        output += f" Your Contribution in 2025 {CURRNET_QUARTER} |"
+    output += "\n|:---------:|:----------:|:----------:|:----------:|:----------:|:-----------:|"
+    if cumulative_delta:
+        output += ":-----------:|"
+    output += "\n"
+
+    for key, val in sorted(overall.items(), key=operator.itemgetter(0)):
+        if key in TECH_DEBT_BEGINNING_AND_GOALS:
+            beginning, goal = TECH_DEBT_BEGINNING_AND_GOALS[key]
+            progress = get_progress_text(beginning, goal, val)
+            goal_text = f"{goal:,}"
+        else:
+            progress = "N/A"
+            goal_text = "N/A"
+        output += (
+            "| "
+            + key
+            + " | "
+            + goal_text
+            + " | "
+            + f"{val:,}"
+            + " | "
+            + progress
+            + " | "
+            + str(TECH_DEBT_WEIGHTS.get(key, "N/A"))
+            + " | "
+            + get_delta_value_with_emoji(
+                delta.get(key, 0),
+                key not in REGRESSION_TECH_DEBT_CATEGORIES,
+            )
+        )
         if cumulative_delta:
-            output += ":-----------:|"
-        output += "\n"
-
-        for key, val in sorted(overall.items(), key=operator.itemgetter(0)):
-            if key in TECH_DEBT_BEGINNING_AND_GOALS:
-                beginning, goal = TECH_DEBT_BEGINNING_AND_GOALS[key]
-                progress = get_progress_text(beginning, goal, val)
-                goal_text = f"{goal:,}"
-            else:
-                progress = "N/A"
-                goal_text = "N/A"
-            output += (
-                "| "
-                + key
-                + " | "
-                + goal_text
-                + " | "
-                + f"{val:,}"
-                + " | "
-                + progress
-                + " | "
-                + str(TECH_DEBT_WEIGHTS.get(key, "N/A"))
-                + " | "
-                + get_delta_value_with_emoji(
-                    delta.get(key, 0),
+            cumulative_value = cumulative_delta.get(key, 0)
+            output += " | " + str(
+                get_delta_value_with_emoji(
+                    cumulative_value,
                     key not in REGRESSION_TECH_DEBT_CATEGORIES,
                 )
             )
-            if cumulative_delta:
-                cumulative_value = cumulative_delta.get(key, 0)
-                output += " | " + str(
-                    get_delta_value_with_emoji(
-                        cumulative_value,
-                        key not in REGRESSION_TECH_DEBT_CATEGORIES,
-                    )
-                )
 
-            output += " |\n"
-        output += "\n"
-        return output
+        output += " |\n"
+    output += "\n"
+    return output
 
 
 class History:
@@ -507,6 +1532,14 @@ class History:
     @staticmethod
     def load(path: str) -> History:
         history = History()
+        if is_compact_file(path):
+            with open_compact_reader(path) as f:
+                for author, sha, delta in iter_history(f):
+                    history.data.setdefault(author, []).append((
+                        sha,
+                        Counter(cast("dict[TechDebtCategory, int]", delta)),
+                    ))
+            return history
         with open(path, encoding="utf-8") as f:
             raw_history = json.load(f)
             for author, items in raw_history.items():
@@ -515,30 +1548,40 @@ class History:
 
     @staticmethod
     async def load_with_commit(s3: S3Client, commit: Commit) -> History:
-        local_json_path = f"history-{commit.hexsha}.json"
-        if not Path(local_json_path).exists():  # noqa: ASYNC240
-            s3_key = f"{S3_KEY_HISTORY}{commit.hexsha}.json"
-            await s3.download_file(
-                S3_BUCKET,
-                s3_key,
-                local_json_path,
-            )
-            logger.info(f"Successfully downloaded {s3_key}")
-        return History.load(local_json_path)
+        return History.load(
+            await download_snapshot_from_s3(s3, S3_KEY_HISTORY, "history", commit)
+        )
 
     def dump(self, path: str) -> None:
+        if not path.endswith(JSON_SUFFIX):
+            with open_compact_writer(path) as f:
+                write_history(
+                    f,
+                    (
+                        (author, sha, delta)
+                        for author, items in self.data.items()
+                        for sha, delta in items
+                    ),
+                )
+            return
         json.dump(
             obj=self.data,
             fp=open(path, "w", encoding="utf-8"),
             indent=2,
         )
 
+    def dump_for_upload(
+        self, s3: S3Client, commit: Commit
+    ) -> Coroutine[Any, Any, None]:
+        """Dump the history as of `commit` now and return its upload."""
+        local_path = f"history-{commit.hexsha}{COMPACT_SUFFIX}"
+        self.dump(local_path)
+        return upload_to_s3(
+            s3, local_path, f"{S3_KEY_HISTORY}{commit.hexsha}{COMPACT_SUFFIX}"
+        )
+
     async def upload_to_s3(self, s3: S3Client, commit: Commit) -> None:
-        local_json_path = f"history-{commit.hexsha}.json"
-        self.dump(local_json_path)
-        s3_key = f"{S3_KEY_HISTORY}{commit.hexsha}.json"
-        await s3.upload_file(local_json_path, S3_BUCKET, s3_key)
-        logger.info(f"Successfully uploaded {s3_key}")
+        await self.dump_for_upload(s3, commit)
 
     def add_delta(
         self,
@@ -608,6 +1651,13 @@ class LeaderBoard:
     @staticmethod
     def load(path: str) -> LeaderBoard:
         leaderboard = LeaderBoard()
+        if is_compact_file(path):
+            with open_compact_reader(path) as f:
+                for author, delta in iter_counters(f):
+                    leaderboard.board[author] = Counter(
+                        cast("dict[TechDebtCategory, int]", delta)
+                    )
+            return leaderboard
         with open(path, encoding="utf-8") as f:
             raw_leaderboard = json.load(f)
             for author, delta in raw_leaderboard.items():
@@ -616,30 +1666,35 @@ class LeaderBoard:
 
     @staticmethod
     async def load_with_commit(s3: S3Client, commit: Commit) -> LeaderBoard:
-        local_json_path = f"leaderboard-{commit.hexsha}.json"
-        if not Path(local_json_path).exists():  # noqa: ASYNC240
-            s3_key = f"{S3_KEY_LEADERBOARD}{commit.hexsha}.json"
-            await s3.download_file(
-                S3_BUCKET,
-                s3_key,
-                local_json_path,
+        return LeaderBoard.load(
+            await download_snapshot_from_s3(
+                s3, S3_KEY_LEADERBOARD, "leaderboard", commit
             )
-            logger.info(f"Successfully downloaded {s3_key}")
-        return LeaderBoard.load(local_json_path)
+        )
 
     def dump(self, path: str) -> None:
+        if not path.endswith(JSON_SUFFIX):
+            with open_compact_writer(path) as f:
+                write_counters(f, self.board.items())
+            return
         json.dump(
             obj=self.board,
             fp=open(path, "w", encoding="utf-8"),
             indent=2,
         )
 
+    def dump_for_upload(
+        self, s3: S3Client, commit: Commit
+    ) -> Coroutine[Any, Any, None]:
+        """Dump the leaderboard as of `commit` now and return its upload."""
+        local_path = f"leaderboard-{commit.hexsha}{COMPACT_SUFFIX}"
+        self.dump(local_path)
+        return upload_to_s3(
+            s3, local_path, f"{S3_KEY_LEADERBOARD}{commit.hexsha}{COMPACT_SUFFIX}"
+        )
+
     async def upload_to_s3(self, s3: S3Client, commit: Commit) -> None:
-        local_json_path = f"leaderboard-{commit.hexsha}.json"
-        self.dump(local_json_path)
-        s3_key = f"{S3_KEY_LEADERBOARD}{commit.hexsha}.json"
-        await s3.upload_file(local_json_path, S3_BUCKET, s3_key)
-        logger.info(f"Successfully uploaded {s3_key}")
+        await self.dump_for_upload(s3, commit)
 
     def add_delta_and_check_contribution(
         self, author: str, delta: Counter[TechDebtCategory]
@@ -1,11 +1,33 @@
 from __future__ import annotations
 
-from argparse import ArgumentParser
-from dataclasses import dataclass
+from argparse import ArgumentParser, Namespace
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import cache
+from json import JSONDecodeError, JSONDecoder
+from logging import getLogger
 from pathlib import Path
-from re import match
+from re import compile
+from subprocess import PIPE, STDOUT, Popen
+from typing import TYPE_CHECKING, Any, Protocol
 
-from bar_raiser.utils.github import Action, Annotation, Autofixes
+from bar_raiser.utils.diff import DEFAULT_DIFF_BASE, get_diff_index
+from bar_raiser.utils.github import (
+    Action,
+    Annotation,
+    Autofixes,
+    get_pull_request_event,
+)
+from bar_raiser.utils.instrumentation import span
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Sequence
+
+    from git.repo import Repo
+
+    from bar_raiser.utils.diff import DiffIndex
+
+logger = getLogger(__name__)
 
 
 @dataclass(frozen=True)
@@ -17,56 +39,285 @@ class CheckPattern:
     is_autofixable: bool = False
 
 
-def parse_line(
-    pattern: CheckPattern, line: str, repo: Path
-) -> tuple[Annotation | None, bool]:
-    matched = match(pattern.regex, line)
-    is_autofixable = pattern.is_autofixable
-    if matched:
-        line_num = int(matched.group("line")) if pattern.line is None else pattern.line
-        return (
+class UnsupportedCheckPatternError(ValueError):
+    def __init__(self, regex: str, reason: str) -> None:
+        super().__init__(f"CheckMatcher cannot combine the pattern {regex!r}: {reason}")
+
+
+GROUP_NAME_PATTERN = compile(r"\(\?P(?P<kind>[<=])(?P<name>\w+)")
+# The prefix matches an even run of backslashes, so escaped ones are skipped.
+NUMBERED_GROUP_REFERENCE_PATTERN = compile(r"(?<!\\)(?:\\\\)*(?:\\[1-9]|\(\?\([0-9])")
+GLOBAL_FLAGS_PATTERN = compile(r"(?<!\\)(?:\\\\)*\(\?[aiLmsux]+\)")
+LEADING_GLOBAL_FLAGS_PATTERN = compile(r"^\(\?(?P<flags>[aiLmsux]+)\)")
+
+
+def rename_groups(regex: str, index: int) -> str:
+    return GROUP_NAME_PATTERN.sub(rf"(?P\g<kind>\g<name>__{index}", regex)
+
+
+def scope_leading_flags(regex: str) -> str:
+    """
+    Turn the global flags leading `regex`, e.g. `(?i)`, into a group scoped to
+    the pattern, which keeps them from applying to the other alternatives.
+    """
+    matched = LEADING_GLOBAL_FLAGS_PATTERN.match(regex)
+    if matched is None:
+        return regex
+    return f"(?{matched.group('flags')}:{regex[matched.end() :]})"
+
+
+def get_combinable_regex(regex: str, index: int) -> str:
+    if NUMBERED_GROUP_REFERENCE_PATTERN.search(regex):
+        raise UnsupportedCheckPatternError(
+            regex, "refer to groups by name, as their numbers shift when combined."
+        )
+    scoped = scope_leading_flags(regex)
+    if GLOBAL_FLAGS_PATTERN.search(scoped):
+        raise UnsupportedCheckPatternError(
+            regex, "global flags are only supported at the start of the pattern."
+        )
+    return rename_groups(scoped, index)
+
+
+class CheckMatcher:
+    """
+    Match output lines against a list of CheckPatterns with one compiled regex.
+
+    The patterns are combined into one alternation in which every pattern owns
+    a wrapping group and renamed copies of its named groups, so each line is
+    matched once and attributed to the first pattern that matches it. Hence
+    the patterns may not use numbered group references, and global flags only
+    at their start, where they are scoped to the pattern.
+    """
+
+    def __init__(self, patterns: Sequence[CheckPattern]) -> None:
+        self.patterns = tuple(patterns)
+        alternatives = [
+            f"(?P<{self.get_wrapper_group(index)}>{get_combinable_regex(pattern.regex, index)})"
+            for index, pattern in enumerate(self.patterns)
+        ]
+        self.regex = compile("(?:" + "|".join(alternatives) + ")")
+        self.pattern_by_wrapper_group = {
+            self.get_wrapper_group(index): (index, pattern)
+            for index, pattern in enumerate(self.patterns)
+        }
+
+    @staticmethod
+    def get_wrapper_group(index: int) -> str:
+        return f"pattern__{index}"
+
+    def scan(self, output: str, repo: Path) -> tuple[list[Annotation], bool]:
+        annotations: list[Annotation] = []
+        scanner = CheckScanner(self, repo, annotations.append)
+        for line in output.split("\n"):
+            scanner.feed(line)
+        return annotations, scanner.is_autofix_available
+
+
+class CheckScanner:
+    """
+    Scan output lines with a CheckMatcher one line at a time, passing every
+    annotation to `on_annotation` as soon as its line is read.
+    """
+
+    def __init__(
+        self,
+        matcher: CheckMatcher,
+        repo: Path,
+        on_annotation: Callable[[Annotation], object],
+    ) -> None:
+        self.matcher = matcher
+        self.repo = repo
+        self.on_annotation = on_annotation
+        self.is_autofix_available = False
+        self.cwd = Path.cwd()
+        self.relative_paths: dict[str, str] = {}
+
+    def get_relative_path(self, path: str) -> str:
+        if path not in self.relative_paths:
+            self.relative_paths[path] = str(
+                Path(self.cwd / path).relative_to(self.repo)
+            )
+        return self.relative_paths[path]
+
+    def feed(self, line: str) -> None:
+        matched = self.matcher.regex.match(line)
+        if matched is None or matched.lastgroup is None:
+            return
+        index, pattern = self.matcher.pattern_by_wrapper_group[matched.lastgroup]
+        self.is_autofix_available = self.is_autofix_available or pattern.is_autofixable
+        if not pattern.should_create_annotation:
+            return
+        line_num = (
+            int(matched.group(f"line__{index}"))
+            if pattern.line is None
+            else pattern.line
+        )
+        self.on_annotation(
             Annotation(
-                path=str(Path(Path.cwd() / matched.group("path")).relative_to(repo)),
+                path=self.get_relative_path(matched.group(f"path__{index}")),
                 start_line=line_num,
                 end_line=line_num,
                 annotation_level="failure",
-                message=matched.group("message")
+                message=matched.group(f"message__{index}")
                 if pattern.message is None
                 else pattern.message,
-            ),
-            is_autofixable,
+            )
         )
-    return (None, is_autofixable)
+
+
+def run_command_streaming(
+    cmd: list[str], on_line: Callable[[str], object], *, merge_stderr: bool = True
+) -> int:
+    """
+    Run `cmd` and pass every line of its output to `on_line` while the command
+    is still running, without buffering the whole output. Returns the exit code.
+    """
+    # e.g. "subprocess ruff check", so the subcommands of a tool are told apart.
+    name = " ".join(["subprocess", Path(cmd[0]).name, *cmd[1:2]])
+    with (
+        span(name) as transfer,
+        Popen(cmd, stdout=PIPE, stderr=STDOUT if merge_stderr else None) as process,
+    ):
+        if process.stdout is not None:
+            for raw_line in process.stdout:
+                transfer.bytes_received += len(raw_line)
+                on_line(raw_line.decode("utf-8", errors="replace").rstrip("\r\n"))
+    return process.returncode
+
+
+class CheckOutputParser(Protocol):
+    is_autofix_available: bool
+
+    def feed(self, line: str) -> None: ...
+
+
+@dataclass(frozen=True)
+class CheckCommand:
+    """
+    A check command and how to parse its output. The output is scanned with
+    `patterns` unless `create_parser` is given, which is called with the repo
+    and the annotation callback to build a parser for structured output.
+    """
+
+    cmd: list[str]
+    patterns: list[CheckPattern] = field(default_factory=list[CheckPattern])
+    create_parser: (
+        Callable[[Path, Callable[[Annotation], object]], CheckOutputParser] | None
+    ) = None
+    merge_stderr: bool = True
+
+
+@dataclass(frozen=True)
+class CheckCommandResult:
+    return_code: int
+    is_autofix_available: bool
+
+
+def run_check_command(
+    command: CheckCommand, repo: Path, on_annotation: Callable[[Annotation], object]
+) -> CheckCommandResult:
+    scanner = (
+        CheckScanner(get_check_matcher(tuple(command.patterns)), repo, on_annotation)
+        if command.create_parser is None
+        else command.create_parser(repo, on_annotation)
+    )
+    name = " ".join(command.cmd)
+
+    def on_line(line: str) -> None:
+        logger.info(f"[{name}] {line}")
+        scanner.feed(line)
+
+    return_code = run_command_streaming(
+        command.cmd, on_line, merge_stderr=command.merge_stderr
+    )
+    return CheckCommandResult(
+        return_code=return_code, is_autofix_available=scanner.is_autofix_available
+    )
+
+
+def run_check_commands(
+    commands: Sequence[CheckCommand],
+    repo: Path,
+    on_annotation: Callable[[Annotation], object],
+) -> list[CheckCommandResult]:
+    """
+    Run independent check commands concurrently. Annotations are passed to
+    `on_annotation` from the worker threads as they are found, and the results
+    are returned in the order of `commands`.
+    """
+    if not commands:
+        return []
+
+    def run(command: CheckCommand) -> CheckCommandResult:
+        return run_check_command(command, repo, on_annotation)
+
+    with ThreadPoolExecutor(max_workers=len(commands)) as executor:
+        return list(executor.map(run, commands))
+
+
+class JsonArrayStreamDecoder:
+    """
+    Decode the items of the JSON array stored under `key` in a JSON object that
+    is fed in pieces, e.g. the generalDiagnostics of `pyright --outputjson`.
+    The items are expected to be JSON objects. Decoded text is dropped so only
+    the current item is kept in memory.
+    """
+
+    def __init__(self, key: str) -> None:
+        self.key_pattern = compile(rf'"{key}"\s*:\s*\[')
+        self.decoder = JSONDecoder()
+        self.buffer = ""
+        self.is_in_array = False
+        self.is_done = False
+
+    def feed(self, text: str) -> list[Any]:
+        items: list[Any] = []
+        if self.is_done:
+            return items
+        self.buffer += text
+        if not self.is_in_array:
+            matched = self.key_pattern.search(self.buffer)
+            if matched is None:
+                return items
+            self.buffer = self.buffer[matched.end() :]
+            self.is_in_array = True
+        while True:
+            self.buffer = self.buffer.lstrip().removeprefix(",").lstrip()
+            if not self.buffer:
+                return items
+            if self.buffer.startswith("]"):
+                self.is_done = True
+                self.buffer = ""
+                return items
+            try:
+                item, end = self.decoder.raw_decode(self.buffer)
+            except JSONDecodeError:
+                return items  # the item is incomplete, wait for more text
+            items.append(item)
+            self.buffer = self.buffer[end:]
+
+
+def get_autofix_action(autofix: Autofixes) -> Action:
+    return Action(
+        label="autofix",
+        description="Click to auto-push an autofix commit",
+        identifier=str(autofix),
+    )
+
+
+@cache
+def get_check_matcher(patterns: tuple[CheckPattern, ...]) -> CheckMatcher:
+    return CheckMatcher(patterns)
 
 
 def get_annotations_and_actions(
     repo_dir: Path, ruff_output: str, patterns: list[CheckPattern], autofix: Autofixes
 ) -> tuple[list[Annotation], Action | None]:
-    annotations: list[Annotation] = []
-    is_autofix_available = False
-    for line in ruff_output.split("\n"):
-        for pattern in patterns:
-            if pattern.should_create_annotation:
-                annotation, is_autofixable = parse_line(pattern, line, repo_dir)
-                if annotation:
-                    annotations.append(annotation)
-                    if is_autofixable:
-                        is_autofix_available = is_autofixable
-            elif (
-                is_autofix_available is False
-                and pattern.is_autofixable
-                and match(pattern.regex, line)
-            ):
-                is_autofix_available = True
-    action = (
-        Action(
-            label="autofix",
-            description="Click to auto-push an autofix commit",
-            identifier=str(autofix),
-        )
-        if is_autofix_available
-        else None
+    annotations, is_autofix_available = get_check_matcher(tuple(patterns)).scan(
+        ruff_output, repo_dir
     )
+    action = get_autofix_action(autofix) if is_autofix_available else None
     return annotations, action
 
 
@@ -81,3 +332,26 @@ def create_arg_parser_with_slack_dm_on_failure() -> ArgumentParser:
         default=None,
     )
     return parser
+
+
+def add_changed_lines_arguments(parser: ArgumentParser) -> None:
+    parser.add_argument(
+        "--changed-lines-only",
+        action="store_true",
+        help="Only annotate lines changed since the merge base with --diff-base.",
+    )
+    parser.add_argument(
+        "--diff-base",
+        help=f"Git ref to diff against. Defaults to the pull request base commit, or {DEFAULT_DIFF_BASE}.",
+        default=None,
+    )
+
+
+def get_diff_index_for_args(args: Namespace, git_repo: Repo) -> DiffIndex | None:
+    if not args.changed_lines_only:
+        return None
+    base: str | None = args.diff_base
+    if base is None:
+        event = get_pull_request_event()
+        base = DEFAULT_DIFF_BASE if event is None else event.base_sha
+    return get_diff_index(git_repo, base)
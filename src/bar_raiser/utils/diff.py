@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+from bisect import bisect_right
+from logging import getLogger
+from re import compile
+from typing import TYPE_CHECKING
+
+from git.exc import GitCommandError
+
+from bar_raiser.utils.instrumentation import span
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable, Mapping
+
+    from git.repo import Repo
+
+    from bar_raiser.utils.github import Annotation
+
+logger = getLogger(__name__)
+
+DEFAULT_DIFF_BASE = "origin/master"
+NEW_FILE_PREFIX = "+++ "
+# The escapes of C-quoted paths in git output, besides octal bytes.
+QUOTED_PATH_ESCAPES = {
+    "a": b"\a",
+    "b": b"\b",
+    "t": b"\t",
+    "n": b"\n",
+    "v": b"\v",
+    "f": b"\f",
+    "r": b"\r",
+    '"': b'"',
+    "\\": b"\\",
+}
+QUOTED_PATH_ESCAPE_PATTERN = compile(
+    r'\\(?:(?P<octal>[0-7]{3})|(?P<char>[abtnvfr"\\]))'
+)
+HUNK_HEADER_PATTERN = compile(
+    r"^@@ -[0-9]+(?:,[0-9]+)? \+(?P<start>[0-9]+)(?:,(?P<count>[0-9]+))? @@"
+)
+
+
+def merge_ranges(ranges: Iterable[tuple[int, int]]) -> list[tuple[int, int]]:
+    merged: list[tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def unquote_git_path(path: str) -> str:
+    """
+    Unquote a path of git output. Git quotes paths with control characters,
+    quotes or backslashes, and non-ASCII ones unless core.quotePath is off, in
+    double quotes with C escapes and the UTF-8 bytes of other characters as
+    octal escapes.
+    """
+    if not (len(path) >= 2 and path.startswith('"') and path.endswith('"')):
+        return path
+    unquoted = bytearray()
+    position = 1
+    for matched in QUOTED_PATH_ESCAPE_PATTERN.finditer(path, 1, len(path) - 1):
+        unquoted += path[position : matched.start()].encode()
+        octal = matched.group("octal")
+        unquoted += (
+            bytes([int(octal, 8)])
+            if octal
+            else QUOTED_PATH_ESCAPES[matched.group("char")]
+        )
+        position = matched.end()
+    unquoted += path[position:-1].encode()
+    return unquoted.decode("utf-8", errors="surrogateescape")
+
+
+def get_changed_ranges(diff: str) -> dict[str, list[tuple[int, int]]]:
+    """
+    Collect the line ranges added or modified in each file of a `git diff -U0`
+    output, keyed by the file's path after the change. Pure deletions change
+    no lines of the new file and are skipped.
+    """
+    ranges: dict[str, list[tuple[int, int]]] = {}
+    path: str | None = None
+    for line in diff.split("\n"):
+        if line.startswith(NEW_FILE_PREFIX):
+            # Git ends the line with a tab when the path has spaces.
+            new_path = unquote_git_path(
+                line.removeprefix(NEW_FILE_PREFIX).removesuffix("\t")
+            )
+            path = new_path.removeprefix("b/") if new_path != "/dev/null" else None
+            continue
+        matched = HUNK_HEADER_PATTERN.match(line)
+        if matched is None or path is None:
+            continue
+        start = int(matched.group("start"))
+        count = int(matched.group("count") or 1)
+        if count > 0:
+            ranges.setdefault(path, []).append((start, start + count - 1))
+    return ranges
+
+
+class DiffIndex:
+    """
+    The changed line ranges of each file, stored as sorted, non-overlapping
+    intervals so an annotation can be checked with one binary search.
+    """
+
+    def __init__(self, ranges_by_path: Mapping[str, Iterable[tuple[int, int]]]) -> None:
+        self.starts: dict[str, list[int]] = {}
+        self.ends: dict[str, list[int]] = {}
+        for path, ranges in ranges_by_path.items():
+            merged = merge_ranges(ranges)
+            self.starts[path] = [start for start, _ in merged]
+            self.ends[path] = [end for _, end in merged]
+
+    @classmethod
+    def from_diff(cls, diff: str) -> DiffIndex:
+        return cls(get_changed_ranges(diff))
+
+    def has_changes(self, path: str) -> bool:
+        return path in self.starts
+
+    def is_changed(self, path: str, start_line: int, end_line: int) -> bool:
+        starts = self.starts.get(path)
+        if starts is None:
+            return False
+        index = bisect_right(starts, end_line) - 1
+        return index >= 0 and self.ends[path][index] >= start_line
+
+    def contains(self, annotation: Annotation) -> bool:
+        return self.is_changed(
+            annotation["path"], annotation["start_line"], annotation["end_line"]
+        )
+
+    def filter_annotations(self, annotations: Iterable[Annotation]) -> list[Annotation]:
+        return [annotation for annotation in annotations if self.contains(annotation)]
+
+    def wrap(
+        self,
+        on_annotation: Callable[[Annotation], object],
+        is_file_level: Callable[[Annotation], bool] | None = None,
+    ) -> Callable[[Annotation], None]:
+        """
+        Return a callback that only passes annotations on changed lines on.
+        Annotations about a whole file, as told by `is_file_level`, are passed
+        on when any line of the file changed.
+        """
+
+        def on_changed_annotation(annotation: Annotation) -> None:
+            if self.contains(annotation) or (
+                is_file_level is not None
+                and is_file_level(annotation)
+                and self.has_changes(annotation["path"])
+            ):
+                on_annotation(annotation)
+
+        return on_changed_annotation
+
+
+def get_merge_base(git_repo: Repo, base: str) -> str:
+    return git_repo.git.merge_base(base, "HEAD").strip()
+
+
+def get_diff_index(git_repo: Repo, base: str) -> DiffIndex | None:
+    """
+    Build a DiffIndex of the working tree against the merge base of `base` and
+    HEAD. Returns None, so nothing gets filtered, when git cannot compute the
+    diff, e.g. when the base commit is missing from a shallow clone.
+    """
+    try:
+        with span("git diff"):
+            merge_base = get_merge_base(git_repo, base)
+            diff = git_repo.git.diff(
+                "-U0",
+                "--no-color",
+                "--no-ext-diff",
+                "--src-prefix=a/",
+                "--dst-prefix=b/",
+                merge_base,
+                "--",
+            )
+    except GitCommandError:
+        logger.warning(f"Cannot diff against {base}, keeping all annotations.")
+        return None
+    return DiffIndex.from_diff(diff)
@@ -1,52 +1,289 @@
 from __future__ import annotations
 
-from datetime import datetime
+from base64 import b64encode
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import UTC, datetime, timedelta
 from enum import StrEnum
+from functools import cache
+from hashlib import sha1
+from json import dump, loads
 from logging import INFO, basicConfig, getLogger
-from os import environ
+from os import O_CREAT, O_TRUNC, O_WRONLY, environ
+from os import open as os_open
 from pathlib import Path
+from stat import S_IXUSR
 from subprocess import check_output
 from sys import stdout
-from typing import TYPE_CHECKING, Literal, TypedDict, cast
+from threading import Lock
+from typing import TYPE_CHECKING, Any, Literal, TypedDict, cast
 from zoneinfo import ZoneInfo
 
 from git.repo import Repo
 from github import Github, GithubIntegration, InputGitTreeElement
+from github.Auth import Auth
 from github.CheckRun import CheckRun
+from github.Consts import DEFAULT_BASE_URL
+from github.NamedUser import NamedUser
+from github.PullRequest import PullRequest
+from github.Repository import Repository
+from github.Team import Team
+
+from bar_raiser.utils.instrumentation import (
+    add_timings_to_summary,
+    initialize_instrumentation,
+    instrument_github_requester,
+    span,
+)
+from bar_raiser.utils.profiling import initialize_profiling
 
 if TYPE_CHECKING:
-    from github.PullRequest import PullRequest
-    from github.Repository import Repository
+    from collections.abc import Iterable
+    from types import TracebackType
+
+    from github.GitTree import GitTree
 
 ANNOTATION_PAGE_SIZE = 50
+MAX_ANNOTATION_UPLOADS_IN_FLIGHT = 4
+MAX_BLOB_UPLOADS_IN_FLIGHT = 8
+GITHUB_TOKEN_EXPIRY_MARGIN = timedelta(minutes=5)
 
 logger = getLogger(__name__)
 
 
-def get_github() -> Github:
-    integration = GithubIntegration(environ["APP_ID"], environ["PRIVATE_KEY"])
+@dataclass(frozen=True)
+class InstallationToken:
+    token: str
+    expires_at: datetime
+
+    def is_fresh(self) -> bool:
+        return self.expires_at - GITHUB_TOKEN_EXPIRY_MARGIN > datetime.now(UTC)
+
+
+_installation_tokens: dict[str, InstallationToken] = {}
+
+
+def get_github_api_url() -> str:
+    # Set by GitHub Actions, and points to the API of GitHub Enterprise Server.
+    return environ.get("GITHUB_API_URL") or DEFAULT_BASE_URL
+
+
+def get_installation_token_cache_key() -> str:
+    return f"{environ['APP_ID']}-{environ['GITHUB_REPOSITORY'].replace('/', '-')}"
+
+
+def get_installation_token_cache_path() -> Path | None:
+    """
+    Installation tokens are shared by the steps of a workflow job through a file
+    in BAR_RAISER_TOKEN_CACHE_DIR, or RUNNER_TEMP which is private to the job.
+    """
+    cache_dir = environ.get("BAR_RAISER_TOKEN_CACHE_DIR") or environ.get("RUNNER_TEMP")
+    if not cache_dir:
+        return None
+    return (
+        Path(cache_dir)
+        / f"bar-raiser-github-token-{get_installation_token_cache_key()}.json"
+    )
+
+
+def load_cached_installation_token(path: Path) -> InstallationToken | None:
+    try:
+        raw = loads(path.read_text(encoding="utf-8"))
+        return InstallationToken(
+            token=raw["token"], expires_at=datetime.fromisoformat(raw["expires_at"])
+        )
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def save_cached_installation_token(path: Path, token: InstallationToken) -> None:
+    try:
+        fd = os_open(path, O_WRONLY | O_CREAT | O_TRUNC, 0o600)
+        with open(fd, "w", encoding="utf-8") as f:
+            dump({"token": token.token, "expires_at": token.expires_at.isoformat()}, f)
+    except OSError:
+        logger.warning(f"Failed to cache the GitHub installation token in {path}.")
+
+
+def create_installation_token() -> InstallationToken:
+    integration = GithubIntegration(
+        environ["APP_ID"], environ["PRIVATE_KEY"], base_url=get_github_api_url()
+    )
     owner = environ["GITHUB_REPOSITORY_OWNER"]
     short_repo = environ["GITHUB_REPOSITORY"][len(owner) + 1 :]
-    install = integration.get_installation(owner, short_repo)
-    token = integration.get_access_token(install.id).token
-    return Github(token)
+    with span("github installation token"):
+        install = integration.get_installation(owner, short_repo)
+        authorization = integration.get_access_token(install.id)
+    expires_at = authorization.expires_at
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=UTC)
+    return InstallationToken(token=authorization.token, expires_at=expires_at)
+
+
+def get_installation_token() -> InstallationToken:
+    """
+    Return an unexpired installation token, reusing the one held by this process
+    or cached on disk by a previous step before minting a new one.
+    """
+    key = get_installation_token_cache_key()
+    token = _installation_tokens.get(key)
+    if token is not None and token.is_fresh():
+        return token
+    cache_path = get_installation_token_cache_path()
+    token = load_cached_installation_token(cache_path) if cache_path else None
+    if token is None or not token.is_fresh():
+        token = create_installation_token()
+        if cache_path:
+            save_cached_installation_token(cache_path, token)
+    _installation_tokens[key] = token
+    return token
+
+
+class InstallationTokenAuth(Auth):
+    """
+    Authenticate with the installation token, which is only minted when the
+    first request is sent and is replaced when it is about to expire.
+    """
+
+    @property
+    def token_type(self) -> str:
+        return "token"
+
+    @property
+    def token(self) -> str:
+        return get_installation_token().token
+
+
+@cache
+def get_event_payload(event_path: str) -> dict[str, Any]:
+    return loads(Path(event_path).read_text(encoding="utf-8"))
+
+
+@dataclass(frozen=True)
+class PullRequestEvent:
+    number: int
+    head_sha: str
+    base_sha: str
+    draft: bool
+    author_login: str
+    labels: list[str]
+    requested_teams: list[str]
+    html_url: str
+    title: str
+    raw_pull_request: dict[str, Any]
+    raw_repository: dict[str, Any]
+    raw_organization: dict[str, Any] | None
+
+
+def get_pull_request_event() -> PullRequestEvent | None:
+    """
+    Read the pull request of the workflow event from GITHUB_EVENT_PATH. Returns
+    None when the event is not about the pull request in PULL_NUMBER.
+    """
+    event_path = environ.get("GITHUB_EVENT_PATH")
+    pull_number = environ.get("PULL_NUMBER")
+    if not event_path or not pull_number:
+        return None
+    try:
+        payload = get_event_payload(event_path)
+        pull = payload["pull_request"]
+        if pull["number"] != int(pull_number):
+            return None
+        return PullRequestEvent(
+            number=pull["number"],
+            head_sha=pull["head"]["sha"],
+            base_sha=pull["base"]["sha"],
+            draft=pull.get("draft", False),
+            author_login=pull["user"]["login"],
+            labels=[label["name"] for label in pull.get("labels", [])],
+            requested_teams=[team["slug"] for team in pull.get("requested_teams", [])],
+            html_url=pull["html_url"],
+            title=pull["title"],
+            raw_pull_request=pull,
+            raw_repository=payload["repository"],
+            raw_organization=payload.get("organization"),
+        )
+    except (OSError, ValueError, KeyError, TypeError):
+        logger.warning(f"Failed to read the pull request from {event_path}.")
+        return None
 
 
-def get_github_repo() -> Repository:
+@cache
+def get_github() -> Github:
+    github = Github(base_url=get_github_api_url(), auth=InstallationTokenAuth())
+    instrument_github_requester(github.requester)
+    return github
+
+
+@cache
+def get_github_repo_with_name(repo_name: str) -> Repository:
     github = get_github()
-    logger.info(github.get_rate_limit())
-    repo_name = environ["GITHUB_REPOSITORY"]
-    return github.get_repo(repo_name)
+    event = get_pull_request_event()
+    if event and event.raw_repository.get("full_name") == repo_name:
+        return github.create_from_raw_data(Repository, event.raw_repository)
+    repo = github.get_repo(repo_name)
+    # Read from the headers of the previous response, no extra API call.
+    logger.info(f"GitHub rate limit (remaining, limit): {github.rate_limiting}")
+    return repo
+
+
+@cache
+def get_pull_request_with_number(repo_name: str, number: int) -> PullRequest:
+    event = get_pull_request_event()
+    if event and event.number == number:
+        return get_github().create_from_raw_data(PullRequest, event.raw_pull_request)
+    return get_github_repo_with_name(repo_name).get_pull(number)
+
+
+def clear_github_cache() -> None:
+    _installation_tokens.clear()
+    get_event_payload.cache_clear()
+    get_github.cache_clear()
+    get_github_repo_with_name.cache_clear()
+    get_pull_request_with_number.cache_clear()
+
+
+def get_github_repo() -> Repository:
+    return get_github_repo_with_name(environ["GITHUB_REPOSITORY"])
 
 
 def get_pull_request() -> PullRequest | None:
     try:
-        return get_github_repo().get_pull(int(environ["PULL_NUMBER"]))
+        return get_pull_request_with_number(
+            environ["GITHUB_REPOSITORY"], int(environ["PULL_NUMBER"])
+        )
     except Exception:
         return None
 
 
+def get_review_requests(
+    pull: PullRequest,
+) -> tuple[Iterable[NamedUser], Iterable[Team]]:
+    """
+    Return the requested reviewers and teams of a pull request, from the event
+    payload when it describes this pull request and from the API otherwise.
+    """
+    event = get_pull_request_event()
+    if event is None or event.number != pull.number:
+        return pull.get_review_requests()
+    github = get_github()
+    organization = event.raw_organization or event.raw_repository["owner"]
+    return (
+        [
+            github.create_from_raw_data(NamedUser, user)
+            for user in event.raw_pull_request.get("requested_reviewers", [])
+        ],
+        [
+            github.create_from_raw_data(Team, {"organization": organization, **team})
+            for team in event.raw_pull_request.get("requested_teams", [])
+        ],
+    )
+
+
 def get_head_sha() -> str:
+    event = get_pull_request_event()
+    if event:
+        return event.head_sha
     if get_pull_request():  # pull requests have a virtual merge commit
         return get_git_repo().head.commit.parents[-1].hexsha
     return get_git_repo().head.commit.hexsha
@@ -77,6 +314,47 @@ class Action(TypedDict):
     identifier: str
 
 
+def get_check_run_output(
+    title: str, summary: str, annotations: list[Annotation]
+) -> dict[str, str | list[dict[str, str | int]]]:
+    return cast(
+        "dict[str, str | list[dict[str, str | int]]]",
+        {
+            "title": title,
+            "summary": summary,
+            "annotations": annotations,
+        },
+    )
+
+
+def paginate_annotations(annotations: list[Annotation]) -> list[list[Annotation]]:
+    return [
+        annotations[start : start + ANNOTATION_PAGE_SIZE]
+        for start in range(0, len(annotations), ANNOTATION_PAGE_SIZE)
+    ] or [[]]
+
+
+def upload_annotation_pages(
+    check: CheckRun,
+    title: str,
+    summary: str,
+    pages: list[list[Annotation]],
+    max_uploads_in_flight: int = MAX_ANNOTATION_UPLOADS_IN_FLIGHT,
+) -> None:
+    """
+    Append annotation pages to an existing check run. GitHub appends the
+    annotations of every update, so pages can be uploaded in any order.
+    """
+
+    def upload(page: list[Annotation]) -> None:
+        check.edit(output=get_check_run_output(title, summary, page))  # pyright: ignore[reportUnknownMemberType]
+
+    if not pages:
+        return
+    with ThreadPoolExecutor(max_workers=max_uploads_in_flight) as executor:
+        list(executor.map(upload, pages))
+
+
 def create_check_run(
     *,
     repo: Repository,
@@ -87,59 +365,237 @@ def create_check_run(
     summary: str,
     annotations: list[Annotation],
     actions: list[Action],
+    single_check_run: bool = False,
+    max_uploads_in_flight: int = MAX_ANNOTATION_UPLOADS_IN_FLIGHT,
 ) -> list[CheckRun]:
+    """
+    Create check runs with annotations uploaded in pages of ANNOTATION_PAGE_SIZE.
+
+    By default every page creates its own check run. With `single_check_run`,
+    one check run is created with the first page and the remaining pages are
+    uploaded as check run updates, at most `max_uploads_in_flight` at a time.
+    """
+    # Every update replaces the summary, so each one carries the timings.
+    summary = add_timings_to_summary(summary)
+    pages = paginate_annotations(annotations)
+    if single_check_run:
+        pages, remaining_pages = pages[:1], pages[1:]
+    else:
+        remaining_pages = []
     checks = list[CheckRun]()
-    while True:
-        batch, annotations = (
-            annotations[:ANNOTATION_PAGE_SIZE],
-            annotations[ANNOTATION_PAGE_SIZE:],
-        )
+    for batch in pages:
         check = repo.create_check_run(
             name=name,
             head_sha=head_sha,
             conclusion=conclusion,
-            output=cast(
-                "dict[str, str | list[dict[str, str | int]]]",
-                {
-                    "title": title,
-                    "summary": summary,
-                    "annotations": batch,
-                },
-            ),
+            output=get_check_run_output(title, summary, batch),
             actions=cast("list[dict[str, str]]", actions),
         )
         logger.info(check.html_url)
         checks.append(check)
-        if len(annotations) == 0:
-            break
+    upload_annotation_pages(
+        checks[0], title, summary, remaining_pages, max_uploads_in_flight
+    )
     return checks
 
 
+class CheckRunUploader:
+    """
+    Upload annotations to one check run while they are still being produced.
+
+    The check run is created in progress as soon as the first page of
+    annotations is full, and later pages are appended by a bounded pool of
+    updates. complete() uploads the last page along with the conclusion. When
+    fewer than a page of annotations is added, a single completed check run is
+    created instead. add() may be called from several threads. Used as a
+    context manager, the check run is completed as failed when an error is
+    raised before complete(), rather than left in progress.
+    """
+
+    def __init__(
+        self,
+        *,
+        repo: Repository,
+        name: str,
+        head_sha: str,
+        title: str,
+        max_uploads_in_flight: int = MAX_ANNOTATION_UPLOADS_IN_FLIGHT,
+    ) -> None:
+        self.repo = repo
+        self.name = name
+        self.head_sha = head_sha
+        self.title = title
+        self.annotation_count = 0
+        self.page: list[Annotation] = []
+        self.lock = Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_uploads_in_flight)
+        self.check: Future[CheckRun] | None = None
+        self.uploads: list[Future[None]] = []
+        self.is_complete = False
+
+    def __enter__(self) -> CheckRunUploader:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        if exc_value is None or self.is_complete:
+            return
+        try:
+            self.complete(
+                conclusion="failure",
+                summary=f"The check failed with an error: {exc_value!r}",
+                actions=[],
+            )
+        except Exception:
+            logger.exception("Failed to complete the check run.")
+
+    def add(self, annotation: Annotation) -> None:
+        with self.lock:
+            self.annotation_count += 1
+            self.page.append(annotation)
+            if len(self.page) == ANNOTATION_PAGE_SIZE:
+                self.upload_page(self.page)
+                self.page = []
+
+    def upload_page(self, page: list[Annotation]) -> None:
+        summary = f"Found {self.annotation_count} issues so far."
+        if self.check is None:
+            self.check = self.executor.submit(self.create_in_progress, summary, page)
+        else:
+            self.uploads.append(
+                self.executor.submit(self.append, self.check, summary, page)
+            )
+
+    def create_in_progress(self, summary: str, page: list[Annotation]) -> CheckRun:
+        check = self.repo.create_check_run(
+            name=self.name,
+            head_sha=self.head_sha,
+            status="in_progress",
+            output=get_check_run_output(self.title, summary, page),
+        )
+        logger.info(check.html_url)
+        return check
+
+    def append(
+        self, check: Future[CheckRun], summary: str, page: list[Annotation]
+    ) -> None:
+        check.result().edit(output=get_check_run_output(self.title, summary, page))  # pyright: ignore[reportUnknownMemberType]
+
+    def complete(
+        self,
+        *,
+        conclusion: Literal["action_required", "success", "failure"],
+        summary: str,
+        actions: list[Action],
+    ) -> list[CheckRun]:
+        with self.lock:
+            page, self.page = self.page, []
+            pending_check = self.check
+            self.is_complete = True
+        summary = add_timings_to_summary(summary)
+        try:
+            if pending_check is None:
+                check = self.repo.create_check_run(
+                    name=self.name,
+                    head_sha=self.head_sha,
+                    conclusion=conclusion,
+                    output=get_check_run_output(self.title, summary, page),
+                    actions=cast("list[dict[str, str]]", actions),
+                )
+                logger.info(check.html_url)
+            else:
+                check = pending_check.result()
+                for upload in self.uploads:
+                    upload.result()
+                check.edit(  # pyright: ignore[reportUnknownMemberType]
+                    conclusion=conclusion,
+                    output=get_check_run_output(self.title, summary, page),
+                    actions=cast("list[dict[str, str]]", actions),
+                )
+        finally:
+            self.executor.shutdown()
+        return [check]
+
+
+def get_git_blob_sha(content: bytes) -> str:
+    return sha1(b"blob %d\0" % len(content) + content).hexdigest()
+
+
+def get_git_file_mode(path: Path) -> str:
+    return "100755" if path.stat().st_mode & S_IXUSR else "100644"
+
+
+def get_tree_blobs(tree: GitTree) -> dict[str, tuple[str, str]]:
+    return {
+        element.path: (element.mode, element.sha)
+        for element in tree.tree
+        if element.type == "blob"
+    }
+
+
+def create_tree_element(
+    repo: Repository,
+    path: str,
+    base_blobs: dict[str, tuple[str, str]],
+    existing_blob_shas: set[str],
+    is_base_tree_complete: bool,
+) -> InputGitTreeElement | None:
+    """
+    Return the tree element for the local content of `path`, or None when the
+    base tree already has it. Blobs are only uploaded when the base tree does
+    not contain the same content anywhere.
+    """
+    file_path = Path(path)
+    if not file_path.exists():
+        if is_base_tree_complete and path not in base_blobs:
+            return None
+        return InputGitTreeElement(path, "100644", "blob", sha=None)
+    content = file_path.read_bytes()
+    mode = get_git_file_mode(file_path)
+    sha = get_git_blob_sha(content)
+    if base_blobs.get(path) == (mode, sha):
+        return None
+    if sha not in existing_blob_shas:
+        sha = repo.create_git_blob(b64encode(content).decode("ascii"), "base64").sha
+    return InputGitTreeElement(path, mode, "blob", sha=sha)
+
+
 def commit_changes(
-    repo: Repository, branch: str, sha: str, paths: list[str], commit_message: str
+    repo: Repository,
+    branch: str,
+    sha: str,
+    paths: list[str],
+    commit_message: str,
+    *,
+    max_uploads_in_flight: int = MAX_BLOB_UPLOADS_IN_FLIGHT,
 ) -> None:
-    batch_size = 200
-    num_batches = len(paths) // batch_size + 1
-    count = 0
-    while paths:
-        elements: list[InputGitTreeElement] = []
-        for path in paths[:batch_size]:
-            content = open(path, encoding="utf-8").read() if Path(path).exists() else ""
-            blob = repo.create_git_blob(content, "utf-8")
-            elements.append(InputGitTreeElement(path, "100644", "blob", sha=blob.sha))
-        existing_tree = repo.get_git_tree(sha)
-        existing_commit = repo.get_git_commit(sha)
-        new_tree = repo.create_git_tree(elements, existing_tree)
-        message = (
-            f"{commit_message} ({count + 1}/{num_batches})"
-            if num_batches > 1
-            else commit_message
+    existing_tree = repo.get_git_tree(sha, recursive=True)
+    base_blobs = get_tree_blobs(existing_tree)
+    existing_blob_shas = {blob_sha for _, blob_sha in base_blobs.values()}
+    is_base_tree_complete = not existing_tree.raw_data.get("truncated", False)
+
+    def create_element(path: str) -> InputGitTreeElement | None:
+        return create_tree_element(
+            repo, path, base_blobs, existing_blob_shas, is_base_tree_complete
         )
-        new_commit = repo.create_git_commit(message, new_tree, [existing_commit])
-        repo.get_git_ref(f"heads/{branch}").edit(new_commit.sha)
-        sha = new_commit.sha
-        paths = paths[batch_size:]
-        count += 1
+
+    with ThreadPoolExecutor(max_workers=max_uploads_in_flight) as executor:
+        elements = [
+            element
+            for element in executor.map(create_element, paths)
+            if element is not None
+        ]
+    logger.info(f"{len(elements)} of {len(paths)} paths differ from {sha}.")
+    if not elements:
+        return
+    existing_commit = repo.get_git_commit(sha)
+    new_tree = repo.create_git_tree(elements, existing_tree)
+    new_commit = repo.create_git_commit(commit_message, new_tree, [existing_commit])
+    repo.get_git_ref(f"heads/{branch}").edit(new_commit.sha)
 
 
 def get_updated_paths(pull: PullRequest) -> list[str]:
@@ -238,6 +694,8 @@ def initialize_logging() -> None:
         level=INFO,
         format="%(asctime)s %(levelname)s %(module)s - %(funcName)s: %(message)s",
     )
+    initialize_instrumentation()
+    initialize_profiling()
 
 
 class Autofixes(StrEnum):
@@ -0,0 +1,250 @@
+"""
+Lightweight instrumentation of where a run spends its time.
+
+Spans time the phases of a run, e.g. a tool subprocess or a git diff, and API
+calls time and count each call to GitHub, Slack or S3 per endpoint along with
+the bytes transferred. At exit, the recorded stats are written as a JSON trace
+to BAR_RAISER_TRACE_DIR, or RUNNER_TEMP, and as a compact table to
+GITHUB_STEP_SUMMARY. Setting BAR_RAISER_TIMINGS_IN_CHECK_SUMMARY also adds the
+table to the summary of the check runs created by the run.
+"""
+
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import sys
+from contextlib import AbstractContextManager, contextmanager
+from dataclasses import asdict, dataclass
+from datetime import UTC, datetime
+from functools import cache, wraps
+from logging import getLogger
+from os import environ
+from pathlib import Path
+from re import compile
+from threading import Lock, get_ident
+from time import perf_counter
+from typing import TYPE_CHECKING, Any, Literal
+from urllib.parse import urlsplit
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterator
+
+    from github.Requester import Requester
+
+logger = getLogger(__name__)
+
+SpanKind = Literal["phase", "api"]
+PHASE: SpanKind = "phase"
+API_CALL: SpanKind = "api"
+# Spans beyond this are only aggregated, so long runs keep a bounded trace.
+MAX_TRACE_EVENTS = 10_000
+MAX_TABLE_ROWS = 15
+TRACE_VERSION = 1
+ID_SEGMENT_PATTERN = compile(r"^(?:\d+|[0-9a-f]{40})$")
+GITHUB_REQUEST_METHODS = ("requestJson", "requestMultipart", "requestBlob")
+
+
+@dataclass
+class Transfer:
+    """The bytes a span sent and received, filled in by the instrumented code."""
+
+    bytes_sent: int = 0
+    bytes_received: int = 0
+
+
+@dataclass
+class SpanStats:
+    count: int = 0
+    seconds: float = 0.0
+    bytes_sent: int = 0
+    bytes_received: int = 0
+
+
+class Instrumentation:
+    def __init__(self) -> None:
+        self.lock = Lock()
+        self.started_at = datetime.now(UTC)
+        self.start = perf_counter()
+        self.stats: dict[tuple[SpanKind, str], SpanStats] = {}
+        self.events: list[dict[str, Any]] = []
+
+    def record(
+        self,
+        kind: SpanKind,
+        name: str,
+        start: float,
+        seconds: float,
+        transfer: Transfer,
+    ) -> None:
+        with self.lock:
+            stats = self.stats.get((kind, name))
+            if stats is None:
+                stats = self.stats[kind, name] = SpanStats()
+            stats.count += 1
+            stats.seconds += seconds
+            stats.bytes_sent += transfer.bytes_sent
+            stats.bytes_received += transfer.bytes_received
+            if len(self.events) < MAX_TRACE_EVENTS:
+                # A complete event of the Chrome trace event format.
+                self.events.append({
+                    "name": name,
+                    "cat": kind,
+                    "ph": "X",
+                    "ts": round((start - self.start) * 1e6),
+                    "dur": round(seconds * 1e6),
+                    "pid": os.getpid(),
+                    "tid": get_ident(),
+                })
+
+    @contextmanager
+    def span(self, name: str, kind: SpanKind = PHASE) -> Iterator[Transfer]:
+        transfer = Transfer()
+        start = perf_counter()
+        try:
+            yield transfer
+        finally:
+            self.record(kind, name, start, perf_counter() - start, transfer)
+
+    def get_trace(self) -> dict[str, Any]:
+        with self.lock:
+            return {
+                "version": TRACE_VERSION,
+                "program": Path(sys.argv[0]).stem,
+                "started_at": self.started_at.isoformat(),
+                "wall_seconds": perf_counter() - self.start,
+                "stats": [
+                    {"kind": kind, "name": name, **asdict(stats)}
+                    for (kind, name), stats in self.stats.items()
+                ],
+                "traceEvents": list(self.events),
+            }
+
+    def get_markdown_table(self) -> str:
+        with self.lock:
+            rows = sorted(
+                self.stats.items(), key=lambda item: item[1].seconds, reverse=True
+            )[:MAX_TABLE_ROWS]
+            wall_seconds = perf_counter() - self.start
+        if not rows:
+            return ""
+        table = f"#### Timings ({wall_seconds:,.1f}s wall)\n\n"
+        table += "| Kind | Name | Count | Seconds | Bytes sent | Bytes received |\n"
+        table += "|:-----|:-----|------:|--------:|-----------:|---------------:|\n"
+        for (kind, name), stats in rows:
+            table += (
+                f"| {kind} | `{name}` | {stats.count:,} | {stats.seconds:,.2f} "
+                f"| {stats.bytes_sent:,} | {stats.bytes_received:,} |\n"
+            )
+        return table
+
+
+@cache
+def get_instrumentation() -> Instrumentation:
+    return Instrumentation()
+
+
+def span(name: str) -> AbstractContextManager[Transfer]:
+    """Time a phase of the run, e.g. `with span("git diff"):`."""
+    return get_instrumentation().span(name)
+
+
+def api_call(service: str, endpoint: str) -> AbstractContextManager[Transfer]:
+    """Time and count a call to `endpoint` of `service`."""
+    return get_instrumentation().span(f"{service} {endpoint}", API_CALL)
+
+
+def get_file_size(path: str) -> int:
+    """The size of a transferred file, or 0 so counting bytes never fails a run."""
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def get_github_endpoint(verb: str, url: str) -> str:
+    """
+    Name the endpoint of a GitHub API request by its path with the owner and
+    name of the repository, numeric IDs and SHAs replaced by placeholders.
+    """
+    segments = urlsplit(url).path.split("/")
+    if len(segments) > 3 and segments[1] == "repos":
+        segments[2:4] = ["{owner}", "{repo}"]
+    return f"{verb} " + "/".join(
+        "{id}" if ID_SEGMENT_PATTERN.match(segment) else segment for segment in segments
+    )
+
+
+def instrument_github_requester(requester: Requester) -> None:
+    """
+    Count every request sent by `requester`, which every object created from
+    the same Github client shares, including the pages of paginated lists.
+    """
+
+    def instrument(
+        request: Callable[..., tuple[int, dict[str, Any], str]],
+    ) -> Callable[..., tuple[int, dict[str, Any], str]]:
+        @wraps(request)
+        def instrumented(
+            verb: str, url: str, *args: Any, **kwargs: Any
+        ) -> tuple[int, dict[str, Any], str]:
+            with api_call("github", get_github_endpoint(verb, url)) as transfer:
+                status, headers, output = request(verb, url, *args, **kwargs)
+                transfer.bytes_received = len(output)
+            return status, headers, output
+
+        return instrumented
+
+    for method_name in GITHUB_REQUEST_METHODS:
+        setattr(requester, method_name, instrument(getattr(requester, method_name)))
+
+
+def is_timings_in_check_summary_enabled() -> bool:
+    return bool(environ.get("BAR_RAISER_TIMINGS_IN_CHECK_SUMMARY"))
+
+
+def add_timings_to_summary(summary: str) -> str:
+    """Append the timings table to a check run summary when opted in."""
+    if not is_timings_in_check_summary_enabled():
+        return summary
+    table = get_instrumentation().get_markdown_table()
+    return f"{summary}\n\n{table}" if table else summary
+
+
+def get_report_dir() -> Path | None:
+    report_dir = environ.get("BAR_RAISER_TRACE_DIR") or environ.get("RUNNER_TEMP")
+    return Path(report_dir) if report_dir else None
+
+
+def get_trace_path() -> Path | None:
+    report_dir = get_report_dir()
+    if report_dir is None:
+        return None
+    return report_dir / f"bar-raiser-trace-{Path(sys.argv[0]).stem}-{os.getpid()}.json"
+
+
+def write_reports() -> None:
+    """Write the JSON trace and the timings table of the run."""
+    instrumentation = get_instrumentation()
+    trace_path = get_trace_path()
+    try:
+        if trace_path is not None:
+            trace_path.write_text(
+                json.dumps(instrumentation.get_trace()), encoding="utf-8"
+            )
+            logger.info(f"Wrote the trace of the run to {trace_path}.")
+        step_summary = environ.get("GITHUB_STEP_SUMMARY")
+        table = instrumentation.get_markdown_table()
+        if step_summary and table:
+            with open(step_summary, "a", encoding="utf-8") as f:
+                f.write(table + "\n")
+    except OSError:
+        logger.warning("Failed to write the instrumentation reports.")
+
+
+@cache
+def initialize_instrumentation() -> None:
+    """Start timing the run and write its reports at exit."""
+    get_instrumentation()
+    atexit.register(write_reports)
@@ -0,0 +1,212 @@
+"""
+Opt-in profiling of a run, without editing the installed package.
+
+Setting BAR_RAISER_PROFILE profiles the run with cProfile, and setting
+BAR_RAISER_PROFILE_MEMORY also traces its allocations with tracemalloc. The
+worker processes of the tech debt analysis pool are profiled too, and their
+profiles are merged into the one of the run. At exit, the artifacts are written
+to BAR_RAISER_PROFILE_DIR, or the trace directory of the instrumentation, or the
+temporary directory:
+
+- bar-raiser-profile-{program}-{pid}.pstats, the merged stats to load with
+  pstats or a viewer like snakeviz,
+- bar-raiser-profile-{program}-{pid}.txt, the functions taking the most time,
+- bar-raiser-profile-{program}-{pid}-memory.txt, the peak traced memory of each
+  process and the top allocation sites still live at exit.
+"""
+
+from __future__ import annotations
+
+import atexit
+import os
+import pickle
+import sys
+import tracemalloc
+from cProfile import Profile
+from functools import cache
+from io import StringIO
+from logging import getLogger
+from multiprocessing.util import Finalize
+from os import environ
+from pathlib import Path
+from pstats import SortKey, Stats
+from tempfile import gettempdir
+
+from bar_raiser.utils.instrumentation import get_report_dir
+
+logger = getLogger(__name__)
+
+MAX_PROFILE_ROWS = 50
+MAX_ALLOCATION_SITES = 25
+# The lowest priority of the finalizers run when a worker process exits.
+WORKER_PROFILE_EXIT_PRIORITY = 0
+
+
+def is_profiling_enabled() -> bool:
+    return bool(environ.get("BAR_RAISER_PROFILE"))
+
+
+def is_memory_profiling_enabled() -> bool:
+    return is_profiling_enabled() and bool(environ.get("BAR_RAISER_PROFILE_MEMORY"))
+
+
+def get_profile_dir() -> Path:
+    profile_dir = environ.get("BAR_RAISER_PROFILE_DIR")
+    if profile_dir:
+        return Path(profile_dir)
+    return get_report_dir() or Path(gettempdir())
+
+
+def get_worker_profile_prefix(parent_pid: int) -> str:
+    return f"bar-raiser-profile-worker-{parent_pid}-"
+
+
+class Profiler:
+    """Profile the calls of the current thread, and the allocations if enabled."""
+
+    def __init__(self, program: str, parent_pid: int | None = None) -> None:
+        self.program = program
+        # The process merging the profile of this worker.
+        self.parent_pid = parent_pid
+        self.profile = Profile()
+        self.trace_memory = is_memory_profiling_enabled()
+
+    def start(self) -> None:
+        if self.trace_memory:
+            if tracemalloc.is_tracing():
+                # Forked workers inherit the traces of their parent.
+                tracemalloc.clear_traces()
+            else:
+                tracemalloc.start()
+        self.profile.enable()
+
+    def stop(self) -> tuple[int, tracemalloc.Snapshot | None]:
+        """Stop profiling and return the peak traced memory and a snapshot."""
+        self.profile.disable()
+        if not self.trace_memory or not tracemalloc.is_tracing():
+            return 0, None
+        _current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        return peak, snapshot
+
+    def write_worker_profile(self) -> None:
+        peak, snapshot = self.stop()
+        parent_pid = os.getppid() if self.parent_pid is None else self.parent_pid
+        name = f"{get_worker_profile_prefix(parent_pid)}{os.getpid()}"
+        profile_dir = get_profile_dir()
+        try:
+            self.profile.dump_stats(profile_dir / f"{name}.pstats")
+            if snapshot is not None:
+                with open(profile_dir / f"{name}.tracemalloc", "wb") as f:
+                    pickle.dump((peak, snapshot), f)
+        except OSError:
+            logger.warning("Failed to write the profile of the worker.")
+
+    def write_profile(self) -> None:
+        """
+        Write the artifacts of the run, merged with the profiles the workers
+        wrote when they exited.
+        """
+        peak, snapshot = self.stop()
+        profile_dir = get_profile_dir()
+        prefix = get_worker_profile_prefix(os.getpid())
+        stats = Stats(self.profile)
+        peaks = {f"{self.program} ({os.getpid()})": peak}
+        snapshots = [] if snapshot is None else [snapshot]
+        try:
+            for path in sorted(profile_dir.glob(f"{prefix}*.pstats")):
+                stats.add(str(path))
+                path.unlink()
+            for path in sorted(profile_dir.glob(f"{prefix}*.tracemalloc")):
+                with open(path, "rb") as f:
+                    worker_peak, worker_snapshot = pickle.load(f)
+                peaks[f"worker ({path.stem.removeprefix(prefix)})"] = worker_peak
+                snapshots.append(worker_snapshot)
+                path.unlink()
+            name = f"bar-raiser-profile-{self.program}-{os.getpid()}"
+            stats.dump_stats(profile_dir / f"{name}.pstats")
+            (profile_dir / f"{name}.txt").write_text(
+                get_stats_report(profile_dir / f"{name}.pstats"), encoding="utf-8"
+            )
+            if self.trace_memory:
+                (profile_dir / f"{name}-memory.txt").write_text(
+                    get_memory_report(peaks, snapshots), encoding="utf-8"
+                )
+            logger.info(f"Wrote the profile of the run to {profile_dir / name}.*.")
+        except OSError:
+            logger.warning("Failed to write the profile of the run.")
+
+
+def get_stats_report(stats_path: Path) -> str:
+    report = StringIO()
+    stats = Stats(str(stats_path), stream=report)
+    for sort_key in (SortKey.CUMULATIVE, SortKey.TIME):
+        stats.sort_stats(sort_key).print_stats(MAX_PROFILE_ROWS)
+    return report.getvalue()
+
+
+def get_memory_report(
+    peaks: dict[str, int], snapshots: list[tracemalloc.Snapshot]
+) -> str:
+    report = "Peak traced memory:\n"
+    for process, peak in peaks.items():
+        report += f"{peak:>15,} B  {process}\n"
+    sizes: dict[tracemalloc.Traceback, tuple[int, int]] = {}
+    for snapshot in snapshots:
+        for statistic in snapshot.statistics("lineno"):
+            size, count = sizes.get(statistic.traceback, (0, 0))
+            sizes[statistic.traceback] = (
+                size + statistic.size,
+                count + statistic.count,
+            )
+    report += "\nTop allocation sites live at exit:\n"
+    top_sites = sorted(sizes.items(), key=lambda item: item[1][0], reverse=True)
+    for traceback, (size, count) in top_sites[:MAX_ALLOCATION_SITES]:
+        frame = traceback[0]
+        report += f"{size:>15,} B {count:>9,} blocks  {frame.filename}:{frame.lineno}\n"
+    return report
+
+
+class ProfilingState:
+    def __init__(self) -> None:
+        self.profiler: Profiler | None = None
+
+
+profiling = ProfilingState()
+
+
+@cache
+def initialize_profiling(program: str | None = None) -> None:
+    """
+    Profile the run until exit when BAR_RAISER_PROFILE is set. Call it at the
+    start of an entry point; `program` names the artifacts, by default after
+    the script that was run.
+    """
+    if not is_profiling_enabled():
+        return
+    profiling.profiler = Profiler(program or Path(sys.argv[0]).stem)
+    profiling.profiler.start()
+    atexit.register(profiling.profiler.write_profile)
+
+
+def initialize_worker_profiling(parent_pid: int | None = None) -> None:
+    """
+    Profile a worker process of a pool until it exits when BAR_RAISER_PROFILE
+    is set, for the profile of the run to merge. Call it from the initializer
+    of the pool, with the pid of the process that created the pool unless the
+    workers are forked from it.
+    """
+    if not is_profiling_enabled():
+        return
+    if profiling.profiler is not None:
+        # A forked worker inherits the profiler of its parent.
+        profiling.profiler.profile.disable()
+    profiling.profiler = Profiler("worker", parent_pid)
+    profiling.profiler.start()
+    # Pool workers exit without running atexit handlers, but with finalizers.
+    Finalize(
+        None,
+        profiling.profiler.write_worker_profile,
+        exitpriority=WORKER_PROFILE_EXIT_PRIORITY,
+    )
@@ -8,6 +8,7 @@ from typing import TYPE_CHECKING
 from slack.web.client import WebClient
 
 from bar_raiser.utils.github import get_pull_request
+from bar_raiser.utils.instrumentation import api_call
 
 if TYPE_CHECKING:
     from pathlib import Path
@@ -18,13 +19,22 @@ if TYPE_CHECKING:
 logger = getLogger(__name__)
 
 
+def get_slack_client() -> WebClient:
+    return WebClient(
+        token=environ["SLACK_BOT_TOKEN"],
+        base_url=environ.get("SLACK_API_URL") or WebClient.BASE_URL,
+    )
+
+
 def post_a_slack_message(
     channel: str, text: str, icon_url: str | None = None, username: str | None = None
 ):
-    client = WebClient(token=environ["SLACK_BOT_TOKEN"])
-    client.chat_postMessage(  # pyright: ignore[reportUnknownMemberType]
-        channel=channel, text=text, icon_url=icon_url, username=username
-    )
+    client = get_slack_client()
+    with api_call("slack", "chat.postMessage") as transfer:
+        transfer.bytes_sent = len(text.encode())
+        client.chat_postMessage(  # pyright: ignore[reportUnknownMemberType]
+            channel=channel, text=text, icon_url=icon_url, username=username
+        )
 
 
 def get_id_from_mapping_path(key: str, mapping_path: Path) -> str | None:
@@ -61,7 +71,7 @@ def dm_on_check_failure(
 def get_slack_user_icon_url_and_username(
     user_id: str,
 ) -> tuple[str, str] | tuple[None, None]:
-    client = WebClient(token=environ["SLACK_BOT_TOKEN"])
+    client = get_slack_client()
     response: SlackResponse = client.users_info(user=user_id)  # pyright: ignore[reportUnknownMemberType,reportAssignmentType,reportUnknownVariableType]
     try:
         if response["ok"]:
@@ -108,6 +108,7 @@ def test_amc_with_merge_commits(  # noqa: PLR0917
         ),
         annotations=[],
         actions=[],
+        single_check_run=True,
     )
 
     mock_dm_on_check_failure.assert_called_once_with(
@@ -167,6 +168,7 @@ def test_amc_without_merge_commits(  # noqa: PLR0917
         summary=f"Your pull request #{pr_num} does not contain any merge commits.",
         annotations=[],
         actions=[],
+        single_check_run=True,
     )
 
     mock_dm_on_check_failure.assert_not_called()
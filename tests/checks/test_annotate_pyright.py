@@ -1,8 +1,9 @@
 from __future__ import annotations
 
 import sys
+from json import dumps, loads
 from pathlib import Path
-from subprocess import CalledProcessError
+from typing import TYPE_CHECKING, Any
 from unittest.mock import MagicMock, patch
 
 from git import Commit
@@ -11,6 +12,10 @@ from bar_raiser.checks.annotate_pyright import (
     get_annotations_and_actions_for_pyright_check,
     main,
 )
+from bar_raiser.utils.diff import DiffIndex
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
 
 REPO_DIR = "/home/user/bar_raiser"
 WORKING_DIR = "/home/user/bar_raiser/subfolder"
@@ -202,12 +207,23 @@ def test_get_annotations_and_actions_for_pyright() -> None:
         )
 
 
+def mock_run_command_streaming(return_code: int, output: str) -> Callable[..., int]:
+    def run_command_streaming(
+        cmds: list[str], on_line: Callable[[str], object], **kwargs: Any
+    ) -> int:
+        assert cmds == ["pyright", "--outputjson"]
+        for line in output.split("\n"):
+            on_line(line)
+        return return_code
+
+    return run_command_streaming
+
+
 def test_main() -> None:
     target_module = "bar_raiser.checks.annotate_pyright"
 
     with (
-        patch(f"{target_module}.create_check_run") as mock_create_check_run,
-        patch(f"{target_module}.get_github_repo"),
+        patch(f"{target_module}.get_github_repo") as mock_github_repo,
         patch(f"{target_module}.get_git_repo") as mock_git_repo,
         patch(f"{target_module}.exit") as mock_exit,
         patch(
@@ -217,15 +233,14 @@ def test_main() -> None:
         patch.object(sys, "argv", ["annotate_pyright.py"]),
         patch(f"{target_module}.get_head_sha", return_value="1"),
     ):
+        mock_create_check_run = mock_github_repo.return_value.create_check_run
         mock_git_repo.return_value.working_dir = Path(REPO_DIR)
         mock_git_repo.return_value.head.commit.parents = [
             MagicMock(spec=Commit, hexsha="1"),
         ]
         with patch(
-            f"{target_module}.check_output",
-            side_effect=CalledProcessError(
-                1, [], output=PYRIGHT_OUTPUT_WITH_ERROR.encode("utf-8")
-            ),
+            f"{target_module}.run_command_streaming",
+            mock_run_command_streaming(1, PYRIGHT_OUTPUT_WITH_ERROR),
         ):
             main()
             assert len(mock_create_check_run.call_args_list) == 1
@@ -233,18 +248,16 @@ def test_main() -> None:
             assert kwargs["name"] == "python-pyright-report"
             assert kwargs["head_sha"] == "1"
             assert kwargs["conclusion"] == "action_required"
-            assert kwargs["title"] == "Python Pyright Type Checker"
-            assert len(kwargs["annotations"]) == 1
+            assert kwargs["output"]["title"] == "Python Pyright Type Checker"
+            assert len(kwargs["output"]["annotations"]) == 1
             assert len(kwargs["actions"]) == 0
             mock_exit.assert_called_once_with(1)
             mock_create_check_run.reset_mock()
             mock_exit.reset_mock()
 
         with patch(
-            f"{target_module}.check_output",
-            side_effect=CalledProcessError(
-                0, [], output=PYRIGHT_OUTPUT_WITH_NO_ERROR.encode("utf-8")
-            ),
+            f"{target_module}.run_command_streaming",
+            mock_run_command_streaming(0, PYRIGHT_OUTPUT_WITH_NO_ERROR),
         ):
             main()
             assert len(mock_create_check_run.call_args_list) == 1
@@ -252,7 +265,100 @@ def test_main() -> None:
             assert kwargs["name"] == "python-pyright-report"
             assert kwargs["head_sha"] == "1"
             assert kwargs["conclusion"] == "success"
-            assert kwargs["title"] == "Python Pyright Type Checker"
-            assert len(kwargs["annotations"]) == 0
+            assert kwargs["output"]["title"] == "Python Pyright Type Checker"
+            assert len(kwargs["output"]["annotations"]) == 0
             assert len(kwargs["actions"]) == 0
             mock_exit.assert_called_once_with(0)
+
+
+def test_main_skips_warnings() -> None:
+    target_module = "bar_raiser.checks.annotate_pyright"
+    output = loads(PYRIGHT_OUTPUT_WITH_ERROR)
+    output["generalDiagnostics"][0]["severity"] = "warning"
+
+    with (
+        patch(f"{target_module}.get_github_repo") as mock_github_repo,
+        patch(f"{target_module}.get_git_repo") as mock_git_repo,
+        patch(f"{target_module}.exit") as mock_exit,
+        patch.object(sys, "argv", ["annotate_pyright.py"]),
+        patch(f"{target_module}.get_head_sha", return_value="1"),
+        patch(
+            f"{target_module}.run_command_streaming",
+            mock_run_command_streaming(0, dumps(output, indent=2)),
+        ),
+    ):
+        mock_git_repo.return_value.working_dir = Path(REPO_DIR)
+        main()
+        kwargs = mock_github_repo.return_value.create_check_run.call_args.kwargs
+        assert kwargs["conclusion"] == "success"
+        assert len(kwargs["output"]["annotations"]) == 0
+        mock_exit.assert_called_once_with(0)
+
+
+def test_get_annotations_and_actions_for_pyright_skips_warnings() -> None:
+    output = loads(PYRIGHT_OUTPUT_WITH_UNNECESSARY_IGNORE)
+    output["generalDiagnostics"][0]["severity"] = "warning"
+    assert get_annotations_and_actions_for_pyright_check(
+        Path(REPO_DIR), dumps(output)
+    ) == ([], [])
+
+
+def test_main_streams_annotation_pages() -> None:
+    target_module = "bar_raiser.checks.annotate_pyright"
+    diagnostics = loads(PYRIGHT_OUTPUT_WITH_UNNECESSARY_IGNORE)
+    diagnostics["generalDiagnostics"] *= 120
+
+    with (
+        patch(f"{target_module}.get_github_repo") as mock_github_repo,
+        patch(f"{target_module}.get_git_repo") as mock_git_repo,
+        patch(f"{target_module}.exit") as mock_exit,
+        patch.object(sys, "argv", ["annotate_pyright.py"]),
+        patch(f"{target_module}.get_head_sha", return_value="1"),
+        patch(
+            f"{target_module}.run_command_streaming",
+            mock_run_command_streaming(1, dumps(diagnostics, indent=2)),
+        ),
+    ):
+        mock_git_repo.return_value.working_dir = Path(REPO_DIR)
+        main()
+        mock_create_check_run = mock_github_repo.return_value.create_check_run
+        mock_create_check_run.assert_called_once()
+        assert mock_create_check_run.call_args.kwargs["status"] == "in_progress"
+        mock_edit = mock_create_check_run.return_value.edit
+        assert mock_edit.call_count == 2
+        assert mock_edit.call_args.kwargs["conclusion"] == "action_required"
+        assert len(mock_edit.call_args.kwargs["actions"]) == 1
+        assert (
+            sum(
+                len(call.kwargs["output"]["annotations"])
+                for call in [
+                    mock_create_check_run.call_args,
+                    *mock_edit.call_args_list,
+                ]
+            )
+            == 120
+        )
+        mock_exit.assert_called_once_with(1)
+
+
+def test_main_fails_on_errors_outside_changed_lines() -> None:
+    target_module = "bar_raiser.checks.annotate_pyright"
+
+    with (
+        patch(f"{target_module}.get_github_repo") as mock_github_repo,
+        patch(f"{target_module}.get_git_repo") as mock_git_repo,
+        patch(f"{target_module}.exit") as mock_exit,
+        patch.object(sys, "argv", ["annotate_pyright.py", "--changed-lines-only"]),
+        patch(f"{target_module}.get_head_sha", return_value="1"),
+        patch(f"{target_module}.get_diff_index_for_args", return_value=DiffIndex({})),
+        patch(
+            f"{target_module}.run_command_streaming",
+            mock_run_command_streaming(1, PYRIGHT_OUTPUT_WITH_ERROR),
+        ),
+    ):
+        mock_git_repo.return_value.working_dir = Path(REPO_DIR)
+        main()
+        kwargs = mock_github_repo.return_value.create_check_run.call_args.kwargs
+        assert kwargs["conclusion"] == "action_required"
+        assert len(kwargs["output"]["annotations"]) == 0
+        mock_exit.assert_called_once_with(1)
@@ -6,6 +6,7 @@ from pathlib import Path
 from unittest.mock import patch
 
 from bar_raiser.checks.annotate_pytest import PytestReportJson, get_annotations, main
+from bar_raiser.utils.diff import DiffIndex
 
 REPO_DIR = "/home/user/bar_raiser"
 WORKING_DIR = "/home/user/bar_raiser/subfolder"
@@ -78,3 +79,30 @@ def test_main() -> None:
         assert kwargs["title"] == "Python Pytest Report"
         assert len(kwargs["annotations"]) == 1
         mock_dm_on_check_failure.assert_not_called()
+
+
+def test_main_changed_lines_only() -> None:
+    with (
+        patch(
+            "bar_raiser.checks.annotate_pytest.create_check_run"
+        ) as mock_create_check_run,
+        patch("bar_raiser.checks.annotate_pytest.get_git_repo") as mock_get_git_repo,
+        patch("bar_raiser.checks.annotate_pytest.get_github_repo"),
+        patch("bar_raiser.checks.annotate_pytest.get_head_sha", return_value="1"),
+        patch(
+            "bar_raiser.checks.annotate_pytest.get_diff_index_for_args",
+            return_value=DiffIndex({}),
+        ),
+        patch.object(
+            sys,
+            "argv",
+            ["annotate_pytest.py", "--changed-lines-only", "path/to/report.json"],
+        ),
+        patch("pathlib.Path.read_text", return_value=dumps(pytest_report_json)),
+    ):
+        mock_get_git_repo.return_value.working_dir = Path(WORKING_DIR)
+        main()
+        kwargs = mock_create_check_run.call_args.kwargs
+        # The failure is outside of the diff, but still fails the check.
+        assert kwargs["conclusion"] == "action_required"
+        assert len(kwargs["annotations"]) == 0
@@ -2,17 +2,23 @@ from __future__ import annotations
 
 import sys
 from pathlib import Path
-from subprocess import CalledProcessError
-from unittest.mock import MagicMock, patch
+from typing import TYPE_CHECKING, Any
+from unittest.mock import patch
 
 from bar_raiser.checks.annotate_ruff import (
-    RUFF_CHECK_PATTERNS,
     RUFF_FORMAT_PATTERNS,
+    RuffDiagnosticParser,
     main,
 )
 from bar_raiser.utils.check import get_annotations_and_actions
+from bar_raiser.utils.diff import DiffIndex
 from bar_raiser.utils.github import Autofixes
 
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from bar_raiser.utils.github import Annotation
+
 RUFF_FORMAT_OUTPUT = """\
 error: Failed to format apply_autofixes.py: source contains syntax errors: ParseError { error: UnrecognizedToken(Colon, None), offset: 554, source_path: "<filename>" }
 error: Failed to format test_annotate_ruff.py: source contains syntax errors: ParseError { error: UnrecognizedToken(Semi, None), offset: 957, source_path: "<filename>" }
@@ -21,11 +27,9 @@ Would reformat: annotate_ruff.py
 """
 
 RUFF_CHECK_OUTPUT = """\
-error: Failed to parse annotate_ruff.py:68:14: Unexpected token 'if'
-charts.py:1:1: I002 [*] Missing required import: `from __future__ import annotations`
-test_annotate_ruff.py:5:22: F401 [*] `unittest.mock` imported but unused
-Found 2 errors.
-[*] 2 fixable with the `--fix` option.
+{"cell":null,"code":"invalid-syntax","end_location":{"column":16,"row":69},"filename":"/home/user/bar_raiser/subfolder/annotate_ruff.py","fix":null,"location":{"column":14,"row":68},"message":"Unexpected token 'if'","noqa_row":null,"url":null}
+{"cell":null,"code":"I002","end_location":{"column":1,"row":1},"filename":"/home/user/bar_raiser/subfolder/charts.py","fix":{"applicability":"safe","edits":[],"message":"Insert required import"},"location":{"column":1,"row":1},"message":"Missing required import: `from __future__ import annotations`","noqa_row":1,"url":"https://docs.astral.sh/ruff/rules/missing-required-import"}
+{"cell":null,"code":"F401","end_location":{"column":35,"row":5},"filename":"/home/user/bar_raiser/subfolder/test_annotate_ruff.py","fix":{"applicability":"unsafe","edits":[],"message":"Remove unused import"},"location":{"column":22,"row":5},"message":"`unittest.mock` imported but unused","noqa_row":5,"url":"https://docs.astral.sh/ruff/rules/unused-import"}
 """
 
 REPO_DIR = "/home/user/bar_raiser"
@@ -71,67 +75,80 @@ def test_get_annotations_and_actions_for_ruff_format() -> None:
         )
 
 
-def test_get_annotations_and_actions_for_ruff_check() -> None:
-    with patch(
-        "bar_raiser.checks.annotate_ruff.Path.cwd",
-        return_value=Path(WORKING_DIR),
-    ):
-        assert get_annotations_and_actions(
-            Path(REPO_DIR), RUFF_CHECK_OUTPUT, RUFF_CHECK_PATTERNS, Autofixes.RUFF
-        ) == (
-            [
-                {
-                    "path": "subfolder/annotate_ruff.py",
-                    "start_line": 68,
-                    "end_line": 68,
-                    "annotation_level": "failure",
-                    "message": "Unexpected token 'if'",
-                },
-                {
-                    "path": "subfolder/charts.py",
-                    "start_line": 1,
-                    "end_line": 1,
-                    "annotation_level": "failure",
-                    "message": "I002 [*] Missing required import: `from __future__ import annotations`",
-                },
-                {
-                    "path": "subfolder/test_annotate_ruff.py",
-                    "start_line": 5,
-                    "end_line": 5,
-                    "annotation_level": "failure",
-                    "message": "F401 [*] `unittest.mock` imported but unused",
-                },
-            ],
-            {
-                "label": "autofix",
-                "description": "Click to auto-push an autofix commit",
-                "identifier": "autofix-ruff",
-            },
-        )
+def test_ruff_diagnostic_parser() -> None:
+    annotations: list[Annotation] = []
+    parser = RuffDiagnosticParser(Path(REPO_DIR), annotations.append)
+    for line in RUFF_CHECK_OUTPUT.split("\n"):
+        parser.feed(line)
+    assert parser.is_autofix_available
+    assert annotations == [
+        {
+            "path": "subfolder/annotate_ruff.py",
+            "start_line": 68,
+            "end_line": 69,
+            "annotation_level": "failure",
+            "message": "invalid-syntax Unexpected token 'if'",
+        },
+        {
+            "path": "subfolder/charts.py",
+            "start_line": 1,
+            "end_line": 1,
+            "annotation_level": "failure",
+            "message": "I002 [*] Missing required import: `from __future__ import annotations`",
+        },
+        {
+            "path": "subfolder/test_annotate_ruff.py",
+            "start_line": 5,
+            "end_line": 5,
+            "annotation_level": "failure",
+            "message": "F401 `unittest.mock` imported but unused",
+        },
+    ]
+
+
+def test_ruff_diagnostic_parser_without_safe_fixes() -> None:
+    parser = RuffDiagnosticParser(Path(REPO_DIR), lambda _: None)
+    parser.feed(RUFF_CHECK_OUTPUT.split("\n")[2])
+    assert not parser.is_autofix_available
+
+
+def test_ruff_diagnostic_parser_skips_lines_that_are_not_json() -> None:
+    annotations: list[Annotation] = []
+    parser = RuffDiagnosticParser(Path(REPO_DIR), annotations.append)
+    lines = RUFF_CHECK_OUTPUT.split("\n")
+    parser.feed("warning: The top-level linter settings are deprecated.")
+    parser.feed(lines[2])
+    assert len(annotations) == 1
+    assert annotations[0]["path"] == "subfolder/test_annotate_ruff.py"
+
+
+def mock_run_command_streaming(
+    outputs: dict[str, tuple[int, str]],
+) -> Callable[..., int]:
+    def run_command_streaming(
+        cmds: list[str], on_line: Callable[[str], object], **kwargs: Any
+    ) -> int:
+        return_code, output = outputs[cmds[1]]
+        for line in output.split("\n"):
+            on_line(line)
+        return return_code
+
+    return run_command_streaming
 
 
 def test_main() -> None:
     returncode = -1
     target_module = "bar_raiser.checks.annotate_ruff"
 
-    def mock_check_output(cmds: list[str], stderr: int):
-        match cmds[1]:
-            case "format":
-                raise CalledProcessError(
-                    returncode, [], output=RUFF_FORMAT_OUTPUT.encode("utf-8")
-                )
-            case "check":
-                raise CalledProcessError(
-                    returncode, [], output=RUFF_CHECK_OUTPUT.encode("utf-8")
-                )
-
     with (
-        patch(f"{target_module}.create_check_run") as mock_create_check_run,
         patch(
-            f"{target_module}.check_output",
-            mock_check_output,
+            "bar_raiser.utils.check.run_command_streaming",
+            mock_run_command_streaming({
+                "format": (returncode, RUFF_FORMAT_OUTPUT),
+                "check": (returncode, RUFF_CHECK_OUTPUT),
+            }),
         ),
-        patch(f"{target_module}.get_github_repo"),
+        patch(f"{target_module}.get_github_repo") as mock_github_repo,
         patch(f"{target_module}.get_git_repo") as mock_git_repo,
         patch(f"{target_module}.get_head_sha", return_value="1"),
         patch(f"{target_module}.exit") as mock_exit,
@@ -142,14 +159,16 @@ def test_main() -> None:
         patch.object(sys, "argv", ["annotate_ruff.py"]),
     ):
         mock_git_repo.return_value.working_dir = Path(WORKING_DIR)
+        mock_create_check_run = mock_github_repo.return_value.create_check_run
+        mock_create_check_run.return_value.html_url = "https://github.com/check/1"
         main()
         assert len(mock_create_check_run.call_args_list) == 1
         kwargs = mock_create_check_run.call_args_list[0].kwargs
         assert kwargs["name"] == "python-ruff-report"
         assert kwargs["head_sha"] == "1"
         assert kwargs["conclusion"] == "action_required"
-        assert kwargs["title"] == "Python Ruff formatter and linter"
-        assert len(kwargs["annotations"]) == 6
+        assert kwargs["output"]["title"] == "Python Ruff formatter and linter"
+        assert len(kwargs["output"]["annotations"]) == 6
         assert len(kwargs["actions"]) == 1
         mock_exit.assert_called_once_with(returncode)
 
@@ -158,22 +177,15 @@ def test_main_only_fail_on_format() -> None:
     returncode = -1
     target_module = "bar_raiser.checks.annotate_ruff"
 
-    def mock_check_output(cmds: list[str], stderr: int) -> MagicMock | None:
-        match cmds[1]:
-            case "format":
-                return MagicMock()
-            case "check":
-                raise CalledProcessError(
-                    returncode, [], output=RUFF_CHECK_OUTPUT.encode("utf-8")
-                )
-
     with (
-        patch(f"{target_module}.create_check_run") as mock_create_check_run,
         patch(
-            f"{target_module}.check_output",
-            mock_check_output,
+            "bar_raiser.utils.check.run_command_streaming",
+            mock_run_command_streaming({
+                "format": (0, ""),
+                "check": (returncode, RUFF_CHECK_OUTPUT),
+            }),
         ),
-        patch(f"{target_module}.get_github_repo"),
+        patch(f"{target_module}.get_github_repo") as mock_github_repo,
         patch(f"{target_module}.get_git_repo") as mock_git_repo,
         patch(f"{target_module}.get_head_sha", return_value="1"),
         patch(f"{target_module}.exit") as mock_exit,
@@ -184,13 +196,43 @@ def test_main_only_fail_on_format() -> None:
         patch.object(sys, "argv", ["annotate_ruff.py"]),
     ):
         mock_git_repo.return_value.working_dir = Path(REPO_DIR)
+        mock_create_check_run = mock_github_repo.return_value.create_check_run
+        mock_create_check_run.return_value.html_url = "https://github.com/check/1"
         main()
         assert len(mock_create_check_run.call_args_list) == 1
         kwargs = mock_create_check_run.call_args_list[0].kwargs
         assert kwargs["name"] == "python-ruff-report"
         assert kwargs["head_sha"] == "1"
         assert kwargs["conclusion"] == "action_required"
-        assert kwargs["title"] == "Python Ruff formatter and linter"
-        assert len(kwargs["annotations"]) == 3
+        assert kwargs["output"]["title"] == "Python Ruff formatter and linter"
+        assert len(kwargs["output"]["annotations"]) == 3
         assert len(kwargs["actions"]) == 1
         mock_exit.assert_called_once_with(returncode)
+
+
+def test_main_fails_on_errors_outside_changed_lines() -> None:
+    target_module = "bar_raiser.checks.annotate_ruff"
+
+    with (
+        patch(
+            "bar_raiser.utils.check.run_command_streaming",
+            mock_run_command_streaming({
+                "format": (0, ""),
+                "check": (1, RUFF_CHECK_OUTPUT),
+            }),
+        ),
+        patch(f"{target_module}.get_github_repo") as mock_github_repo,
+        patch(f"{target_module}.get_git_repo") as mock_git_repo,
+        patch(f"{target_module}.get_head_sha", return_value="1"),
+        patch(f"{target_module}.exit") as mock_exit,
+        patch(f"{target_module}.get_diff_index_for_args", return_value=DiffIndex({})),
+        patch.object(sys, "argv", ["annotate_ruff.py", "--changed-lines-only"]),
+    ):
+        mock_git_repo.return_value.working_dir = Path(REPO_DIR)
+        mock_create_check_run = mock_github_repo.return_value.create_check_run
+        mock_create_check_run.return_value.html_url = "https://github.com/check/1"
+        main()
+        kwargs = mock_github_repo.return_value.create_check_run.call_args.kwargs
+        assert kwargs["conclusion"] == "action_required"
+        assert len(kwargs["output"]["annotations"]) == 0
+        mock_exit.assert_called_once_with(1)
@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+from datetime import UTC, datetime
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Any, cast
+from unittest.mock import MagicMock
+
+from bar_raiser.tech_debt_framework.author_index import (
+    AuthorIndex,
+    get_author_index,
+    get_login_from_noreply_email,
+)
+from bar_raiser.tech_debt_framework.run_analyzers import (
+    UNKNOWN_AUTHOR,
+    get_commit_author,
+)
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    import pytest
+    from github.Repository import Repository
+
+
+def create_commit(login: str | None, email: str, day: int) -> SimpleNamespace:
+    date = datetime(2025, 4, day, tzinfo=UTC)
+    return SimpleNamespace(
+        author=None if login is None else SimpleNamespace(login=login),
+        commit=SimpleNamespace(
+            author=SimpleNamespace(email=email, date=date),
+            committer=SimpleNamespace(email=email, date=date),
+        ),
+    )
+
+
+class FakeGithubRepo:
+    def __init__(
+        self, commits: list[SimpleNamespace], full_name: str = "ZipHQ/bar-raiser"
+    ) -> None:
+        self.commits = commits
+        self.full_name = full_name
+        self.since: list[datetime | None] = []
+        self.until: list[datetime | None] = []
+
+    def get_commits(
+        self, since: datetime | None = None, until: datetime | None = None
+    ) -> list[SimpleNamespace]:
+        self.since.append(since)
+        self.until.append(until)
+        return [
+            commit
+            for commit in self.commits
+            if (since is None or commit.commit.committer.date >= since)
+            and (until is None or commit.commit.committer.date <= until)
+        ]
+
+
+def test_get_login_from_noreply_email() -> None:
+    assert get_login_from_noreply_email("123+Octocat@users.noreply.github.com") == (
+        "Octocat"
+    )
+    assert get_login_from_noreply_email("Octocat@Users.NoReply.GitHub.com") == (
+        "Octocat"
+    )
+    assert get_login_from_noreply_email("octocat@users.noreply.github.com") == (
+        "octocat"
+    )
+    assert get_login_from_noreply_email("octocat@example.com") is None
+
+
+def test_author_index_sweep(tmp_path: Path) -> None:
+    github_repo = FakeGithubRepo([
+        create_commit("alice", "Alice@example.com", 3),
+        create_commit("alice-old", "alice@example.com", 2),
+        create_commit(None, "bot@example.com", 2),
+        create_commit("bob", "bob@example.com", 1),
+    ])
+    index = AuthorIndex(tmp_path / "authors.sqlite3")
+    assert index.sweep(cast("Repository", github_repo)) == 4
+    assert index.get("alice@example.com") == "alice"
+    assert index.get("BOB@example.com") == "bob"
+    assert index.get("bot@example.com") is None
+    assert index.get_swept_until("ZipHQ/bar-raiser") == datetime(2025, 4, 3, tzinfo=UTC)
+
+    github_repo.commits.insert(0, create_commit("carol", "carol@example.com", 4))
+    reopened = AuthorIndex(tmp_path / "authors.sqlite3")
+    assert reopened.sweep(cast("Repository", github_repo)) == 2
+    assert github_repo.since == [None, datetime(2025, 4, 3, tzinfo=UTC)]
+    assert reopened.get("carol@example.com") == "carol"
+    assert reopened.get("alice@example.com") == "alice"
+
+
+def test_author_index_sweep_older_commits(tmp_path: Path) -> None:
+    github_repo = FakeGithubRepo([
+        create_commit("carol", "carol@example.com", 4),
+        create_commit("alice", "alice@example.com", 3),
+        create_commit("alice-old", "alice@example.com", 2),
+        create_commit("bob", "bob@example.com", 1),
+    ])
+    index = AuthorIndex(tmp_path / "authors.sqlite3")
+    assert (
+        index.sweep(cast("Repository", github_repo), datetime(2025, 4, 3, tzinfo=UTC))
+        == 2
+    )
+    assert index.get("bob@example.com") is None
+
+    # A backfill from before the swept range indexes the commits it missed.
+    assert (
+        index.sweep(cast("Repository", github_repo), datetime(2025, 4, 1, tzinfo=UTC))
+        == 4
+    )
+    assert github_repo.until[-1] == datetime(2025, 4, 3, tzinfo=UTC)
+    assert index.get("bob@example.com") == "bob"
+    assert index.get("alice@example.com") == "alice"
+    assert index.get_swept_from("ZipHQ/bar-raiser") == datetime(2025, 4, 1, tzinfo=UTC)
+
+    # A sweep within the swept range lists the new commits only.
+    assert (
+        index.sweep(cast("Repository", github_repo), datetime(2025, 4, 2, tzinfo=UTC))
+        == 1
+    )
+    assert github_repo.since[-1] == datetime(2025, 4, 4, tzinfo=UTC)
+
+
+def test_author_index_sweeps_repos_apart(tmp_path: Path) -> None:
+    first_repo = FakeGithubRepo(
+        [create_commit("alice", "alice@example.com", 3)], "ZipHQ/first"
+    )
+    second_repo = FakeGithubRepo(
+        [
+            create_commit("bob", "bob@example.com", 2),
+            create_commit("carol", "carol@example.com", 1),
+        ],
+        "ZipHQ/second",
+    )
+    index = AuthorIndex(tmp_path / "authors.sqlite3")
+    assert index.sweep(cast("Repository", first_repo)) == 1
+    # The newer sweep of the first repo doesn't hide the history of the second.
+    assert index.sweep(cast("Repository", second_repo)) == 2
+    assert second_repo.since == [None]
+    assert index.get("carol@example.com") == "carol"
+    assert index.get_swept_until("ZipHQ/first") == datetime(2025, 4, 3, tzinfo=UTC)
+    assert index.get_swept_until("ZipHQ/second") == datetime(2025, 4, 2, tzinfo=UTC)
+
+
+def test_get_commit_author(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("BAR_RAISER_CACHE_DIR", str(tmp_path))
+    get_author_index.cache_clear()
+    github_repo: Any = MagicMock()
+    github_repo.get_commit.return_value.author.login = "dave"
+
+    assert get_commit_author(github_repo, "a" * 40, "dave@example.com") == "dave"
+    assert get_commit_author(github_repo, "b" * 40, "dave@example.com") == "dave"
+    noreply_email = "1+erin@users.noreply.github.com"
+    assert get_commit_author(github_repo, "c" * 40, noreply_email) == "erin"
+    github_repo.get_commit.assert_called_once_with("a" * 40)
+
+    github_repo.get_commit.return_value.author = None
+    assert get_commit_author(github_repo, "d" * 40, "frank@example.com") == (
+        UNKNOWN_AUTHOR
+    )
+    assert get_author_index().get("frank@example.com") is None
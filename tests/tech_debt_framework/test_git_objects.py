@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+from itertools import pairwise
+from typing import TYPE_CHECKING
+
+from git.repo import Repo
+
+from bar_raiser.tech_debt_framework.git_objects import (
+    get_commit_blob_shas,
+    get_tree_blob_shas,
+    list_work_tree_files,
+    read_blob,
+)
+from bar_raiser.tech_debt_framework.result_cache import get_result_cache
+from bar_raiser.tech_debt_framework.utils import (
+    LintWorkers,
+    PathResults,
+    TechDebtCategory,
+    find_files,
+    get_analyzers,
+    get_commit_deltas,
+    get_delta,
+)
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    import pytest
+
+
+def create_repo(tmp_path: Path) -> Repo:
+    git_repo = Repo.init(tmp_path)
+    with git_repo.config_writer() as config:
+        config.set_value("user", "name", "test")
+        config.set_value("user", "email", "test@example.com")
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "a.py").write_text("x = 1  # pyright: ignore[reportFoo]\n")
+    (tmp_path / "src" / "b.py").write_text("y = 1\n")
+    (tmp_path / "README.md").write_text("readme\n")
+    git_repo.git.add(".")
+    git_repo.git.commit("-m", "base")
+    (tmp_path / "src" / "a.py").write_text("x = 1\n")
+    (tmp_path / "src" / "c.py").write_text("z = 1  # pyright: ignore[reportFoo]\n")
+    git_repo.git.add(".")
+    git_repo.git.commit("-m", "head")
+    return git_repo
+
+
+def test_get_commit_blob_shas(tmp_path: Path) -> None:
+    git_repo = create_repo(tmp_path)
+    base_commit = git_repo.head.commit.parents[0]
+    blob_shas = get_commit_blob_shas(git_repo, base_commit, ["src"])
+    assert sorted(blob_shas) == ["src/a.py", "src/b.py"]
+    assert (
+        read_blob(git_repo, blob_shas["src/a.py"])
+        == b"x = 1  # pyright: ignore[reportFoo]\n"
+    )
+    assert get_commit_blob_shas(git_repo, base_commit, []) == {}
+
+
+def test_analyze_commit_and_get_delta(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setenv("BAR_RAISER_CACHE_DIR", str(tmp_path / "cache"))
+    get_result_cache.cache_clear()
+    git_repo = create_repo(tmp_path / "repo")
+    head_commit = git_repo.head.commit
+    base_commit = head_commit.parents[0]
+
+    path_results = PathResults.analyze_commit(
+        git_repo,
+        base_commit,
+        ["src"],
+        get_analyzers(),
+        LintWorkers.USE_CURRENT_THREAD,
+    )
+    assert path_results.get_key_counts() == {
+        TechDebtCategory.PYRIGHT_IGNORE: 1,
+        TechDebtCategory.BE_LINES: 4,
+    }
+
+    delta = get_delta(
+        path_results, base_commit.diff(head_commit), get_analyzers(), git_repo
+    )
+    assert delta == {TechDebtCategory.BE_LINES: 2}
+    assert sorted(path_results) == ["src/a.py", "src/b.py", "src/c.py"]
+
+
+def test_get_commit_deltas(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("BAR_RAISER_CACHE_DIR", str(tmp_path / "cache"))
+    get_result_cache.cache_clear()
+    repo_dir = tmp_path / "repo"
+    git_repo = create_repo(repo_dir)
+    git_repo.git.mv("src/c.py", "src/d.py")
+    (repo_dir / "src" / "e.py").write_text(
+        "z = 1  # pyright: ignore[reportFoo]\nw = 1\n"
+    )
+    git_repo.git.add(".")
+    git_repo.git.commit("-m", "rename and copy")
+    git_repo.git.rm("src/b.py")
+    git_repo.git.commit("-m", "delete")
+    commits = list(git_repo.iter_commits())[::-1]
+    commit_pairs = list(pairwise(commits))
+    analyzers = get_analyzers()
+
+    path_results = PathResults.analyze_commit(
+        git_repo, commits[0], ["."], analyzers, LintWorkers.USE_CURRENT_THREAD
+    )
+    expected = [
+        get_delta(path_results, base.diff(head), analyzers, git_repo)
+        for base, head in commit_pairs
+    ]
+    assert expected[1] == {
+        TechDebtCategory.PYRIGHT_IGNORE: 1,
+        TechDebtCategory.BE_LINES: 3,
+    }
+    assert (
+        get_commit_deltas(
+            git_repo, commit_pairs, analyzers, LintWorkers.USE_CURRENT_THREAD
+        )
+        == expected
+    )
+
+
+def test_find_files_in_git_work_tree(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    repo_dir = tmp_path / "repo"
+    git_repo = create_repo(repo_dir)
+    submodule = create_repo(repo_dir / "submodule")
+    git_repo.git.add("submodule")
+    (repo_dir / ".gitignore").write_text("node_modules/\n")
+    (repo_dir / "node_modules").mkdir()
+    (repo_dir / "node_modules" / "d.py").write_text("ignored = 1\n")
+    (repo_dir / "src" / "e.py").write_text("untracked = 1\n")
+    (repo_dir / "src" / "b.py").unlink()
+    monkeypatch.chdir(repo_dir)
+
+    assert sorted(list_work_tree_files(".") or []) == [
+        ".gitignore",
+        "README.md",
+        "src/a.py",
+        "src/c.py",
+        "src/e.py",
+    ]
+    assert sorted(find_files(["src", "README.md"], (".py",))) == [
+        "README.md",
+        "src/a.py",
+        "src/c.py",
+        "src/e.py",
+    ]
+    assert list_work_tree_files(str(tmp_path)) is None
+    get_tree_blob_shas.cache_clear()
+    blob_shas = get_commit_blob_shas(submodule, submodule.head.commit, ["src"])
+    blob_shas.clear()
+    assert get_commit_blob_shas(submodule, submodule.head.commit, ["src"]) == {
+        "src/a.py": submodule.head.commit.tree["src/a.py"].hexsha,
+        "src/b.py": submodule.head.commit.tree["src/b.py"].hexsha,
+        "src/c.py": submodule.head.commit.tree["src/c.py"].hexsha,
+    }
+    assert get_tree_blob_shas.cache_info().hits == 1
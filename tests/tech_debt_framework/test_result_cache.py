@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+from unittest.mock import patch
+
+from bar_raiser.tech_debt_framework import utils
+from bar_raiser.tech_debt_framework.analyzers.pyright import FindPyrightIgnores
+from bar_raiser.tech_debt_framework.result_cache import (
+    ResultCache,
+    get_analyzers_fingerprint,
+)
+from bar_raiser.tech_debt_framework.utils import LintWorkers, PathResults
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+def test_result_cache(tmp_path: Path) -> None:
+    cache = ResultCache(tmp_path / "results.sqlite3")
+    cache.put_many(
+        {"a" * 40: [("pyright-ignore", 1, 7, "FindPyrightIgnores", 1)]}, "f1"
+    )
+    assert cache.get_many(["a" * 40, "b" * 40], "f1") == {
+        "a" * 40: [("pyright-ignore", 1, 7, "FindPyrightIgnores", 1)]
+    }
+    assert cache.get_many(["a" * 40], "f2") == {}
+    reopened = ResultCache(tmp_path / "results.sqlite3")
+    assert list(reopened.get_many(["a" * 40], "f1")) == ["a" * 40]
+
+
+def test_get_analyzers_fingerprint() -> None:
+    assert get_analyzers_fingerprint({FindPyrightIgnores}) == get_analyzers_fingerprint([
+        FindPyrightIgnores
+    ])
+    assert get_analyzers_fingerprint({FindPyrightIgnores}) != get_analyzers_fingerprint(
+        set()
+    )
+
+
+def test_analyze_paths_with_cache(tmp_path: Path) -> None:
+    cache = ResultCache(tmp_path / "results.sqlite3")
+    source = tmp_path / "src"
+    source.mkdir()
+    (source / "a.py").write_text("x = 1  # pyright: ignore[reportFoo]\n")
+    (source / "b.py").write_text("x = 1  # pyright: ignore[reportFoo]\n")
+    (source / "c.txt").write_text("not python\n")
+
+    with patch.object(
+        utils, "map_analysis", wraps=utils.map_analysis
+    ) as mock_map_analysis:
+        first = PathResults.analyze_paths(
+            [str(source)],
+            {FindPyrightIgnores},
+            LintWorkers.USE_CURRENT_THREAD,
+            cache=cache,
+        )
+        assert set(mock_map_analysis.call_args.args[0]) == {
+            (str(source / "a.py"), None),
+            (str(source / "b.py"), None),
+        }
+        (source / "b.py").write_text("x = 1\n")
+        second = PathResults.analyze_paths(
+            [str(source)],
+            {FindPyrightIgnores},
+            LintWorkers.USE_CURRENT_THREAD,
+            cache=cache,
+        )
+        assert set(mock_map_analysis.call_args.args[0]) == {
+            (str(source / "b.py"), None)
+        }
+
+    a_path = str(source / "a.py")
+    assert second[a_path] == first[a_path]
+    assert [result.key for result in first[a_path]] == ["pyright-ignore", "BE-lines"]
+    assert [result.key for result in second[str(source / "b.py")]] == ["BE-lines"]
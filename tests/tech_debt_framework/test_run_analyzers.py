@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import asyncio
+from itertools import pairwise
+from typing import TYPE_CHECKING, cast
+from unittest.mock import MagicMock, patch
+
+from git.repo import Repo
+
+from bar_raiser.tech_debt_framework import run_analyzers
+from bar_raiser.tech_debt_framework.author_index import get_author_index
+from bar_raiser.tech_debt_framework.result_cache import get_result_cache
+from bar_raiser.tech_debt_framework.run_analyzers import (
+    Contribution,
+    backfill_leaderboard,
+    get_backfill_windows,
+)
+from bar_raiser.tech_debt_framework.utils import (
+    History,
+    LintWorkers,
+    PathResults,
+    TechDebtCategory,
+    close_analysis_pools,
+    get_analyzers,
+    get_delta,
+)
+from tests.tech_debt_framework.test_author_index import create_commit
+from tests.tech_debt_framework.test_s3 import FakeS3Client
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    import pytest
+    from git import Commit
+    from github.Repository import Repository
+    from types_aiobotocore_s3 import S3Client
+
+
+def test_get_backfill_windows() -> None:
+    commits = cast("list[Commit]", list(range(6)))
+    with patch.object(run_analyzers, "BACKFILL_WINDOW_SIZE", 2):
+        assert get_backfill_windows(commits) == [[0, 1, 2], [2, 3, 4], [4, 5]]
+    assert get_backfill_windows(commits[:1]) == []
+
+
+def test_backfill_leaderboard(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("BAR_RAISER_CACHE_DIR", str(tmp_path / "cache"))
+    get_result_cache.cache_clear()
+    get_author_index.cache_clear()
+    repo_dir = tmp_path / "repo"
+    git_repo = Repo.init(repo_dir)
+    with git_repo.config_writer() as config:
+        config.set_value("user", "name", "test")
+        config.set_value("user", "email", "test@example.com")
+    for index in range(6):
+        (repo_dir / f"m{index % 3}.py").write_text(
+            "x = 1  # pyright: ignore[reportFoo]\n" * index
+        )
+        git_repo.git.add(".")
+        git_repo.git.commit(
+            "-m",
+            f"change {index} (#{index})",
+            f"--author=author-{index % 2} <author-{index % 2}@example.com>",
+        )
+    commits = list(git_repo.iter_commits())[::-1]
+    authors = {commit.hexsha: f"author-{i % 2}" for i, commit in enumerate(commits)}
+    github_repo = MagicMock()
+    github_repo.get_commits.return_value = [
+        create_commit(
+            authors[commit.hexsha], f"{authors[commit.hexsha]}@example.com", 1
+        )
+        for commit in commits[::-1]
+    ]
+    analyzers = get_analyzers()
+    path_results = PathResults.analyze_commit(
+        git_repo, commits[1], ["."], analyzers, LintWorkers.USE_CURRENT_THREAD
+    )
+    expected_deltas = [
+        get_delta(path_results, base.diff(head), analyzers, git_repo)
+        for base, head in pairwise(commits[1:])
+    ]
+
+    fake_s3 = FakeS3Client()
+    reported: list[Contribution] = []
+
+    def report_contribution(
+        github_repo: Repository,
+        contribution: Contribution,
+        *args: object,
+        **kwargs: object,
+    ) -> None:
+        reported.append(contribution)
+
+    monkeypatch.chdir(tmp_path)
+    try:
+        with (
+            patch.object(run_analyzers, "BACKFILL_WINDOW_SIZE", 2),
+            patch.object(run_analyzers, "report_contribution", report_contribution),
+        ):
+            asyncio.run(
+                backfill_leaderboard(
+                    git_repo,
+                    cast("Repository", github_repo),
+                    cast("S3Client", fake_s3),
+                    commits[1].hexsha,
+                    ["."],
+                    analyzers,
+                )
+            )
+    finally:
+        close_analysis_pools()
+
+    github_repo.get_commit.assert_not_called()
+    assert [contribution.head_commit for contribution in reported] == commits[2:]
+    # The history records the weighted score of the author in each delta.
+    for contribution in reported:
+        del contribution.delta[TechDebtCategory.WEIGHTED_SCORE]
+    assert [contribution.delta for contribution in reported] == expected_deltas
+    assert [contribution.author for contribution in reported] == [
+        authors[commit.hexsha] for commit in commits[2:]
+    ]
+    uploaded_keys = {call[3] for call in fake_s3.calls if call[0] == "upload"}
+    for commit in commits[2:]:
+        assert f"bar-raiser/leaderboard/{commit.hexsha}.bin" in uploaded_keys
+        assert f"bar-raiser/history/{commit.hexsha}.bin" in uploaded_keys
+    assert (
+        f"bar-raiser/path_results/manifests/{commits[-1].hexsha}.json"
+        in fake_s3.objects
+    )
+    history = History.load(str(tmp_path / f"history-{commits[-1].hexsha}.bin"))
+    assert {
+        author: [sha for sha, _delta in items] for author, items in history.data.items()
+    } == {
+        author: [
+            commit.hexsha for commit in commits[2:] if authors[commit.hexsha] == author
+        ]
+        for author in ("author-0", "author-1")
+    }
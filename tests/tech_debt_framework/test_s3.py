@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import asyncio
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Any, cast
+from unittest.mock import patch
+
+import pytest
+from botocore.exceptions import ClientError
+from git.repo import Repo
+
+from bar_raiser.tech_debt_framework.result_cache import get_result_cache
+from bar_raiser.tech_debt_framework.utils import (
+    S3_BUCKET,
+    FingerprintMismatchError,
+    PathResults,
+    Result,
+    download_from_s3,
+    get_analyzers,
+    upload_to_s3,
+)
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from git import Commit
+    from types_aiobotocore_s3 import S3Client
+
+
+class FakeBody:
+    def __init__(self, body: bytes) -> None:
+        self.body = body
+
+    async def __aenter__(self) -> FakeBody:
+        return self
+
+    async def __aexit__(self, *args: object) -> None:
+        pass
+
+    async def read(self) -> bytes:
+        return self.body
+
+
+class FakeS3Client:
+    def __init__(self) -> None:
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.calls: list[tuple[str, ...]] = []
+        self.objects: dict[str, bytes] = {}
+
+    async def transfer(self, *args: str) -> None:
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.calls.append(args)
+        self.in_flight -= 1
+
+    async def download_file(self, *args: str, **kwargs: Any) -> None:
+        await self.transfer("download", *args)
+
+    async def upload_file(self, *args: str, **kwargs: Any) -> None:
+        await self.transfer("upload", *args)
+
+    async def get_object(self, Bucket: str, Key: str) -> dict[str, Any]:  # noqa: N803
+        await self.transfer("get", Key)
+        if Key not in self.objects:
+            raise KeyError(Key)
+        return {"Body": FakeBody(self.objects[Key])}
+
+    async def head_object(self, Bucket: str, Key: str) -> None:  # noqa: N803
+        await self.transfer("head", Key)
+        if Key not in self.objects:
+            raise ClientError({"Error": {"Code": "404"}}, "HeadObject")
+
+    async def put_object(self, Bucket: str, Key: str, Body: bytes) -> None:  # noqa: N803
+        await self.transfer("put", Key)
+        self.objects[Key] = Body
+
+
+def test_s3_transfers_share_a_concurrency_limit() -> None:
+    fake_s3 = FakeS3Client()
+    s3 = cast("S3Client", fake_s3)
+
+    async def transfer_all() -> None:
+        await asyncio.gather(
+            *(download_from_s3(s3, f"key-{i}", f"local-{i}") for i in range(5)),
+            *(upload_to_s3(s3, f"local-{i}", f"key-{i}") for i in range(5)),
+        )
+
+    with patch("bar_raiser.tech_debt_framework.utils.MAX_S3_TRANSFERS_IN_FLIGHT", 3):
+        asyncio.run(transfer_all())
+    assert fake_s3.max_in_flight == 3
+    assert len(fake_s3.calls) == 10
+    assert ("download", S3_BUCKET, "key-0", "local-0") in fake_s3.calls
+    assert ("upload", "local-0", S3_BUCKET, "key-0") in fake_s3.calls
+
+
+def get_results(path: str, count: int) -> list[Result]:
+    return [
+        Result(
+            key="BE-lines",
+            path=path,
+            line=1,
+            col=1,
+            code="BE-lines",
+            patch=None,
+            count=count,
+        )
+    ]
+
+
+def test_path_results_content_addressed_storage(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setenv("BAR_RAISER_CACHE_DIR", str(tmp_path / "cache"))
+    get_result_cache.cache_clear()
+    fake_s3 = FakeS3Client()
+    s3 = cast("S3Client", fake_s3)
+    base_commit = cast("Commit", SimpleNamespace(hexsha="1" * 40))
+    head_commit = cast("Commit", SimpleNamespace(hexsha="2" * 40))
+
+    path_results = PathResults()
+    path_results["a.py"] = get_results("a.py", 10)
+    path_results["b.py"] = get_results("b.py", 20)
+    path_results.set_blob_shas({"a.py": "a" * 40, "b.py": "b" * 40}, "fingerprint")
+    asyncio.run(path_results.upload_to_s3(s3, base_commit))
+    assert sorted(fake_s3.objects) == [
+        f"bar-raiser/path_results/blobs/fingerprint/{'a' * 40}.json",
+        f"bar-raiser/path_results/blobs/fingerprint/{'b' * 40}.json",
+        f"bar-raiser/path_results/manifests/{'1' * 40}.json",
+    ]
+
+    path_results["b.py"] = get_results("b.py", 21)
+    path_results.blob_shas["b.py"] = "c" * 40
+    fake_s3.calls.clear()
+    asyncio.run(path_results.upload_to_s3(s3, head_commit))
+    assert [call[0:2] for call in fake_s3.calls] == [
+        ("put", f"bar-raiser/path_results/blobs/fingerprint/{'c' * 40}.json"),
+        ("put", f"bar-raiser/path_results/manifests/{'2' * 40}.json"),
+    ]
+
+    fake_s3.calls.clear()
+    loaded = asyncio.run(PathResults.load_with_commit(s3, head_commit, "fingerprint"))
+    assert dict(loaded) == dict(path_results)
+    assert loaded.blob_shas == {"a.py": "a" * 40, "b.py": "c" * 40}
+    assert len(fake_s3.calls) == 3
+
+    fake_s3.calls.clear()
+    loaded = asyncio.run(PathResults.load_with_commit(s3, head_commit, "fingerprint"))
+    assert dict(loaded) == dict(path_results)
+    assert len(fake_s3.calls) == 1
+
+    with pytest.raises(FingerprintMismatchError):
+        asyncio.run(PathResults.load_with_commit(s3, head_commit, "other"))
+
+
+def test_gen_from_nearest_snapshot(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setenv("BAR_RAISER_CACHE_DIR", str(tmp_path / "cache"))
+    get_result_cache.cache_clear()
+    repo_dir = tmp_path / "repo"
+    git_repo = Repo.init(repo_dir)
+    with git_repo.config_writer() as config:
+        config.set_value("user", "name", "test")
+        config.set_value("user", "email", "test@example.com")
+    for name, content in [
+        ("a.py", "x = 1  # pyright: ignore[reportFoo]\n"),
+        ("a.py", "x = 1\n"),
+        ("b.py", "y = 1  # pyright: ignore[reportFoo]\n"),
+    ]:
+        (repo_dir / name).write_text(content)
+        git_repo.git.add(name)
+        git_repo.git.commit("-m", name)
+    head_commit = git_repo.head.commit
+    snapshot_commit = head_commit.parents[0].parents[0]
+    analyzers = get_analyzers()
+    fake_s3 = FakeS3Client()
+    s3 = cast("S3Client", fake_s3)
+    expected = PathResults.analyze_commit(git_repo, head_commit, ["."], analyzers)
+
+    no_snapshot = asyncio.run(
+        PathResults.gen_from_nearest_snapshot(
+            s3, git_repo, head_commit, ["."], analyzers
+        )
+    )
+    assert dict(no_snapshot) == dict(expected)
+
+    snapshot = PathResults.analyze_commit(git_repo, snapshot_commit, ["."], analyzers)
+    asyncio.run(snapshot.upload_to_s3(s3, snapshot_commit))
+    rolled_forward = asyncio.run(
+        PathResults.gen_from_nearest_snapshot(
+            s3, git_repo, head_commit, ["."], analyzers
+        )
+    )
+    assert dict(rolled_forward) == dict(expected)
+    assert rolled_forward.blob_shas == expected.blob_shas
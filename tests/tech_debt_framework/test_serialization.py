@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+from collections import Counter
+from typing import TYPE_CHECKING
+
+import pytest
+
+from bar_raiser.tech_debt_framework.serialization import (
+    TruncatedFileError,
+    UnsupportedFormatError,
+    iter_path_rows,
+    open_compact_reader,
+    open_compact_writer,
+)
+from bar_raiser.tech_debt_framework.utils import (
+    History,
+    LeaderBoard,
+    PathResults,
+    Result,
+    TechDebtCategory,
+)
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+def get_path_results() -> PathResults:
+    path_results = PathResults()
+    for index in range(50):
+        path = f"src/module_{index}.py"
+        path_results[path] = [
+            Result(
+                key="pyright-ignore",
+                path=path,
+                line=line,
+                col=7,
+                code="FindPyrightIgnores",
+                patch=None,
+            )
+            for line in range(1, 20)
+        ] + [
+            Result(
+                key=TechDebtCategory.BE_LINES,
+                path=path,
+                line=0,
+                col=0,
+                code="BeLines",
+                patch=None,
+                count=120,
+            )
+        ]
+    path_results["empty.py"] = []
+    return path_results
+
+
+def test_path_results_roundtrip(tmp_path: Path) -> None:
+    path_results = get_path_results()
+    compact_path = str(tmp_path / "path_results.bin")
+    json_path = str(tmp_path / "path_results.json")
+    path_results.dump(compact_path)
+    path_results.dump(json_path)
+    assert PathResults.load(compact_path) == path_results
+    assert PathResults.load(json_path) == path_results
+    assert (tmp_path / "path_results.bin").stat().st_size * 20 < (
+        tmp_path / "path_results.json"
+    ).stat().st_size
+
+    with open_compact_reader(compact_path) as f:
+        first_path, first_rows = next(iter_path_rows(f))
+    assert first_path == "src/module_0.py"
+    assert first_rows[0] == ("pyright-ignore", 1, 7, "FindPyrightIgnores", 1)
+
+
+def test_history_and_leaderboard_roundtrip(tmp_path: Path) -> None:
+    history = History()
+    history.add_delta(
+        "alice", "a" * 40, Counter({TechDebtCategory.BE_LINES: -3}), weighted_score=-3
+    )
+    history.add_delta(
+        "alice", "b" * 40, Counter({TechDebtCategory.BE_LINES: 5}), weighted_score=0
+    )
+    history.add_delta("bob", "c" * 40, Counter(), weighted_score=2**40)
+    leaderboard = LeaderBoard()
+    leaderboard.add_delta_and_check_contribution(
+        "alice", Counter({TechDebtCategory.BE_LINES: -3})
+    )
+    leaderboard.compute_weighted_score()
+
+    for suffix in (".bin", ".json"):
+        history.dump(str(tmp_path / f"history{suffix}"))
+        assert History.load(str(tmp_path / f"history{suffix}")).data == history.data
+        leaderboard.dump(str(tmp_path / f"leaderboard{suffix}"))
+        assert (
+            LeaderBoard.load(str(tmp_path / f"leaderboard{suffix}")).board
+            == leaderboard.board
+        )
+
+
+def test_invalid_compact_files(tmp_path: Path) -> None:
+    path = str(tmp_path / "path_results.bin")
+    get_path_results().dump(path)
+    with open_compact_reader(path) as f:
+        data = f.read()
+
+    with open_compact_writer(path) as f:
+        f.write(data[:-5])
+    with pytest.raises(TruncatedFileError):
+        PathResults.load(path)
+
+    with open_compact_writer(path) as f:
+        f.write(b"JUNK" + data[4:])
+    with pytest.raises(UnsupportedFormatError):
+        PathResults.load(path)
@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import pickle
+from re import compile
+from typing import TYPE_CHECKING
+from unittest.mock import patch
+
+from git.repo import Repo
+
+from bar_raiser.tech_debt_framework import utils
+from bar_raiser.tech_debt_framework.result_cache import (
+    ResultCache,
+    get_analyzers_fingerprint,
+)
+from bar_raiser.tech_debt_framework.utils import (
+    BaseCodeAnalyzer,
+    BaseTokenAnalyzer,
+    LintOptions,
+    LintWorkers,
+    PathResults,
+    Result,
+    TechDebtCategory,
+    aggregate_results,
+    analyze_source,
+    close_analysis_pools,
+    get_analysis_pool,
+    get_analyzers,
+    get_balanced_chunks,
+)
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from libcst import Comment
+
+
+def create_result(path: str, key: str, line: int, count: int = 1) -> Result:
+    return Result(
+        key=key,
+        path=path,
+        line=line,
+        col=1,
+        code="FindPyrightIgnores",
+        patch=None,
+        count=count,
+    )
+
+
+def test_result_is_slotted_and_interned() -> None:
+    directory = "src"
+    first = create_result(f"{directory}/a.py", TechDebtCategory.PYRIGHT_IGNORE, 1)
+    second = create_result(f"{directory}/a.py", "pyright-ignore", 2)
+    assert not hasattr(first, "__dict__")
+    assert type(first.key) is str
+    assert first.path is second.path
+    assert first.key is second.key
+    unpickled = pickle.loads(pickle.dumps(first))
+    assert unpickled == first
+    assert unpickled.path is first.path
+
+
+def test_aggregate_results() -> None:
+    results = [
+        create_result("a.py", "pyright-ignore", 1),
+        create_result("a.py", "pyright-ignore", 5),
+        create_result("a.py", "BE-lines", 1, count=10),
+    ]
+    assert aggregate_results(results, {"BE-lines"}) == results
+    assert aggregate_results(results) == [
+        create_result("a.py", "pyright-ignore", 1, count=2),
+        create_result("a.py", "BE-lines", 1, count=10),
+    ]
+
+
+def test_analyze_paths_aggregate_only(tmp_path: Path) -> None:
+    source = tmp_path / "a.py"
+    source.write_text(
+        "x = 1  # pyright: ignore[reportFoo]\ny = 2  # pyright: ignore[reportFoo]\n"
+    )
+    analyzers = get_analyzers()
+    cache = ResultCache(tmp_path / "results.sqlite3")
+    full = PathResults.analyze_paths(
+        [str(source)], analyzers, LintWorkers.USE_CURRENT_THREAD, cache=cache
+    )
+    aggregated = PathResults.analyze_paths(
+        [str(source)],
+        analyzers,
+        LintWorkers.USE_CURRENT_THREAD,
+        cache=cache,
+        aggregate_only=True,
+    )
+    assert len(full[str(source)]) == 3
+    assert len(aggregated[str(source)]) == 2
+    assert aggregated.get_key_counts() == full.get_key_counts()
+    assert aggregated.fingerprint == get_analyzers_fingerprint(
+        analyzers, aggregate_only=True
+    )
+    assert aggregated.fingerprint != full.fingerprint
+
+
+def test_analyze_paths_does_not_cache_failures(tmp_path: Path) -> None:
+    source = tmp_path / "a.py"
+    source.write_text("x = 1  # pyright: ignore[reportFoo]\n")
+    analyzers = get_analyzers()
+    cache = ResultCache(tmp_path / "results.sqlite3")
+    with patch.object(utils, "analyze_source", side_effect=ValueError):
+        failed = PathResults.analyze_paths(
+            [str(source)], analyzers, LintWorkers.USE_CURRENT_THREAD, cache=cache
+        )
+    assert str(source) not in failed
+    results = PathResults.analyze_paths(
+        [str(source)], analyzers, LintWorkers.USE_CURRENT_THREAD, cache=cache
+    )
+    assert len(results[str(source)]) == 2
+
+
+class FindTodos(BaseCodeAnalyzer):
+    TRIGGERS = (compile(rb"#\s*TODO"),)
+
+    def visit_Comment(self, node: Comment) -> bool | None:
+        if "TODO" in node.value:
+            self.report(node, "todo", "TODO comment found")
+        return super().visit_Comment(node)
+
+
+def test_analyze_source_skips_untriggered_files(tmp_path: Path) -> None:
+    assert FindTodos.is_triggered_by(b"x = 1  #  TODO\n")
+    assert not FindTodos.is_triggered_by(b"x = 1\n")
+    analyzers = get_analyzers()
+    assert all(issubclass(analyzer, BaseTokenAnalyzer) for analyzer in analyzers)
+    options = LintOptions(rules={*analyzers, FindTodos}, config=utils.get_lint_config())
+    with patch.object(utils, "lint_file", wraps=utils.lint_file) as mock_lint_file:
+        results = analyze_source(tmp_path / "a.py", b"x = 1\ny = 2\n", options)
+        assert [(result.key, result.count) for result in results] == [("BE-lines", 3)]
+        results = analyze_source(
+            tmp_path / "b.py", b"x = 1  # pyright: ignore[reportFoo]\n", options
+        )
+        assert [(result.key, result.line, result.col) for result in results] == [
+            ("pyright-ignore", 1, 7),
+            ("BE-lines", 1, 1),
+        ]
+        assert mock_lint_file.call_count == 0
+        results = analyze_source(
+            tmp_path / "c.py",
+            b"x = 1  # pyright: ignore[reportFoo]\ny = 2  # TODO\n",
+            options,
+        )
+        assert mock_lint_file.call_count == 1
+        assert [(result.key, result.line, result.col) for result in results] == [
+            ("pyright-ignore", 1, 7),
+            ("todo", 2, 7),
+            ("BE-lines", 1, 1),
+        ]
+
+
+def test_get_balanced_chunks() -> None:
+    sizes = {"a": 100, "b": 10, "c": 10, "d": 50, "e": 30}
+    assert get_balanced_chunks(sizes, 2) == [["a"], ["d", "e", "b", "c"]]
+    assert get_balanced_chunks(sizes, 100) == [["a"], ["d"], ["e"], ["b"], ["c"]]
+    assert get_balanced_chunks({}, 4) == []
+
+
+def test_analyze_paths_hashes_in_workers(tmp_path: Path) -> None:
+    for index in range(10):
+        (tmp_path / f"m{index}.py").write_text(
+            "x = 1  # pyright: ignore[reportFoo]\n" * index
+        )
+    analyzers = get_analyzers()
+    cache = ResultCache(tmp_path / "results.sqlite3")
+    try:
+        expected = PathResults.analyze_paths(
+            [str(tmp_path)], analyzers, LintWorkers.USE_CURRENT_THREAD
+        )
+        results = PathResults.analyze_paths([str(tmp_path)], analyzers, cache=cache)
+        cached = PathResults.analyze_paths([str(tmp_path)], analyzers, cache=cache)
+    finally:
+        close_analysis_pools()
+    assert results == cached == expected
+    assert results.blob_shas == cached.blob_shas == expected.blob_shas
+    assert len(expected.blob_shas) == 10
+
+
+def test_analysis_pool_is_reused(tmp_path: Path) -> None:
+    git_repo = Repo.init(tmp_path)
+    with git_repo.config_writer() as config:
+        config.set_value("user", "name", "test")
+        config.set_value("user", "email", "test@example.com")
+    for index in range(10):
+        (tmp_path / f"m{index}.py").write_text(
+            "x = 1  # pyright: ignore[reportFoo]\n" * index
+        )
+    git_repo.git.add(".")
+    git_repo.git.commit("-m", "base")
+    analyzers = get_analyzers()
+    options = LintOptions(rules=analyzers, config=utils.get_lint_config())
+    try:
+        expected = PathResults.analyze_paths(
+            [str(tmp_path)], analyzers, LintWorkers.USE_CURRENT_THREAD
+        )
+        assert PathResults.analyze_paths([str(tmp_path)], analyzers) == expected
+        pool = get_analysis_pool(options)
+        expected_commit = PathResults.analyze_commit(
+            git_repo,
+            git_repo.head.commit,
+            ["."],
+            analyzers,
+            LintWorkers.USE_CURRENT_THREAD,
+        )
+        assert (
+            PathResults.analyze_commit(git_repo, git_repo.head.commit, ["."], analyzers)
+            == expected_commit
+        )
+        assert get_analysis_pool(options) is pool
+        assert list(utils.analysis_pools.values()) == [pool]
+    finally:
+        close_analysis_pools()
@@ -1,9 +1,27 @@
 from __future__ import annotations
 
+import sys
 from argparse import ArgumentParser
+from json import dumps
 from pathlib import Path
+from typing import TYPE_CHECKING
+from unittest.mock import patch
 
-from bar_raiser.utils.check import create_arg_parser_with_slack_dm_on_failure
+import pytest
+
+from bar_raiser.utils.check import (
+    CheckCommand,
+    CheckMatcher,
+    CheckPattern,
+    JsonArrayStreamDecoder,
+    UnsupportedCheckPatternError,
+    create_arg_parser_with_slack_dm_on_failure,
+    run_check_commands,
+    run_command_streaming,
+)
+
+if TYPE_CHECKING:
+    from bar_raiser.utils.github import Annotation
 
 
 def test_create_arg_parser_with_slack_dm_on_failure():
@@ -11,3 +29,160 @@ def test_create_arg_parser_with_slack_dm_on_failure():
     assert isinstance(parser, ArgumentParser)
     args = parser.parse_args(["--slack-dm-on-failure", "path/to/file.json"])
     assert args.slack_dm_on_failure == Path("path/to/file.json")
+
+
+def test_check_matcher() -> None:
+    matcher = CheckMatcher([
+        CheckPattern(
+            regex="^error: (?P<path>[^:]+):(?P<line>[0-9]+): (?P<message>.*)$"
+        ),
+        CheckPattern(regex="^(?P<path>[^:]+):(?P<line>[0-9]+): (?P<message>.*)$"),
+        CheckPattern(
+            regex="^Would reformat: (?P<path>.*)$",
+            message="Would reformat.",
+            line=1,
+        ),
+        CheckPattern(
+            regex="^(?P<count>[0-9]+) fixable$",
+            should_create_annotation=False,
+            is_autofixable=True,
+        ),
+    ])
+    output = """\
+error: a.py:3: syntax error
+b.py:7: E501 line too long
+unrelated output
+Would reformat: b.py
+2 fixable
+"""
+    with patch("bar_raiser.utils.check.Path.cwd", return_value=Path("/repo/sub")):
+        annotations, is_autofix_available = matcher.scan(output, Path("/repo"))
+    assert [
+        (annotation["path"], annotation["start_line"], annotation["message"])
+        for annotation in annotations
+    ] == [
+        ("sub/a.py", 3, "syntax error"),
+        ("sub/b.py", 7, "E501 line too long"),
+        ("sub/b.py", 1, "Would reformat."),
+    ]
+    assert is_autofix_available is True
+
+
+def test_check_matcher_first_pattern_wins() -> None:
+    matcher = CheckMatcher([
+        CheckPattern(regex="^(?P<path>[^:]+):(?P<line>[0-9]+): (?P<message>.*)$"),
+        CheckPattern(
+            regex="^.* fixable$",
+            should_create_annotation=False,
+            is_autofixable=True,
+        ),
+    ])
+    with patch("bar_raiser.utils.check.Path.cwd", return_value=Path("/repo")):
+        annotations, is_autofix_available = matcher.scan(
+            "a.py:1: 2 fixable", Path("/repo")
+        )
+    assert [annotation["message"] for annotation in annotations] == ["2 fixable"]
+    assert is_autofix_available is False
+
+
+def test_check_matcher_scopes_leading_flags() -> None:
+    matcher = CheckMatcher([
+        CheckPattern(regex="(?i)^would reformat: (?P<path>.*)$", message="", line=1),
+        CheckPattern(regex="^(?P<path>[^:]+):(?P<line>[0-9]+): (?P<message>.*)$"),
+    ])
+    with patch("bar_raiser.utils.check.Path.cwd", return_value=Path("/repo")):
+        annotations, _ = matcher.scan("Would reformat: a.py\nB.PY:1: E", Path("/repo"))
+    assert [annotation["path"] for annotation in annotations] == ["a.py", "B.PY"]
+    # The flags don't leak to the other patterns.
+    assert (
+        CheckMatcher([
+            CheckPattern(regex="(?i)^a$"),
+            CheckPattern(regex="^B$"),
+        ]).regex.match("b")
+        is None
+    )
+
+
+@pytest.mark.parametrize(
+    "regex",
+    [
+        r"^(?P<path>\w+) \1$",
+        r"^(?P<path>\w+)(?(1)x|y)$",
+        r"^(?P<path>\w+)(?i)$",
+    ],
+)
+def test_check_matcher_rejects_uncombinable_patterns(regex: str) -> None:
+    with pytest.raises(UnsupportedCheckPatternError, match="cannot combine"):
+        CheckMatcher([CheckPattern(regex=regex)])
+
+
+def test_check_matcher_allows_escaped_backslashes() -> None:
+    matcher = CheckMatcher([
+        CheckPattern(regex=r"^(?P<path>\\1)(?P<line>1)(?P<message>)$")
+    ])
+    assert matcher.regex.match("\\11") is not None
+
+
+def test_json_array_stream_decoder() -> None:
+    text = dumps(
+        {
+            "version": "1.1.304",
+            "generalDiagnostics": [
+                {"file": f"{i}.py", "message": "]"} for i in range(3)
+            ],
+            "summary": {"errorCount": 3},
+        },
+        indent=2,
+    )
+    decoder = JsonArrayStreamDecoder("generalDiagnostics")
+    items = [
+        item for i in range(0, len(text), 7) for item in decoder.feed(text[i : i + 7])
+    ]
+    assert items == [{"file": f"{i}.py", "message": "]"} for i in range(3)]
+    assert decoder.buffer == ""
+
+
+def test_run_command_streaming() -> None:
+    lines: list[str] = []
+    return_code = run_command_streaming(
+        [
+            sys.executable,
+            "-c",
+            "import sys; print('a'); print('b', file=sys.stderr); sys.exit(3)",
+        ],
+        lines.append,
+    )
+    assert return_code == 3
+    assert sorted(lines) == ["a", "b"]
+
+
+def test_run_check_commands() -> None:
+    pattern = CheckPattern(regex="^(?P<path>[^:]+):(?P<line>[0-9]+): (?P<message>.*)$")
+    fixable_pattern = CheckPattern(
+        regex="^fixable$", should_create_annotation=False, is_autofixable=True
+    )
+    annotations: list[Annotation] = []
+    with patch("bar_raiser.utils.check.Path.cwd", return_value=Path("/repo")):
+        results = run_check_commands(
+            [
+                CheckCommand(
+                    [
+                        sys.executable,
+                        "-c",
+                        "import sys, time; time.sleep(0.2); print('a.py:1: slow'); sys.exit(2)",
+                    ],
+                    [pattern],
+                ),
+                CheckCommand(
+                    [sys.executable, "-c", "print('b.py:2: fast'); print('fixable')"],
+                    [pattern, fixable_pattern],
+                ),
+            ],
+            Path("/repo"),
+            annotations.append,
+        )
+    assert [(r.return_code, r.is_autofix_available) for r in results] == [
+        (2, False),
+        (0, True),
+    ]
+    assert sorted(a["path"] for a in annotations) == ["a.py", "b.py"]
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from git.repo import Repo
+
+from bar_raiser.utils.diff import (
+    DiffIndex,
+    get_changed_ranges,
+    get_diff_index,
+    unquote_git_path,
+)
+from bar_raiser.utils.github import Annotation
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+DIFF = """\
+diff --git a/a.py b/a.py
+index 1111111..2222222 100644
+--- a/a.py
++++ b/a.py
+@@ -3 +3 @@ def f():
+-    return 1
++    return 2
+@@ -10,0 +11,3 @@ def g():
++    x = 1
++    y = 2
++    z = 3
+@@ -20,2 +23,0 @@ def h():
+-    a = 1
+-    b = 2
+diff --git a/b.py b/b.py
+new file mode 100644
+index 0000000..3333333
+--- /dev/null
++++ b/b.py
+@@ -0,0 +1,2 @@
++import os
++import sys
+diff --git a/c.py b/c.py
+deleted file mode 100644
+index 4444444..0000000
+--- a/c.py
++++ /dev/null
+@@ -1 +0,0 @@
+-import os
+"""
+
+
+def test_unquote_git_path() -> None:
+    assert unquote_git_path("b/a.py") == "b/a.py"
+    assert unquote_git_path('"b/caf\\303\\251 \\"x\\"\\t.py"') == 'b/caf\u00e9 "x"\t.py'
+
+
+def test_get_changed_ranges() -> None:
+    assert get_changed_ranges(DIFF) == {
+        "a.py": [(3, 3), (11, 13)],
+        "b.py": [(1, 2)],
+    }
+
+
+def test_diff_index() -> None:
+    index = DiffIndex({"a.py": [(11, 13), (3, 3), (4, 5)], "b.py": [(1, 2)]})
+    assert index.starts["a.py"] == [3, 11]
+    assert index.ends["a.py"] == [5, 13]
+    assert index.is_changed("a.py", 3, 3)
+    assert index.is_changed("a.py", 1, 3)
+    assert index.is_changed("a.py", 13, 20)
+    assert not index.is_changed("a.py", 6, 10)
+    assert not index.is_changed("a.py", 14, 14)
+    assert not index.is_changed("a.py", 1, 2)
+    assert not index.is_changed("c.py", 1, 1)
+
+    annotations = [
+        Annotation(
+            path="a.py",
+            start_line=line,
+            end_line=line,
+            annotation_level="failure",
+            message="message",
+        )
+        for line in (2, 4, 12)
+    ]
+    assert index.filter_annotations(annotations) == annotations[1:]
+    kept: list[Annotation] = []
+    on_annotation = index.wrap(kept.append)
+    for annotation in annotations:
+        on_annotation(annotation)
+    assert kept == annotations[1:]
+
+    file_annotations = [
+        Annotation(
+            path=path,
+            start_line=1,
+            end_line=1,
+            annotation_level="failure",
+            message="file",
+        )
+        for path in ("a.py", "c.py")
+    ]
+    kept = []
+    on_annotation = index.wrap(
+        kept.append, lambda annotation: annotation["message"] == "file"
+    )
+    for annotation in [*annotations, *file_annotations]:
+        on_annotation(annotation)
+    assert kept == [*annotations[1:], file_annotations[0]]
+
+
+def test_get_diff_index(tmp_path: Path) -> None:
+    git_repo = Repo.init(tmp_path, initial_branch="main")
+    with git_repo.config_writer() as config:
+        config.set_value("user", "name", "test")
+        config.set_value("user", "email", "test@example.com")
+    (tmp_path / "a.py").write_text("a = 1\nb = 2\nc = 3\n")
+    git_repo.git.add("a.py")
+    git_repo.index.commit("base")
+    git_repo.git.checkout("-b", "feature")
+    (tmp_path / "a.py").write_text("a = 1\nb = 20\nc = 3\nd = 4\n")
+    (tmp_path / "b.py").write_text("import os\n")
+    git_repo.git.add("a.py", "b.py")
+    git_repo.index.commit("change")
+
+    index = get_diff_index(git_repo, "main")
+    assert index is not None
+    assert index.starts == {"a.py": [2, 4], "b.py": [1]}
+    assert index.ends == {"a.py": [2, 4], "b.py": [1]}
+    assert get_diff_index(git_repo, "missing") is None
+
+    # Git quotes non-ASCII and special paths, and ends paths with spaces by a tab.
+    paths = ["caf\u00e9.py", "a b.py", 'quote".py', "tab\t.py"]
+    for path in paths:
+        (tmp_path / path).write_text("x = 1\n")
+    git_repo.git.add(*paths)
+    git_repo.index.commit("special paths")
+    index = get_diff_index(git_repo, "main")
+    assert index is not None
+    assert all(index.is_changed(path, 1, 1) for path in paths)
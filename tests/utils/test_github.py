@@ -1,11 +1,17 @@
 from __future__ import annotations
 
+import json
+from base64 import b64encode
+from datetime import UTC, datetime, timedelta
 from os import chdir, environ, getcwd
 from typing import TYPE_CHECKING
-from unittest.mock import MagicMock, mock_open, patch
+from unittest.mock import MagicMock, call, patch
 
+import pytest
 from git import Diff
 from github.File import File
+from github.GitTree import GitTree
+from github.GitTreeElement import GitTreeElement
 from github.IssueComment import IssueComment
 from github.NamedUser import NamedUser
 from github.PullRequest import PullRequest
@@ -16,36 +22,90 @@ if TYPE_CHECKING:
 
 from bar_raiser.utils.github import (
     Annotation,
+    CheckRunUploader,
+    clear_github_cache,
     commit_changes,
     create_a_pull_request,
     create_check_run,
+    get_git_blob_sha,
     get_github_repo,
+    get_head_sha,
+    get_installation_token,
     get_pull_request,
+    get_pull_request_event,
+    get_review_requests,
     get_updated_paths,
     has_previous_issue_comment,
     run_codemod_and_commit_changes,
 )
+from bar_raiser.utils.instrumentation import span
 
 TEST_ORG = "ZipHQ"
 TEST_REPO = f"{TEST_ORG}/bar-raiser"
 
 
-@patch.dict(
-    environ,
-    {
-        "APP_ID": "_ID",
-        "PRIVATE_KEY": "_KEY",
-        "GITHUB_REPOSITORY_OWNER": TEST_ORG,
-        "GITHUB_REPOSITORY": TEST_REPO,
-    },
-)
-def test_get_repo() -> None:  # touch
+GITHUB_APP_ENV = {
+    "APP_ID": "_ID",
+    "PRIVATE_KEY": "_KEY",
+    "GITHUB_REPOSITORY_OWNER": TEST_ORG,
+    "GITHUB_REPOSITORY": TEST_REPO,
+}
+
+
+def mock_access_token(token: str = "_TOKEN", hours: int = 1) -> MagicMock:
+    return MagicMock(token=token, expires_at=datetime.now(UTC) + timedelta(hours=hours))
+
+
+def test_get_repo(tmp_path: Path) -> None:  # touch
+    clear_github_cache()
     with (
-        patch("bar_raiser.utils.github.GithubIntegration"),
+        patch.dict(
+            environ, {**GITHUB_APP_ENV, "BAR_RAISER_TOKEN_CACHE_DIR": str(tmp_path)}
+        ),
+        patch("bar_raiser.utils.github.GithubIntegration") as mock_integration,
         patch("bar_raiser.utils.github.Github") as mock_github,
     ):
-        get_github_repo()
-        mock_github.return_value.get_repo.assert_called_with(TEST_REPO)
+        mock_integration.return_value.get_access_token.return_value = (
+            mock_access_token()
+        )
+        assert get_github_repo() is get_github_repo()
+        mock_github.return_value.get_repo.assert_called_once_with(TEST_REPO)
+        mock_github.assert_called_once()
+        # The token is only minted when the first request is authenticated.
+        mock_integration.return_value.get_access_token.assert_not_called()
+        assert mock_github.call_args.kwargs["auth"].token == "_TOKEN"
+        assert mock_github.call_args.kwargs["auth"].token == "_TOKEN"
+        mock_integration.return_value.get_access_token.assert_called_once()
+    clear_github_cache()
+
+
+def test_get_installation_token_reuses_cached_token(tmp_path: Path) -> None:
+    clear_github_cache()
+    with (
+        patch.dict(
+            environ, {**GITHUB_APP_ENV, "BAR_RAISER_TOKEN_CACHE_DIR": str(tmp_path)}
+        ),
+        patch("bar_raiser.utils.github.GithubIntegration") as mock_integration,
+    ):
+        get_access_token = mock_integration.return_value.get_access_token
+        get_access_token.return_value = mock_access_token("_CACHED")
+        assert get_installation_token().token == "_CACHED"
+
+        # A later step of the same job reads the token from disk.
+        clear_github_cache()
+        assert get_installation_token().token == "_CACHED"
+        assert get_access_token.call_count == 1
+
+        # Tokens close to their expiry are replaced.
+        clear_github_cache()
+        for path in tmp_path.iterdir():
+            path.unlink()
+        get_access_token.return_value = mock_access_token("_EXPIRING", hours=0)
+        assert get_installation_token().token == "_EXPIRING"
+        get_access_token.return_value = mock_access_token("_NEW")
+        assert get_installation_token().token == "_NEW"
+        assert get_access_token.call_count == 3
+    clear_github_cache()
 
 
 def test_create_check_run_with_pagination() -> None:
@@ -68,6 +128,84 @@ def test_create_check_run_with_pagination() -> None:
     assert mock_repo.create_check_run.call_count == 2
 
 
+def test_create_check_run_with_single_check_run() -> None:
+    mock_repo = MagicMock(spec=Repository)
+    checks = create_check_run(
+        repo=mock_repo,
+        name="",
+        head_sha="",
+        conclusion="action_required",
+        title="",
+        summary="",
+        annotations=[
+            Annotation(
+                path="", start_line=i, end_line=i, annotation_level="", message=""
+            )
+            for i in range(175)
+        ],
+        actions=[],
+        single_check_run=True,
+    )
+    assert mock_repo.create_check_run.call_count == 1
+    assert checks == [mock_repo.create_check_run.return_value]
+    mock_check = mock_repo.create_check_run.return_value
+    assert mock_check.edit.call_count == 3
+    uploaded_lines = sorted(
+        annotation["start_line"]
+        for call in [
+            mock_repo.create_check_run.call_args,
+            *mock_check.edit.call_args_list,
+        ]
+        for annotation in call.kwargs["output"]["annotations"]
+    )
+    assert uploaded_lines == list(range(175))
+
+
+def test_create_check_run_keeps_timings_in_every_update(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setenv("BAR_RAISER_TIMINGS_IN_CHECK_SUMMARY", "1")
+    with span("git diff"):
+        pass
+    mock_repo = MagicMock(spec=Repository)
+    create_check_run(
+        repo=mock_repo,
+        name="",
+        head_sha="",
+        conclusion="action_required",
+        title="",
+        summary="summary",
+        annotations=[
+            Annotation(
+                path="", start_line=i, end_line=i, annotation_level="", message=""
+            )
+            for i in range(75)
+        ],
+        actions=[],
+        single_check_run=True,
+    )
+    mock_check = mock_repo.create_check_run.return_value
+    for update in [mock_repo.create_check_run.call_args, mock_check.edit.call_args]:
+        assert "#### Timings" in update.kwargs["output"]["summary"]
+
+
+def test_check_run_uploader_fails_check_run_on_error() -> None:
+    mock_repo = MagicMock(spec=Repository)
+    uploader = CheckRunUploader(repo=mock_repo, name="", head_sha="", title="")
+    for i in range(60):
+        uploader.add(
+            Annotation(
+                path="", start_line=i, end_line=i, annotation_level="", message=""
+            )
+        )
+    with pytest.raises(KeyError), uploader:
+        raise KeyError
+    assert mock_repo.create_check_run.call_args.kwargs["status"] == "in_progress"
+    mock_edit = mock_repo.create_check_run.return_value.edit
+    assert mock_edit.call_args.kwargs["conclusion"] == "failure"
+    assert len(mock_edit.call_args.kwargs["output"]["annotations"]) == 10
+
+
 def test_create_check_run_with_no_annotations() -> None:
     mock_repo = MagicMock(spec=Repository)
     create_check_run(
@@ -83,6 +221,23 @@ def test_create_check_run_with_no_annotations() -> None:
     assert mock_repo.create_check_run.call_count == 1
 
 
+def mock_git_tree(blobs: dict[str, bytes]) -> MagicMock:
+    return MagicMock(
+        spec=GitTree,
+        tree=[
+            MagicMock(
+                spec=GitTreeElement,
+                path=path,
+                mode="100644",
+                type="blob",
+                sha=get_git_blob_sha(content),
+            )
+            for path, content in blobs.items()
+        ],
+        raw_data={"truncated": False},
+    )
+
+
 def test_commit_changes(tmp_path: Path) -> None:
     mock_repo = MagicMock(spec=Repository)
     # fmt: off
@@ -90,44 +245,79 @@ def test_commit_changes(tmp_path: Path) -> None:
         sha="blob_sha"
     )
     # fmt: on
+    mock_repo.get_git_tree.return_value = mock_git_tree({
+        "unchanged.py": b"unchanged",
+        "moved_from.py": b"moved",
+        "removed.py": b"removed",
+    })
 
-    # Create a real temporary file
-    test_file = tmp_path / "a.py"
-    test_file.write_text("file content", encoding="utf-8")
+    # Create real temporary files
+    (tmp_path / "a.py").write_bytes(b"file content\xff")
+    (tmp_path / "unchanged.py").write_bytes(b"unchanged")
+    (tmp_path / "moved_to.py").write_bytes(b"moved")
 
     # Change dir to test relative dir access
     cwd = getcwd()
     chdir(tmp_path)
     with patch("bar_raiser.utils.github.InputGitTreeElement") as mock_element:
         commit_changes(
-            mock_repo, "a_branch", "a_sha", [test_file.name], "a_commit_message"
+            mock_repo,
+            "a_branch",
+            "a_sha",
+            ["a.py", "unchanged.py", "moved_to.py", "removed.py", "never_existed.py"],
+            "a_commit_message",
         )
     chdir(cwd)
 
-    # Verify blob was created with correct content
-    mock_repo.create_git_blob.assert_called_once_with("file content", "utf-8")
+    mock_repo.get_git_tree.assert_called_once_with("a_sha", recursive=True)
 
-    # Verify InputGitTreeElement was constructed with correct arguments
-    mock_element.assert_called_once_with(
-        test_file.name, "100644", "blob", sha="blob_sha"
+    # Verify only the new content was uploaded, as binary-safe base64
+    mock_repo.create_git_blob.assert_called_once_with(
+        b64encode(b"file content\xff").decode("ascii"), "base64"
     )
 
-    # Verify tree was created with the element
+    # Verify InputGitTreeElement was constructed for changed paths only
+    assert sorted(mock_element.call_args_list) == sorted([
+        call("a.py", "100644", "blob", sha="blob_sha"),
+        call("moved_to.py", "100644", "blob", sha=get_git_blob_sha(b"moved")),
+        call("removed.py", "100644", "blob", sha=None),
+    ])
+
+    # Verify a single tree and commit were created
     assert mock_repo.create_git_tree.call_count == 1
+    assert mock_repo.create_git_commit.call_count == 1
+    mock_repo.get_git_ref.return_value.edit.assert_called_once_with(
+        mock_repo.create_git_commit.return_value.sha
+    )
+    mock_repo.reset_mock()
 
-    # Verify commit was created
+    chdir(tmp_path)
+    for i in range(201):
+        (tmp_path / f"a_{i}.py").write_bytes(b"")
+    commit_changes(
+        mock_repo,
+        "a_branch",
+        "a_sha",
+        [f"a_{i}.py" for i in range(201)],
+        "a_commit_message",
+    )
+    chdir(cwd)
+    assert mock_repo.create_git_blob.call_count == 201
     assert mock_repo.create_git_commit.call_count == 1
     mock_repo.reset_mock()
 
-    with patch("bar_raiser.utils.github.open", mock_open(read_data="")):
-        commit_changes(
-            mock_repo,
-            "a_branch",
-            "a_sha",
-            [f"a_{i}.py" for i in range(201)],
-            "a_commit_message",
-        )
-    assert mock_repo.create_git_commit.call_count == 2
+    # Nothing to commit when every path matches the base tree
+    chdir(tmp_path)
+    commit_changes(mock_repo, "a_branch", "a_sha", ["unchanged.py"], "a_message")
+    chdir(cwd)
+    mock_repo.create_git_tree.assert_not_called()
+    mock_repo.create_git_commit.assert_not_called()
+
+
+def test_get_git_blob_sha() -> None:
+    # git hash-object of an empty file and of "hello\n"
+    assert get_git_blob_sha(b"") == "e69de29bb2d1d6434b8b29ae775ad8c2e48c5391"
+    assert get_git_blob_sha(b"hello\n") == "ce013625030ba8dba906f756967f9e9ca394464a"
 
 
 def test_run_codemod_and_commit_changes() -> None:
@@ -229,3 +419,67 @@ def test_has_previous_issue_comment() -> None:
 def test_get_pull_request() -> None:
     with patch("bar_raiser.utils.github.get_github_repo"):
         assert get_pull_request() is None
+
+
+PULL_REQUEST_EVENT = {
+    "pull_request": {
+        "url": f"https://api.github.com/repos/{TEST_REPO}/pulls/7",
+        "html_url": f"https://github.com/{TEST_REPO}/pull/7",
+        "number": 7,
+        "title": "Add a feature",
+        "draft": False,
+        "user": {"login": "jimmy"},
+        "labels": [{"name": "autofix-notify-reviewer-teams"}],
+        "requested_reviewers": [{"login": "alice"}],
+        "requested_teams": [{"slug": "infra"}],
+        "head": {"sha": "head_sha"},
+        "base": {"sha": "base_sha"},
+    },
+    "repository": {
+        "full_name": TEST_REPO,
+        "url": f"https://api.github.com/repos/{TEST_REPO}",
+        "owner": {"login": TEST_ORG},
+    },
+    "organization": {"login": TEST_ORG},
+}
+
+
+def test_pull_request_event(tmp_path: Path) -> None:
+    clear_github_cache()
+    event_path = tmp_path / "event.json"
+    event_path.write_text(json.dumps(PULL_REQUEST_EVENT), encoding="utf-8")
+    with (
+        patch.dict(
+            environ,
+            {
+                **GITHUB_APP_ENV,
+                "GITHUB_EVENT_PATH": str(event_path),
+                "PULL_NUMBER": "7",
+            },
+        ),
+        patch("bar_raiser.utils.github.GithubIntegration") as mock_integration,
+        patch("bar_raiser.utils.github.Repo") as mock_git_repo,
+    ):
+        event = get_pull_request_event()
+        assert event is not None
+        assert event.labels == ["autofix-notify-reviewer-teams"]
+        assert event.requested_teams == ["infra"]
+        assert get_head_sha() == "head_sha"
+        mock_git_repo.assert_not_called()
+
+        repo = get_github_repo()
+        assert repo.full_name == TEST_REPO
+        pull = get_pull_request()
+        assert pull is not None
+        assert (pull.number, pull.user.login, pull.draft) == (7, "jimmy", False)
+        users, teams = get_review_requests(pull)
+        assert [user.login for user in users] == ["alice"]
+        assert [(team.organization.login, team.slug) for team in teams] == [
+            (TEST_ORG, "infra")
+        ]
+        # Everything above is served from the event payload.
+        mock_integration.assert_not_called()
+
+        with patch.dict(environ, {"PULL_NUMBER": "8"}):
+            assert get_pull_request_event() is None
+    clear_github_cache()
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import json
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Any, cast
+
+import pytest
+
+from bar_raiser.utils.instrumentation import (
+    add_timings_to_summary,
+    api_call,
+    get_github_endpoint,
+    get_instrumentation,
+    instrument_github_requester,
+    span,
+    write_reports,
+)
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+    from pathlib import Path
+
+    from github.Requester import Requester
+
+
+@pytest.fixture(autouse=True)
+def clear_instrumentation() -> Iterator[None]:
+    get_instrumentation.cache_clear()
+    yield
+    get_instrumentation.cache_clear()
+
+
+def test_spans_and_api_calls() -> None:
+    with span("git diff"):
+        pass
+    for _ in range(2):
+        with api_call("s3", "put_object") as transfer:
+            transfer.bytes_sent = 10
+    with pytest.raises(ValueError, match="failed"), span("git diff"):
+        raise ValueError("failed")  # noqa: TRY003
+
+    trace = get_instrumentation().get_trace()
+    stats = {(row["kind"], row["name"]): row for row in trace["stats"]}
+    assert stats["phase", "git diff"]["count"] == 2
+    assert stats["api", "s3 put_object"]["count"] == 2
+    assert stats["api", "s3 put_object"]["bytes_sent"] == 20
+    assert [event["name"] for event in trace["traceEvents"]] == [
+        "git diff",
+        "s3 put_object",
+        "s3 put_object",
+        "git diff",
+    ]
+    table = get_instrumentation().get_markdown_table()
+    assert "| api | `s3 put_object` | 2 |" in table
+
+
+def test_get_github_endpoint() -> None:
+    assert (
+        get_github_endpoint("PATCH", "/repos/ZipHQ/bar-raiser/check-runs/123")
+        == "PATCH /repos/{owner}/{repo}/check-runs/{id}"
+    )
+    assert (
+        get_github_endpoint(
+            "GET",
+            f"https://api.github.com/repos/ZipHQ/bar-raiser/commits/{'a' * 40}?page=2",
+        )
+        == "GET /repos/{owner}/{repo}/commits/{id}"
+    )
+    assert get_github_endpoint("GET", "/user") == "GET /user"
+
+
+def test_instrument_github_requester() -> None:
+    def request_json(verb: str, url: str, *args: Any, **kwargs: Any) -> Any:
+        return 200, {}, '{"id": 1}'
+
+    requester = SimpleNamespace(
+        requestJson=request_json, requestMultipart=None, requestBlob=None
+    )
+    instrument_github_requester(cast("Requester", requester))
+    assert requester.requestJson("GET", "/repos/o/r/pulls/1", None) == (
+        200,
+        {},
+        '{"id": 1}',
+    )
+    [row] = get_instrumentation().get_trace()["stats"]
+    assert row["name"] == "github GET /repos/{owner}/{repo}/pulls/{id}"
+    assert row["bytes_received"] == len('{"id": 1}')
+
+
+def test_write_reports(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("BAR_RAISER_TRACE_DIR", str(tmp_path))
+    monkeypatch.setenv("GITHUB_STEP_SUMMARY", str(tmp_path / "summary.md"))
+    monkeypatch.setattr("sys.argv", ["annotate_ruff.py"])
+    with span("subprocess ruff check"):
+        pass
+    write_reports()
+    [trace_path] = tmp_path.glob("bar-raiser-trace-annotate_ruff-*.json")
+    trace = json.loads(trace_path.read_text())
+    assert trace["program"] == "annotate_ruff"
+    assert trace["traceEvents"][0]["name"] == "subprocess ruff check"
+    assert "`subprocess ruff check`" in (tmp_path / "summary.md").read_text()
+
+
+def test_add_timings_to_summary(monkeypatch: pytest.MonkeyPatch) -> None:
+    with span("git diff"):
+        pass
+    assert add_timings_to_summary("summary") == "summary"
+    monkeypatch.setenv("BAR_RAISER_TIMINGS_IN_CHECK_SUMMARY", "1")
+    assert add_timings_to_summary("summary").startswith("summary\n\n#### Timings")
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import os
+from multiprocessing import get_context
+from pstats import Stats
+from typing import TYPE_CHECKING
+
+from bar_raiser.utils.profiling import (
+    Profiler,
+    initialize_worker_profiling,
+    profiling,
+)
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    import pytest
+
+
+def build_squares(count: int) -> int:
+    return len([i * i for i in range(count)])
+
+
+def test_profiler_merges_worker_profiles(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setenv("BAR_RAISER_PROFILE", "1")
+    monkeypatch.setenv("BAR_RAISER_PROFILE_MEMORY", "1")
+    monkeypatch.setenv("BAR_RAISER_PROFILE_DIR", str(tmp_path))
+    profiler = Profiler("run_analyzers")
+    monkeypatch.setattr(profiling, "profiler", profiler)
+    profiler.start()
+    # Spawned as the analysis pools are, so the workers aren't children of this
+    # process' profiler and are told its pid.
+    with get_context("spawn").Pool(
+        2, initializer=initialize_worker_profiling, initargs=(os.getpid(),)
+    ) as pool:
+        assert pool.map(build_squares, [1000, 2000]) == [1000, 2000]
+        pool.close()
+        pool.join()
+    assert len(list(tmp_path.glob("bar-raiser-profile-worker-*.pstats"))) == 2
+    profiler.write_profile()
+
+    assert not list(tmp_path.glob("bar-raiser-profile-worker-*"))
+    [stats_path] = tmp_path.glob("bar-raiser-profile-run_analyzers-*.pstats")
+    stats = Stats(str(stats_path)).stats  # pyright: ignore[reportAttributeAccessIssue]
+    functions = {function for _file, _line, function in stats}
+    # The pool is mapped in this process and the squares are built in workers.
+    assert {"map", "build_squares"} <= functions
+    report = stats_path.with_suffix(".txt").read_text()
+    assert "build_squares" in report
+    [memory_path] = tmp_path.glob("bar-raiser-profile-run_analyzers-*-memory.txt")
+    memory_report = memory_path.read_text()
+    assert memory_report.count("worker (") == 2
+    assert "Top allocation sites live at exit:" in memory_report